@@ -4,10 +4,10 @@ and spot data into MoBIE-compatible storage and writes the spec-compliant metada
 that the MoBIE Fiji viewer reads.
 """
 
-from .image_data import add_image, add_bdv_image
+from .image_data import add_image, add_bdv_image, add_multichannel_image, add_timeseries_image
 from .open_organelle import add_open_organelle_data
 from .registration import add_registered_source
-from .segmentation import add_segmentation
+from .segmentation import add_intensity_table, add_segmentation
 from .spots import add_spots
 from .source_utils import remove_source, rename_source
 from .traces import add_traces
@@ -10,11 +10,13 @@ import bioimage_py as bp
 from .. import metadata
 from .. import utils
 from ..import_data import import_image_data, import_segmentation
+from ..metadata.utils import metadata_lock
 from ..tables import compute_default_table
 
 
 def _import_one_source(index, input_files, output_files, names, key, file_format,
-                       resolution, unit, scale_factors, chunks, is_seg):
+                       resolution, unit, scale_factors, chunks, is_seg,
+                       compression, compression_level):
     # Each source is converted in-memory (target "local"); parallelization happens over
     # sources in `_copy_image_data`, not via bioimage-py's within-source block runner.
     import_fn = import_segmentation if is_seg else import_image_data
@@ -23,6 +25,7 @@ def _import_one_source(index, input_files, output_files, names, key, file_format
         resolution, scale_factors, chunks,
         tmp_folder=None, target="local", max_jobs=1,
         unit=unit, source_name=names[index], file_format=file_format,
+        compression=compression, compression_level=compression_level,
     )
 
 
@@ -30,7 +33,8 @@ def _copy_image_data(files, key, root,
                      dataset_name, source_names,
                      file_format,  resolution, unit,
                      scale_factors, chunks,
-                     tmp_folder, target, max_jobs, is_seg=False):
+                     tmp_folder, target, max_jobs, is_seg=False,
+                     compression=None, compression_level=None):
     assert len(files) == len(source_names)
     ds_folder = os.path.join(root, dataset_name)
     sources = list(metadata.read_dataset_metadata(ds_folder).get("sources", {}).keys())
@@ -53,19 +57,21 @@ def _copy_image_data(files, key, root,
         functools.partial(_import_one_source, input_files=input_files, output_files=output_files,
                           names=input_names, key=key, file_format=file_format,
                           resolution=resolution, unit=unit, scale_factors=scale_factors,
-                          chunks=chunks, is_seg=is_seg),
+                          chunks=chunks, is_seg=is_seg,
+                          compression=compression, compression_level=compression_level),
         len(input_files), num_workers=num_workers, has_return_val=False, name="htm-import",
     )
     return input_names, metadata_paths
 
 
 def _require_dataset(root, dataset_name, file_format, is_default_dataset, is2d):
-    ds_exists = utils.require_dataset(root, dataset_name)
-    dataset_folder = os.path.join(root, dataset_name)
-    if not ds_exists:
-        metadata.create_dataset_structure(root, dataset_name, [file_format])
-        metadata.create_dataset_metadata(dataset_folder, is2d=is2d)
-        metadata.add_dataset(root, dataset_name, is_default_dataset)
+    with metadata_lock(os.path.join(root, "project.json")):
+        ds_exists = utils.require_dataset(root, dataset_name)
+        dataset_folder = os.path.join(root, dataset_name)
+        if not ds_exists:
+            metadata.create_dataset_structure(root, dataset_name, [file_format])
+            metadata.create_dataset_metadata(dataset_folder, is2d=is2d)
+            metadata.add_dataset(root, dataset_name, is_default_dataset)
 
 
 def _compute_one_table(index, input_files, table_paths, input_key, resolution):
@@ -108,8 +114,9 @@ def _add_sources(dataset_folder, source_names, paths,
         if table_folder is not None:
             tname = os.path.split(table_folder)[1]
             assert tname == name, f"{tname}, {name}"
-        metadata.add_source_to_dataset(dataset_folder, source_type, name, metadata_path,
-                                       table_folder=table_folder, view={})
+    # the dataset metadata is only written once for all sources
+    metadata.add_sources_to_dataset(dataset_folder, source_type, source_names, paths,
+                                    views=len(source_names) * [{}], table_folders=table_folders)
 
 
 def add_images(
@@ -128,6 +135,8 @@ def add_images(
     unit: str = "micrometer",
     is_default_dataset: bool = False,
     is2d: Optional[bool] = None,
+    compression: Optional[str] = None,
+    compression_level: Optional[int] = None,
 ) -> None:
     """Add images from a high-content microscopy experiment to a MoBIE dataset.
 
@@ -149,6 +158,9 @@ def add_images(
         is_default_dataset: Whether this is the default dataset.
             Only relevant if the dataset will be created.
         is2d: Whether this is a 2D datasets.
+        compression: The compression codec for the data, one of "blosc-lz4", "blosc-zstd", "gzip" or "raw".
+            By default the default compression of the file format is used.
+        compression_level: The compression level. By default the default level of the codec is used.
     """
     assert len(files) == len(image_names), f"{len(files)}, {len(image_names)}"
 
@@ -163,7 +175,9 @@ def add_images(
                                                     dataset_name, image_names,
                                                     file_format,  resolution, unit,
                                                     scale_factors, chunks,
-                                                    tmp_folder, target, max_jobs, is_seg=False)
+                                                    tmp_folder, target, max_jobs, is_seg=False,
+                                                    compression=compression,
+                                                    compression_level=compression_level)
 
     # add metadata for all the images
     if source_names:
@@ -187,6 +201,8 @@ def add_segmentations(
     unit: str = "micrometer",
     is_default_dataset: bool = False,
     is2d: Optional[bool] = None,
+    compression: Optional[str] = None,
+    compression_level: Optional[int] = None,
 ) -> None:
     """Add segmentation data for a high-content microscopy experiment to a MoBIE dataset.
 
@@ -209,6 +225,9 @@ def add_segmentations(
         is_default_dataset: Whether this is the default dataset.
             Only relevant if the dataset will be created.
         is2d: Whether this is a 2D datasets.
+        compression: The compression codec for the data, one of "blosc-lz4", "blosc-zstd", "gzip" or "raw".
+            By default the default compression of the file format is used.
+        compression_level: The compression level. By default the default level of the codec is used.
     """
     assert len(files) == len(segmentation_names)
 
@@ -224,7 +243,9 @@ def add_segmentations(
                                                     dataset_name, segmentation_names,
                                                     file_format,  resolution, unit,
                                                     scale_factors, chunks,
-                                                    tmp_folder, target, max_jobs, is_seg=True)
+                                                    tmp_folder, target, max_jobs, is_seg=True,
+                                                    compression=compression,
+                                                    compression_level=compression_level)
 
     if add_default_tables:
         table_folders = _add_tables(file_format, metadata_paths,
@@ -368,43 +368,44 @@ def add_plate_grid_view(
         use_transformed_grid: Whether to use the transformed grid or merged grid transformation of MoBIE.
             The transformed gird enables more flexible transformations, but is less efficient than the merged one.
     """
-    metadata = mobie.metadata.read_dataset_metadata(ds_folder)
-
-    if site_table is None and add_region_displays:
-        metadata, site_table = _get_default_site_table(ds_folder, metadata, source_prefixes,
-                                                       source_name_to_site_name,
-                                                       site_name_to_well_name,
-                                                       name_filter)
-    elif site_table is not None:
-        metadata, site_table = _require_table_source(ds_folder, metadata, site_table, "sites")
-
-    if well_table is None and add_region_displays:
-        metadata, well_table = _get_default_well_table(ds_folder, metadata, source_prefixes,
-                                                       source_name_to_site_name,
-                                                       site_name_to_well_name,
-                                                       name_filter)
-    elif well_table is not None:
-        metadata, well_table = _require_table_source(ds_folder, metadata, well_table, "wells")
-
-    if use_transformed_grid:
-        view = get_transformed_plate_grid_view(metadata, source_prefixes, source_types,
-                                               source_settings, menu_name,
-                                               source_name_to_site_name=source_name_to_site_name,
-                                               site_name_to_well_name=site_name_to_well_name,
-                                               well_to_position=well_to_position,
-                                               site_table=site_table, well_table=well_table,
-                                               name_filter=name_filter,
-                                               sites_visible=sites_visible, wells_visible=wells_visible,
-                                               add_region_displays=add_region_displays)
-    else:
-        view = get_merged_plate_grid_view(metadata, source_prefixes, source_types,
-                                          source_settings, menu_name,
-                                          source_name_to_site_name=source_name_to_site_name,
-                                          site_name_to_well_name=site_name_to_well_name,
-                                          well_to_position=well_to_position,
-                                          name_filter=name_filter,
-                                          site_table=site_table, well_table=well_table,
-                                          sites_visible=sites_visible, wells_visible=wells_visible,
-                                          add_region_displays=add_region_displays)
-    metadata["views"][view_name] = view
-    mobie.metadata.write_dataset_metadata(ds_folder, metadata)
+    with mobie.metadata.DatasetMetadataTransaction(ds_folder):
+        metadata = mobie.metadata.read_dataset_metadata(ds_folder)
+
+        if site_table is None and add_region_displays:
+            metadata, site_table = _get_default_site_table(ds_folder, metadata, source_prefixes,
+                                                           source_name_to_site_name,
+                                                           site_name_to_well_name,
+                                                           name_filter)
+        elif site_table is not None:
+            metadata, site_table = _require_table_source(ds_folder, metadata, site_table, "sites")
+
+        if well_table is None and add_region_displays:
+            metadata, well_table = _get_default_well_table(ds_folder, metadata, source_prefixes,
+                                                           source_name_to_site_name,
+                                                           site_name_to_well_name,
+                                                           name_filter)
+        elif well_table is not None:
+            metadata, well_table = _require_table_source(ds_folder, metadata, well_table, "wells")
+
+        if use_transformed_grid:
+            view = get_transformed_plate_grid_view(metadata, source_prefixes, source_types,
+                                                   source_settings, menu_name,
+                                                   source_name_to_site_name=source_name_to_site_name,
+                                                   site_name_to_well_name=site_name_to_well_name,
+                                                   well_to_position=well_to_position,
+                                                   site_table=site_table, well_table=well_table,
+                                                   name_filter=name_filter,
+                                                   sites_visible=sites_visible, wells_visible=wells_visible,
+                                                   add_region_displays=add_region_displays)
+        else:
+            view = get_merged_plate_grid_view(metadata, source_prefixes, source_types,
+                                              source_settings, menu_name,
+                                              source_name_to_site_name=source_name_to_site_name,
+                                              site_name_to_well_name=site_name_to_well_name,
+                                              well_to_position=well_to_position,
+                                              name_filter=name_filter,
+                                              site_table=site_table, well_table=well_table,
+                                              sites_visible=sites_visible, wells_visible=wells_visible,
+                                              add_region_displays=add_region_displays)
+        metadata["views"][view_name] = view
+        mobie.metadata.write_dataset_metadata(ds_folder, metadata)
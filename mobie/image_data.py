@@ -12,9 +12,10 @@ import mobie.utils as utils
 import numpy as np
 import pybdv.metadata as bdv_metadata
 import tifffile
-from bioimage_py import open_source
 from elf.io import open_file
-from mobie.import_data import import_image_data
+from mobie.import_data import import_image_data, import_multichannel_image_data, import_timeseries_image_data
+from mobie.import_data.pyramid import require_pyramid_parameters
+from mobie.import_data.utils import open_input
 from pybdv.util import absolute_to_relative_scale_factors, get_key, get_scale_factors
 
 
@@ -23,9 +24,9 @@ def _get_default_contrast_limits(input_path, input_key, use_memmap=False):
         dtype = tifffile.memmap(input_path).dtype
     else:
         # read the dtype via bioimage-py so all of its supported input formats work (e.g. mrc /
-        # nifti, and single-file inputs with input_key=None, which elf's f[None] could not handle).
-        src = open_source(input_path, input_key) if input_key else open_source(input_path)
-        dtype = src.dtype
+        # nifti, and single-file inputs with input_key=None, which elf's f[None] could not handle),
+        # as well as in-memory arrays.
+        dtype = open_input(input_path, input_key).dtype
 
     if np.issubdtype(dtype, np.integer):
         contrast_limits = [np.iinfo(dtype).min, np.iinfo(dtype).max]
@@ -88,7 +89,41 @@ def _view_and_trafo_from_xml(xml_path, setup_id, timepoint, source_name, menu_na
     return view, transforms
 
 
-# TODO support multiple timepoints
+def _add_bdv_timeseries(xml_path, data_path, input_format, setup_id, name, t_start, t_stop,
+                        root, dataset_name, file_format, menu_name, scale_factors, tmp_folder, target, max_jobs,
+                        is_default_dataset, description):
+    if not file_format.startswith("ome.zarr"):
+        raise NotImplementedError(f"Multiple timepoints are only supported for ome.zarr, got {file_format}.")
+    is_h5 = input_format == "bdv.hdf5"
+    input_keys = [get_key(is_h5, timepoint=t, setup_id=setup_id, scale=0) for t in range(t_start, t_stop + 1)]
+
+    resolution = bdv_metadata.get_resolution(xml_path, setup_id)
+    if scale_factors is None:
+        scale_factors = get_scale_factors(data_path, setup_id)
+        scale_factors = absolute_to_relative_scale_factors(scale_factors)[1:]
+    with open_file(data_path, "r") as f:
+        chunks = f[input_keys[0]].chunks
+    unit = bdv_metadata.get_unit(xml_path, setup_id)
+    if name is None:
+        name = bdv_metadata.get_name(xml_path, setup_id)
+
+    # the ome.zarr metadata only holds the resolution, so the bdv transformations apart from the
+    # calibration (the scaling by the resolution) are added to the MoBIE view.
+    dz, dy, dx = resolution
+    calibration = [dx, 0.0, 0.0, 0.0, 0.0, dy, 0.0, 0.0, 0.0, 0.0, dz, 0.0]
+    bdv_trafos = bdv_metadata.get_affine(xml_path, setup_id, t_start)
+    trafos_for_mobie = [trafo_name for trafo_name, params in bdv_trafos.items()
+                        if not np.allclose(params, calibration)]
+    view, _ = _view_and_trafo_from_xml(xml_path, setup_id, t_start, name, menu_name, trafos_for_mobie)
+
+    tmp_folder_ = None if tmp_folder is None else f"{tmp_folder}_{name}"
+    add_timeseries_image(data_path, input_keys, root, dataset_name,
+                         image_name=name, resolution=resolution, scale_factors=scale_factors,
+                         chunks=chunks, file_format=file_format, menu_name=menu_name,
+                         tmp_folder=tmp_folder_, target=target, max_jobs=max_jobs,
+                         unit=unit, view=view, is_default_dataset=is_default_dataset, description=description)
+
+
 def add_bdv_image(
     xml_path: Union[str, os.PathLike],
     root: str,
@@ -126,12 +161,13 @@ def add_bdv_image(
             Only applies if the dataset is being created.
         description: Description for this image.
         trafos_for_mobie: Additional transformations.
+            For data with multiple timepoints all transformations apart from the calibration are added to MoBIE.
         move_data: If input data is already in a MoBIE compatible format, just move it into the project directory.
+            Data with multiple timepoints is always converted, into an ome.zarr with a time axis.
     """
     # find how many timepoints we have
     t_start, t_stop = bdv_metadata.get_time_range(xml_path)
-    if t_stop > t_start:
-        raise NotImplementedError("Only a single timepoint is currently supported.")
+    is_timeseries = t_stop > t_start
 
     # get the setup ids and check that image_name is compatible
     if setup_ids is None:
@@ -166,6 +202,12 @@ def add_bdv_image(
             print("Cannot move XML with multiple setups. Will convert data instead of moving it.")
 
     for setup_id, name in zip(setup_ids, image_name):
+        if is_timeseries:
+            _add_bdv_timeseries(xml_path, data_path, input_format, setup_id, name, t_start, t_stop,
+                                root, dataset_name, file_format, menu_name, scale_factors, tmp_folder, target,
+                                max_jobs, is_default_dataset, description)
+            continue
+
         input_key = get_key(input_format == "bdv.hdf5", timepoint=t_start, setup_id=setup_id, scale=0)
 
         # get the resolution, scale_factors, chunks and unit
@@ -196,7 +238,6 @@ def add_bdv_image(
                   move_only=move_only)
 
 
-# TODO support default arguments for scale factors and chunks
 def add_image(
     input_path: Union[str, np.ndarray],
     input_key: Optional[str],
@@ -204,8 +245,8 @@ def add_image(
     dataset_name: str,
     image_name: str,
     resolution: Sequence[float],
-    scale_factors: List[List[int]],
-    chunks: Sequence[int],
+    scale_factors: Optional[List[List[int]]] = None,
+    chunks: Optional[Sequence[int]] = None,
     file_format: str = "ome.zarr",
     menu_name: Optional[str] = None,
     tmp_folder: Optional[str] = None,
@@ -220,6 +261,11 @@ def add_image(
     channel: Optional[int] = None,
     skip_add_to_dataset: bool = False,
     use_memmap: bool = False,
+    compression: Optional[str] = None,
+    compression_level: Optional[int] = None,
+    max_top_level_size: int = 512,
+    read_slabs: bool = False,
+    dry_run: bool = False,
 ) -> None:
     """Add an image source to a MoBIE dataset.
 
@@ -227,7 +273,8 @@ def add_image(
 
     Args:
         input_path: Path to the data to add.
-            This can also be a numpy array for in memory data.
+            This can also be an in-memory array (numpy array, numpy memmap, zarr or dask array),
+            which is converted directly, without writing it to a temporary file.
         input_key: Key of the data to add, corresponding to the internal path
             in hdf5/zarr/n5 etc. Set to None for adding data stored in a tif file.
         root: Root folder of the MoBIE project.
@@ -235,7 +282,8 @@ def add_image(
         image_name: Name of the image data in MoBIE.
         resolution: Resolution of the image data in micrometer.
         scale_factors: Scale factors used for down-sampling.
-        chunks: Chunks for the data.
+            By default they are planned from the shape and resolution of the data, see `import_data.plan_pyramid`.
+        chunks: Chunks for the data. By default they are planned together with the scale factors.
         menu_name: Menu name for this source.
             If none is given will be created based on the image name.
         file_format: The file format used to store the data internally.
@@ -251,20 +299,32 @@ def add_image(
         move_only: If input data is already in a MoBIE compatible format, just move it into the project directory.
         channel: The channel to load from the data. Currently only supported for the ome.zarr format.
         skip_add_to_dataset: Skip adding the source to the dataset after converting the image data.
-            This should be used when calling `add_image` in parallel in order to avoid
-            writing to dataset.json in parallel, which can cause issues.
             In this case the source needs to be added later, e.g. by calling this function again.
+            Note that `add_image` can be called in parallel for the same dataset (also from different nodes
+            of a cluster with a shared filesystem), since dataset.json is updated with a file lock.
         use_memmap: Whether to use memmap for loading the input data.
             This option is only supported for inputs in tif file format that can be loaded via `tifffile.memmap`.
             This does not work for images that are compressed or have an otherwise non-standard format.
+        compression: The compression codec for the data, one of "blosc-lz4", "blosc-zstd", "gzip" or "raw".
+            By default the default compression of the file format is used.
+        compression_level: The compression level. By default the default level of the codec is used.
+        max_top_level_size: The maximal size of the lowest resolution level along each axis.
+            Only used if the scale factors are planned automatically.
+        read_slabs: Whether to read the input in slabs along the first axis, which reads each page of a tif stack
+            or each file of a folder of slices only once. Uncompressed tif pages are memory-mapped.
+        dry_run: Whether to only print the multiscale pyramid that would be written, without converting the data
+            or adding the source. See `import_data.describe_pyramid` for the printed table.
     """
     # TODO add 'setup_id' to the json schema for bdv formats to also support it there
-    if channel is not None and file_format != "ome.zarr":
+    if channel is not None and not file_format.startswith("ome.zarr"):
         raise NotImplementedError("Channel setting is currently only supported for ome.zarr")
 
+    if dry_run:
+        require_pyramid_parameters(input_path, input_key, resolution, scale_factors, chunks,
+                                   channel=channel, max_top_level_size=max_top_level_size, verbose=True)
+        return
+
     tmp_folder = f"tmp_{dataset_name}_{image_name}" if tmp_folder is None else tmp_folder
-    if isinstance(input_path, np.ndarray):
-        input_path, input_key = utils.save_temp_input(input_path, tmp_folder, image_name)
 
     # set default contrast_limits if we don't have a view
     # or if the passed view doesn't hav contrast limits
@@ -290,13 +350,18 @@ def add_image(
             shutil.move(os.path.splitext(input_path)[0]+".xml", image_metadata_path)
 
     else:
+        scale_factors, chunks = require_pyramid_parameters(input_path, input_key, resolution, scale_factors, chunks,
+                                                           channel=channel, max_top_level_size=max_top_level_size)
         import_image_data(input_path, input_key, data_path,
                           resolution, scale_factors, chunks,
                           tmp_folder=tmp_folder, target=target,
                           max_jobs=max_jobs, unit=unit,
                           source_name=image_name,
                           file_format=file_format,
-                          channel=channel)
+                          channel=channel,
+                          compression=compression,
+                          compression_level=compression_level,
+                          read_slabs=read_slabs)
 
     if transformation is not None:
         utils.update_transformation_parameter(image_metadata_path, transformation, file_format)
@@ -307,12 +372,253 @@ def add_image(
                                    view=view, description=description, channel=channel)
 
 
+def add_multichannel_image(
+    input_path: Union[str, np.ndarray],
+    input_key: Optional[str],
+    root: str,
+    dataset_name: str,
+    image_names: Sequence[str],
+    resolution: Sequence[float],
+    scale_factors: Optional[List[List[int]]] = None,
+    chunks: Optional[Sequence[int]] = None,
+    file_format: str = "ome.zarr",
+    multichannel_name: Optional[str] = None,
+    menu_name: Optional[str] = None,
+    tmp_folder: Optional[str] = None,
+    target: str = "local",
+    max_jobs: int = multiprocessing.cpu_count(),
+    views: Optional[Sequence[Dict]] = None,
+    transformation: Optional[Union[List[float], np.ndarray]] = None,
+    unit: str = "micrometer",
+    is_default_dataset: bool = False,
+    description: Optional[str] = None,
+    compression: Optional[str] = None,
+    compression_level: Optional[int] = None,
+    max_top_level_size: int = 512,
+    dry_run: bool = False,
+) -> None:
+    """Add the channels of a multi-channel image as image sources to a MoBIE dataset.
+
+    In contrast to calling `add_image` with `channel` for each channel, the input is only read once:
+    each block of the input is read for all channels and the pyramids of all channels are computed together.
+    All sources are added to the dataset metadata at once. Will create the dataset if it does not exist.
+
+    Args:
+        input_path: Path to the data to add. The channel axis must be the first axis.
+            This can also be an in-memory array (numpy array, numpy memmap, zarr or dask array),
+            which is converted directly, without writing it to a temporary file.
+        input_key: Key of the data to add, corresponding to the internal path
+            in hdf5/zarr/n5 etc. Set to None for adding data stored in a tif file.
+        root: Root folder of the MoBIE project.
+        dataset_name: Name of the dataset the image data is added to.
+        image_names: Names of the image sources in MoBIE, one for each channel.
+        resolution: Resolution of the image data in micrometer.
+        scale_factors: Scale factors used for down-sampling.
+            By default they are planned from the shape and resolution of the data, see `import_data.plan_pyramid`.
+        chunks: Chunks for the data. By default they are planned together with the scale factors.
+        file_format: The file format used to store the data internally.
+        multichannel_name: If given, all channels are stored in a single multi-channel ome.zarr with this name
+            and each source refers to its channel in it. Otherwise each channel is stored separately.
+        menu_name: Menu name for the sources.
+            If none is given will be created based on the image names.
+        tmp_folder: Folder for temporary files.
+        target: The computation target.
+        max_jobs: The maximum number of jobs for parallelization.
+        views: Default view settings for the sources, one for each channel.
+        transformation: Parameter for affine transformation applied to the data on the fly.
+        unit: The physical unit of the coordinate system.
+        is_default_dataset: Whether to set new dataset as default dataset.
+            Only applies if the dataset is being created.
+        description: Description for the images.
+        compression: The compression codec for the data, one of "blosc-lz4", "blosc-zstd", "gzip" or "raw".
+            By default the default compression of the file format is used.
+        compression_level: The compression level. By default the default level of the codec is used.
+        max_top_level_size: The maximal size of the lowest resolution level along each axis.
+            Only used if the scale factors are planned automatically.
+        dry_run: Whether to only print the multiscale pyramid that would be written, without converting the data
+            or adding the source. See `import_data.describe_pyramid` for the printed table.
+    """
+    if multichannel_name is not None and not file_format.startswith("ome.zarr"):
+        raise NotImplementedError("A single multi-channel output is currently only supported for ome.zarr")
+    n_channels = len(image_names)
+    views = [None] * n_channels if views is None else list(views)
+    if len(views) != n_channels:
+        raise ValueError(f"Expect one view per channel, got {len(views)} views for {n_channels} channels")
+
+    if dry_run:
+        require_pyramid_parameters(input_path, input_key, resolution, scale_factors, chunks,
+                                   channel=0, max_top_level_size=max_top_level_size, verbose=True)
+        return
+
+    tmp_folder = f"tmp_{dataset_name}_{image_names[0]}" if tmp_folder is None else tmp_folder
+
+    # set default contrast_limits for the views that don't have them; they are the same for all channels
+    default_contrast_limits = _get_default_contrast_limits(input_path, input_key)
+    for channel, (image_name, view) in enumerate(zip(image_names, views)):
+        if view is None or "contrastLimits" not in view.get("sourceDisplays", [{}])[0].get("imageDisplay", {}):
+            contrast_limits = default_contrast_limits
+        else:
+            contrast_limits = None
+        views[channel] = utils.require_dataset_and_view(root, dataset_name, file_format,
+                                                        source_type="image", source_name=image_name,
+                                                        menu_name=menu_name, view=view,
+                                                        is_default_dataset=is_default_dataset,
+                                                        contrast_limits=contrast_limits,
+                                                        description=description)
+    dataset_folder = os.path.join(root, dataset_name)
+
+    if multichannel_name is None:
+        paths = [utils.get_internal_paths(dataset_folder, file_format, name) for name in image_names]
+        data_path = [path[0] for path in paths]
+        image_metadata_paths = [path[1] for path in paths]
+        channels, source_names = None, image_names
+    else:
+        data_path, image_metadata_path = utils.get_internal_paths(dataset_folder, file_format, multichannel_name)
+        image_metadata_paths = [image_metadata_path] * n_channels
+        channels, source_names = list(range(n_channels)), [multichannel_name]
+
+    scale_factors, chunks = require_pyramid_parameters(input_path, input_key, resolution, scale_factors, chunks,
+                                                       channel=0, max_top_level_size=max_top_level_size)
+    import_multichannel_image_data(input_path, input_key, data_path,
+                                   resolution, scale_factors, chunks,
+                                   tmp_folder=tmp_folder, target=target,
+                                   max_jobs=max_jobs, unit=unit,
+                                   source_names=source_names,
+                                   file_format=file_format,
+                                   compression=compression,
+                                   compression_level=compression_level)
+
+    if transformation is not None:
+        for image_metadata_path in set(image_metadata_paths):
+            utils.update_transformation_parameter(image_metadata_path, transformation, file_format)
+
+    metadata.add_sources_to_dataset(dataset_folder, "image", image_names, image_metadata_paths,
+                                    views=views, channels=channels)
+
+
+def add_timeseries_image(
+    input_path: Union[str, np.ndarray],
+    input_key: Optional[Union[str, Sequence[str]]],
+    root: str,
+    dataset_name: str,
+    image_name: str,
+    resolution: Sequence[float],
+    scale_factors: Optional[List[List[int]]] = None,
+    chunks: Optional[Sequence[int]] = None,
+    file_format: str = "ome.zarr",
+    menu_name: Optional[str] = None,
+    tmp_folder: Optional[str] = None,
+    target: str = "local",
+    max_jobs: int = multiprocessing.cpu_count(),
+    view: Optional[Dict] = None,
+    unit: str = "micrometer",
+    time_unit: Optional[str] = None,
+    time_resolution: float = 1.0,
+    is_default_dataset: bool = False,
+    description: Optional[str] = None,
+    resumable: bool = False,
+    compression: Optional[str] = None,
+    compression_level: Optional[int] = None,
+    max_top_level_size: int = 512,
+    dry_run: bool = False,
+) -> None:
+    """Add a time-series image source to a MoBIE dataset.
+
+    The data is converted into an ome.zarr with a leading time axis. The conversion reads one timepoint
+    at a time and processes the blocks of all timepoints in parallel.
+    Will create the dataset if it does not exist.
+
+    Args:
+        input_path: Path to the data to add. This can also be an in-memory array
+            (numpy array, numpy memmap, zarr or dask array), which is converted directly.
+        input_key: Key of the data to add, with the time axis as first axis.
+            Can also be a list of keys, one for each timepoint (e.g. the timepoints of a bdv file).
+        root: Root folder of the MoBIE project.
+        dataset_name: Name of the dataset the image data is added to.
+        image_name: Name of the image data in MoBIE.
+        resolution: Resolution of the image data in micrometer.
+        scale_factors: Scale factors used for down-sampling.
+            By default they are planned from the shape and resolution of the data, see `import_data.plan_pyramid`.
+        chunks: Chunks for the spatial axes of the data. By default they are planned together with the scale factors.
+        file_format: The file format used to store the data internally, either "ome.zarr" or "ome.zarr.v3".
+            Data stored in sharded zarr v3 ("ome.zarr.v3") is registered as "ome.zarr" in the dataset metadata.
+        menu_name: Menu name for this source.
+            If none is given will be created based on the image name.
+        tmp_folder: Folder for temporary files.
+        target: The computation target.
+        max_jobs: The maximum number of jobs for parallelization.
+        view: Default view settings for this source.
+        unit: The physical unit of the coordinate system.
+        time_unit: The unit of the time axis.
+        time_resolution: The interval between two timepoints in the unit of the time axis.
+        is_default_dataset: Whether to set new dataset as default dataset.
+            Only applies if the dataset is being created.
+        description: Description for this image.
+        resumable: Whether to record the progress of the conversion, so that an interrupted
+            conversion can be resumed by calling this function again with the same arguments.
+            Only the conversion of file inputs can be resumed.
+        compression: The compression codec for the data, one of "blosc-lz4", "blosc-zstd", "gzip" or "raw".
+            By default the default compression of the file format is used.
+        compression_level: The compression level. By default the default level of the codec is used.
+        max_top_level_size: The maximal size of the lowest resolution level along each axis.
+            Only used if the scale factors are planned automatically.
+        dry_run: Whether to only print the multiscale pyramid that would be written, without converting the data
+            or adding the source. See `import_data.describe_pyramid` for the printed table.
+    """
+    if not file_format.startswith("ome.zarr"):
+        raise NotImplementedError(f"Time series are only supported for the ome.zarr formats, not {file_format}.")
+
+    tmp_folder = f"tmp_{dataset_name}_{image_name}" if tmp_folder is None else tmp_folder
+
+    # the contrast limits and the pyramid parameters are derived from the first timepoint.
+    is_key_list = isinstance(input_key, (list, tuple))
+    first_key = input_key[0] if is_key_list else input_key
+    if dry_run:
+        require_pyramid_parameters(input_path, first_key, resolution, scale_factors, chunks,
+                                   channel=None if is_key_list else 0,
+                                   max_top_level_size=max_top_level_size, verbose=True)
+        return
+
+    if view is None or "contrastLimits" not in view.get("sourceDisplays", [{}])[0].get("imageDisplay", {}):
+        contrast_limits = _get_default_contrast_limits(input_path, first_key)
+    else:
+        contrast_limits = None
+    view = utils.require_dataset_and_view(root, dataset_name, file_format,
+                                          source_type="image", source_name=image_name,
+                                          menu_name=menu_name, view=view,
+                                          is_default_dataset=is_default_dataset,
+                                          contrast_limits=contrast_limits,
+                                          description=description)
+
+    dataset_folder = os.path.join(root, dataset_name)
+    data_path, image_metadata_path = utils.get_internal_paths(dataset_folder, file_format, image_name)
+
+    # a single dataset has a leading time axis, which is dropped like a channel axis for planning the pyramid.
+    scale_factors, chunks = require_pyramid_parameters(input_path, first_key, resolution, scale_factors, chunks,
+                                                       channel=None if is_key_list else 0,
+                                                       max_top_level_size=max_top_level_size)
+    import_timeseries_image_data(input_path, input_key, data_path,
+                                 resolution, scale_factors, chunks,
+                                 tmp_folder=tmp_folder, target=target,
+                                 max_jobs=max_jobs, unit=unit,
+                                 source_name=image_name,
+                                 file_format=file_format,
+                                 time_unit=time_unit,
+                                 time_resolution=time_resolution,
+                                 resumable=resumable,
+                                 compression=compression,
+                                 compression_level=compression_level)
+
+    metadata.add_source_to_dataset(dataset_folder, "image", image_name, image_metadata_path,
+                                   view=view, description=description)
+
+
 def main():
     """@private
     """
     description = """Add image data to MoBIE dataset.
                      Initialize the dataset if it does not exist."""
-    parser = utils.get_base_parser(description)
+    parser = utils.get_base_parser(description, compression=True, plan_pyramid=True)
     args = parser.parse_args()
 
     resolution, scale_factors, chunks, transformation = utils.parse_spatial_args(args)
@@ -323,4 +629,6 @@ def main():
               view=view, menu_name=args.menu_name,
               tmp_folder=args.tmp_folder, target=args.target, max_jobs=args.max_jobs,
               is_default_dataset=bool(args.is_default_dataset),
-              transformation=transformation, unit=args.unit)
+              transformation=transformation, unit=args.unit,
+              compression=args.compression, compression_level=args.compression_level,
+              max_top_level_size=args.max_top_level_size, dry_run=bool(args.dry_run))
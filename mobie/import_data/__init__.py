@@ -1,7 +1,9 @@
 """Functionality for importing image or segmentation data into a MoBIE project.
 """
 
+from .compression import benchmark_compression, benchmark_label_downsampling
 from .from_node_labels import import_segmentation_from_node_labels
-from .image import import_image_data
+from .image import import_image_data, import_multichannel_image_data, import_timeseries_image_data
+from .pyramid import describe_pyramid, plan_pyramid
 from .segmentation import import_segmentation
 from .traces import import_traces
@@ -3,7 +3,8 @@
 Write the multiscale image-data metadata for the supported MoBIE storage formats.
 
 The pyramid *data* is written by the import layer (via bioimage-py); this module only writes
-the format-specific *metadata*: the ome.zarr NGFF "multiscales" attributes, or the bdv.n5 /
+the format-specific *metadata*: the ome.zarr NGFF "multiscales" attributes (NGFF v0.4 for
+ome.zarr, NGFF v0.5 for the sharded zarr v3 ome.zarr.v3 format), or the bdv.n5 /
 bdv.hdf5 internal attributes plus the companion bdv xml (both via pybdv). The data datasets
 must already exist on disk when these functions are called.
 
@@ -21,13 +22,18 @@ from pybdv.util import relative_to_absolute_scale_factors
 AXES_TYPES = {"t": "time", "c": "channel", "z": "space", "y": "space", "x": "space"}
 
 
-def _write_ome_zarr_metadata(path, metadata_dict, scale_factors):
+def _write_ome_zarr_metadata(path, metadata_dict, scale_factors, zarr_format=2):
     setup_name = metadata_dict.get("setup_name", None)
     setup_name = "data" if setup_name is None else setup_name
     unit = metadata_dict.get("unit", "pixel")
 
-    with z5py.File(path, mode="a", dimension_separator="/") as f:
-        ndim = f["s0"].ndim
+    file_kwargs = {"zarr_format": 3} if zarr_format == 3 else {"dimension_separator": "/"}
+    # multi-channel data has a leading channel axis and time-series data a leading time axis (before
+    # the channel axis), which are not downsampled.
+    channel_axis = metadata_dict.get("channel_axis", False)
+    time_axis = metadata_dict.get("time_axis", False)
+    with z5py.File(path, mode="a", **file_kwargs) as f:
+        ndim = f["s0"].ndim - int(channel_axis) - int(time_axis)
         axes_names = ["y", "x"] if ndim == 2 else ["z", "y", "x"]
         resolution = metadata_dict.get("resolution", [1.0] * ndim)
 
@@ -37,13 +43,29 @@ def _write_ome_zarr_metadata(path, metadata_dict, scale_factors):
         scales = [[float(sf * res) for sf, res in zip(factor, resolution)] for factor in abs_factors]
 
         axes = [{"name": name, "type": AXES_TYPES[name], "unit": unit} for name in axes_names]
+        if channel_axis:
+            axes = [{"name": "c", "type": AXES_TYPES["c"]}] + axes
+            scales = [[1.0] + scale for scale in scales]
+        if time_axis:
+            time_unit = metadata_dict.get("time_unit", None)
+            time_ax = {"name": "t", "type": AXES_TYPES["t"]}
+            if time_unit is not None:
+                time_ax["unit"] = time_unit
+            axes = [time_ax] + axes
+            scales = [[float(metadata_dict.get("time_resolution", 1.0))] + scale for scale in scales]
         datasets = [
             {"path": f"s{level}", "coordinateTransformations": [{"type": "scale", "scale": scale}]}
             for level, scale in enumerate(scales)
         ]
-        f.attrs["multiscales"] = [
-            {"axes": axes, "datasets": datasets, "name": setup_name, "version": "0.4"}
-        ]
+        # NGFF v0.5 (zarr v3) stores the metadata in the "ome" attribute, with the version at its top level.
+        if zarr_format == 3:
+            f.attrs["ome"] = {
+                "version": "0.5", "multiscales": [{"axes": axes, "datasets": datasets, "name": setup_name}]
+            }
+        else:
+            f.attrs["multiscales"] = [
+                {"axes": axes, "datasets": datasets, "name": setup_name, "version": "0.4"}
+            ]
 
 
 def _write_bdv_metadata(metadata_format, path, metadata_dict, scale_factors):
@@ -70,9 +92,11 @@ def write_format_metadata(metadata_format, path, metadata_dict, scale_factors):
     """Write the multiscale metadata for the given storage format.
 
     Args:
-        metadata_format: The storage format. One of 'ome.zarr', 'bdv.n5', 'bdv.hdf5'.
+        metadata_format: The storage format. One of 'ome.zarr', 'ome.zarr.v3', 'bdv.n5', 'bdv.hdf5'.
         path: The path to the (already written) multiscale data.
-        metadata_dict: The metadata values, with keys 'resolution', 'unit' and 'setup_name'.
+        metadata_dict: The metadata values, with keys 'resolution', 'unit' and 'setup_name',
+            and optionally 'channel_axis' for ome.zarr data with a leading channel axis and 'time_axis',
+            'time_unit', 'time_resolution' for ome.zarr data with a leading time axis.
         scale_factors: The relative per-level downscaling factors (without the s0 identity).
 
     Raises:
@@ -80,6 +104,8 @@ def write_format_metadata(metadata_format, path, metadata_dict, scale_factors):
     """
     if metadata_format == "ome.zarr":
         _write_ome_zarr_metadata(path, metadata_dict, scale_factors)
+    elif metadata_format == "ome.zarr.v3":
+        _write_ome_zarr_metadata(path, metadata_dict, scale_factors, zarr_format=3)
     elif metadata_format in ("bdv", "bdv.n5", "bdv.hdf5"):
         _write_bdv_metadata(metadata_format, path, metadata_dict, scale_factors)
     else:
@@ -0,0 +1,158 @@
+"""Functionality to compare the compression codecs and the label downsampling modes for converting data
+into a MoBIE compatible format.
+"""
+import os
+import time
+from shutil import rmtree
+from tempfile import mkdtemp
+from typing import Optional, Sequence
+
+import numpy as np
+import pandas as pd
+from bioimage_py.sources import as_source
+from pybdv.downsample import sample_shape
+
+from .utils import (COMPRESSION_CODECS, LABEL_DOWNSAMPLING_MODES, _compression_options, _create_level,
+                    _open_storage, _resized, get_scale_key, label_downsampling_mode, read_sample)
+
+
+def _is_available(file_format, compression):
+    # blosc is not available for hdf5 without hdf5plugin.
+    try:
+        _compression_options(file_format, compression)
+    except ValueError:
+        return False
+    return True
+
+
+def _storage_size(path):
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    return sum(
+        os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names
+    )
+
+
+def benchmark_compression(
+    in_path: str,
+    in_key: Optional[str],
+    chunks: Sequence[int],
+    sample_size: Optional[Sequence[int]] = None,
+    file_format: str = "ome.zarr",
+    compressions: Optional[Sequence[str]] = None,
+    compression_levels: Sequence[Optional[int]] = (None,),
+    tmp_folder: Optional[str] = None,
+) -> pd.DataFrame:
+    """Compare the size and throughput of compression codecs on a sample of the input data.
+
+    The sample is written with each codec and level in the given file format and read back,
+    in order to choose the `compression` and `compression_level` for the data conversion.
+
+    Args:
+        in_path: The input data.
+        in_key: The key of the input data.
+        chunks: The chunks of the converted data.
+        sample_size: The size of the sample along each axis, taken from the center of the data.
+            By default four times the chunks along each axis.
+        file_format: The file format the data will be converted into.
+        compressions: The compression codecs to compare. By default all codecs available for the file format.
+        compression_levels: The compression levels to compare. None stands for the default level of the codec.
+        tmp_folder: The folder in which a temporary folder for the compressed samples is created.
+            By default the system's temporary directory is used. Only the temporary folder is removed afterwards.
+
+    Returns:
+        Table with the size, compression ratio and the write and read throughput (in MB/s) of each codec and level.
+    """
+    if compressions is None:
+        compressions = [compression for compression in COMPRESSION_CODECS
+                        if _is_available(file_format, compression)]
+    sample = read_sample(in_path, in_key, [4 * ch for ch in chunks] if sample_size is None else sample_size)
+    n_bytes = sample.nbytes
+
+    if tmp_folder is not None:
+        os.makedirs(tmp_folder, exist_ok=True)
+    sample_folder = mkdtemp(prefix="compression_", dir=tmp_folder)
+    ext = {"ome.zarr": ".ome.zarr", "ome.zarr.v3": ".ome.zarr", "bdv.n5": ".n5", "bdv.hdf5": ".h5"}[file_format]
+    key = get_scale_key(file_format)
+
+    results = []
+    try:
+        for compression in compressions:
+            # the level has no effect for uncompressed data.
+            levels = [None] if compression == "raw" else compression_levels
+            for level in levels:
+                path = os.path.join(sample_folder, f"{compression}-{level}{ext}")
+                with _open_storage(path, file_format, mode="w") as f:
+                    ds = _create_level(f, file_format, 0, sample.shape, chunks, sample.dtype,
+                                       compression=compression, compression_level=level)
+                    t0 = time.time()
+                    ds[:] = sample
+                # measure the time after closing the file, so that pending writes are included.
+                write_time = time.time() - t0
+
+                size = _storage_size(path)
+                with _open_storage(path, file_format, mode="r") as f:
+                    t0 = time.time()
+                    f[key][:]
+                    read_time = time.time() - t0
+
+                results.append([
+                    compression, level, size, n_bytes / size,
+                    n_bytes / 1e6 / max(write_time, 1e-9), n_bytes / 1e6 / max(read_time, 1e-9),
+                ])
+                if os.path.isdir(path):
+                    rmtree(path)
+                else:
+                    os.remove(path)
+    finally:
+        rmtree(sample_folder)
+
+    return pd.DataFrame(
+        results, columns=["compression", "compression_level", "size", "ratio", "write_mb_per_s", "read_mb_per_s"]
+    )
+
+
+def benchmark_label_downsampling(
+    in_path: str,
+    in_key: Optional[str],
+    scale_factor: Sequence[int],
+    sample_size: Optional[Sequence[int]] = None,
+    downsampling_modes: Sequence[str] = ("nearest",) + LABEL_DOWNSAMPLING_MODES,
+    n_repeats: int = 3,
+) -> pd.DataFrame:
+    """Compare the throughput and the preserved labels of the label downsampling modes on a sample of a segmentation.
+
+    The sample is downsampled by `scale_factor` with each mode, in order to choose the `downsampling_mode`
+    for the segmentation import. The throughput is the best of `n_repeats` runs.
+
+    Args:
+        in_path: The input segmentation.
+        in_key: The key of the input segmentation.
+        scale_factor: The scale factor of the downsampling.
+        sample_size: The size of the sample along each axis, taken from the center of the data.
+            By default 256 along each axis.
+        downsampling_modes: The downsampling modes to compare, see `import_segmentation`.
+        n_repeats: The number of runs per mode.
+
+    Returns:
+        Table with the throughput (in MB/s of the input), the number of labels in the downsampled sample and the
+            fraction of the labels of the sample that are kept by each mode.
+    """
+    sample = read_sample(in_path, in_key, [256] * len(scale_factor) if sample_size is None else sample_size)
+    out_shape = tuple(int(sh) for sh in sample_shape(sample.shape, scale_factor))
+    out_bb = tuple(slice(0, sh) for sh in out_shape)
+    in_labels = np.setdiff1d(np.unique(sample), [0])
+
+    results = []
+    for mode in downsampling_modes:
+        source = _resized(as_source(sample), out_shape, 0, False, label_downsampling_mode(mode))
+        run_times = []
+        for _ in range(n_repeats):
+            t0 = time.time()
+            downsampled = np.asarray(source[out_bb])
+            run_times.append(time.time() - t0)
+        n_labels = len(np.setdiff1d(np.unique(downsampled), [0]))
+        results.append([
+            mode, sample.nbytes / 1e6 / max(min(run_times), 1e-9), n_labels, n_labels / max(len(in_labels), 1)
+        ])
+    return pd.DataFrame(results, columns=["downsampling_mode", "mb_per_s", "n_labels", "label_fraction"])
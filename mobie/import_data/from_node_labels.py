@@ -1,29 +1,24 @@
 """Functionality for importing a segmentation from a fragment segmentation plus a node-label
 assignment (a fragment -> segment id mapping, e.g. the output of a graph-based segmentation) into MoBIE.
 """
-from typing import Dict, List, Optional, Sequence, Tuple, Union
+from typing import List, Optional, Sequence, Tuple
 
 import numpy as np
 from bioimage_py import open_source
-from bioimage_py.segmentation import relabel
 
-from .utils import (_create_level, _open_storage, _remove_output,
-                    add_max_id, downscale, get_scale_key)
-from ..utils import get_run_config
+from .utils import _NodeLabels, downscale, get_scale_key, label_downsampling_mode, write_segmentation
 
 
-def _load_node_labels(node_label_path: str,
-                      node_label_key: str) -> Union[np.ndarray, Dict[int, int]]:
-    """Load the fragment -> segment assignment and normalize it into a relabeling that
-    :func:`bioimage_py.segmentation.relabel` accepts.
+def _load_node_labels(node_label_path: str, node_label_key: str) -> _NodeLabels:
+    """Load the fragment -> segment assignment and normalize it into an array-backed `_NodeLabels` mapping.
 
-    A 1d dense array (``labeling[old_id] = new_id``) is returned as is; a 2d assignment table of
+    A 1d dense array (``labeling[old_id] = new_id``) is used as is; a 2d assignment table of
     ``(old_id, new_id)`` pairs -- stored either as ``(N, 2)`` rows or ``(2, N)`` columns -- is turned
-    into a ``{old_id: new_id}`` dict.
+    into a dense lookup table if the fragment id range allows it, and into sorted arrays otherwise.
     """
     labels = np.asarray(open_source(node_label_path, node_label_key)[...])
     if labels.ndim == 1:
-        return labels
+        return _NodeLabels(labels)
     if labels.ndim == 2:
         if labels.shape[1] == 2:
             old, new = labels[:, 0], labels[:, 1]
@@ -31,32 +26,10 @@ def _load_node_labels(node_label_path: str,
             old, new = labels[0, :], labels[1, :]
         else:
             raise ValueError(f"Invalid shape for 2d node labels: {labels.shape}")
-        return {int(o): int(n) for o, n in zip(old, new)}
+        return _NodeLabels.from_table(old, new)
     raise ValueError(f"Expect 1d or 2d node labels, got {labels.ndim}d")
 
 
-def _write_segmentation(in_path, in_key, out_path, out_key,
-                        node_label_path, node_label_key,
-                        chunks, metadata_format,
-                        target, max_jobs, tmp_folder):
-    """Apply the node-label assignment to the fragment segmentation, writing the relabeled scale-0
-    dataset to ``out_path/out_key``."""
-    job_type, job_config, num_workers = get_run_config(target, max_jobs, tmp_folder)
-    labeling = _load_node_labels(node_label_path, node_label_key)
-
-    src = open_source(in_path, in_key)
-    # overwrite any previous conversion of this segmentation at the output location.
-    _remove_output(out_path)
-    with _open_storage(out_path, metadata_format, mode="a") as f:
-        # segment ids can exceed the fragment-id range, so store the relabeled output as uint64.
-        ds = _create_level(f, metadata_format, 0, src.shape, chunks, np.dtype("uint64"))
-        # relabel is a disjoint per-block point op; block_shape == the output chunks keeps
-        # concurrent block writes safe (same idiom as downscale's copy calls).
-        relabel(src, labeling, output=ds,
-                block_shape=tuple(int(c) for c in ds.chunks),
-                job_type=job_type, job_config=job_config, num_workers=num_workers)
-
-
 def import_segmentation_from_node_labels(
     in_path: str,
     in_key: str,
@@ -73,7 +46,14 @@ def import_segmentation_from_node_labels(
     unit: str = "micrometer",
     source_name: Optional[str] = None,
     file_format: str = "ome.zarr",
-) -> None:
+    compression: Optional[str] = None,
+    compression_level: Optional[int] = None,
+    narrow_dtype: bool = False,
+    skip_empty_chunks: bool = False,
+    relabel_consecutive: bool = False,
+    downsampling_mode: str = "nearest",
+    morphology_folder: Optional[str] = None,
+) -> Optional[np.ndarray]:
     """Import segmentation data into MoBIE format from a fragment segmentation and a node-label assignment.
 
     The input fragment segmentation is relabeled by applying the node-label assignment (a mapping from
@@ -95,6 +75,22 @@ def import_segmentation_from_node_labels(
         unit: The physical unit of the coordinate system.
         source_name: The name of the source.
         file_format: The output file format.
+        compression: The compression codec for the converted data, one of "blosc-lz4", "blosc-zstd",
+            "gzip" or "raw". By default the default compression of the file format is used.
+        compression_level: The compression level. By default the default level of the codec is used.
+        narrow_dtype: Whether to store the segmentation with the smallest unsigned integer type that holds
+            the segment ids of the node labels, instead of uint64.
+        skip_empty_chunks: Whether to leave the chunks that only contain background (0) unwritten,
+            which saves storage for sparse segmentations.
+        relabel_consecutive: Whether to relabel the segment ids to consecutive ids, see `import_segmentation`.
+        downsampling_mode: How the labels are downsampled, one of "nearest", "mode" or "mode-nonzero",
+            see `import_segmentation`.
+        morphology_folder: The folder for saving the per-label statistics of the relabeled blocks,
+            from which the default table can be computed without reading the data again. See `utils.downscale`.
+
+    Returns:
+        The lookup table of ``(old_id, new_id)`` pairs for the segment ids if `relabel_consecutive` is set,
+            None otherwise.
     """
     if file_format in ("bdv", "bdv.hdf5") and target == "slurm":
         raise ValueError(
@@ -102,20 +98,22 @@ def import_segmentation_from_node_labels(
             "Use target='local' or a different file format."
         )
 
+    mode = label_downsampling_mode(downsampling_mode)
     out_key = get_scale_key(file_format)
 
-    _write_segmentation(in_path, in_key, out_path, out_key,
-                        node_label_path, node_label_key,
-                        chunks, metadata_format=file_format,
-                        target=target, max_jobs=max_jobs, tmp_folder=tmp_folder)
+    labeling = _load_node_labels(node_label_path, node_label_key)
+    lut, _ = write_segmentation(in_path, in_key, out_path, out_key,
+                                labeling, chunks, metadata_format=file_format,
+                                target=target, max_jobs=max_jobs, tmp_folder=tmp_folder,
+                                compression=compression, compression_level=compression_level,
+                                narrow_dtype=narrow_dtype, skip_empty_chunks=skip_empty_chunks,
+                                relabel_consecutive=relabel_consecutive, morphology_folder=morphology_folder)
 
     downscale(out_path, out_key, out_path,
               resolution, scale_factors, chunks,
               tmp_folder, target, max_jobs, block_shape,
               library="vigra", library_kwargs={"order": 0},
               unit=unit, source_name=source_name,
-              metadata_format=file_format)
-
-    # relabel does not write the maxId attribute (the cluster_tools Write task used to), so compute
-    # it from the relabeled output (the max segment id actually present).
-    add_max_id(out_path, out_key, out_path, out_key, tmp_folder, target, max_jobs)
+              metadata_format=file_format, skip_empty_chunks=skip_empty_chunks,
+              compression=compression, compression_level=compression_level, downsampling_mode=mode)
+    return lut
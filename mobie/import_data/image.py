@@ -1,8 +1,8 @@
 """Functionality to convert image data into a MoBIE compatible format.
 """
 import multiprocessing as mp
-from typing import List, Optional, Sequence, Tuple
-from .utils import downscale
+from typing import List, Optional, Sequence, Tuple, Union
+from .utils import downscale, downscale_multichannel, downscale_timeseries
 
 
 def import_image_data(
@@ -20,6 +20,10 @@ def import_image_data(
     source_name: Optional[str] = None,
     file_format: str = "ome.zarr",
     channel: Optional[int] = None,
+    resumable: bool = False,
+    compression: Optional[str] = None,
+    compression_level: Optional[int] = None,
+    read_slabs: bool = False,
 ) -> None:
     """Convert image data into a format supported by MoBIE.
 
@@ -38,10 +42,122 @@ def import_image_data(
         source_name: The name of the source.
         file_format: The file format the data will be converted into.
         channel: The channel to load from the data.
+        resumable: Whether to record the progress of the conversion, so that an interrupted
+            conversion can be resumed by calling this function again with the same arguments.
+            Only the conversion of file inputs can be resumed.
+        compression: The compression codec for the converted data, one of "blosc-lz4", "blosc-zstd",
+            "gzip" or "raw". By default the default compression of the file format is used.
+        compression_level: The compression level. By default the default level of the codec is used.
+        read_slabs: Whether to read the input in slabs along the first axis, which reads each page of a tif
+            stack or each file of a folder of slices only once. See `utils.downscale` for details.
     """
     # 2d input is promoted to 3d on the fly inside downscale for the bdv formats (ome.zarr keeps 2d).
     downscale(in_path, in_key, out_path,
               resolution, scale_factors, chunks,
               tmp_folder, target, max_jobs, block_shape,
               library="skimage", unit=unit, source_name=source_name,
-              metadata_format=file_format, channel=channel)
+              metadata_format=file_format, channel=channel, resumable=resumable,
+              compression=compression, compression_level=compression_level, read_slabs=read_slabs)
+
+
+def import_multichannel_image_data(
+    in_path,
+    in_key,
+    out_path: Union[str, Sequence[str]],
+    resolution: Sequence[float],
+    scale_factors: List[List[int]],
+    chunks: Sequence[int],
+    tmp_folder: Optional[str] = None,
+    target: str = "local",
+    max_jobs: int = mp.cpu_count(),
+    unit: str = "micrometer",
+    source_names: Optional[Sequence[str]] = None,
+    file_format: str = "ome.zarr",
+    resumable: bool = False,
+    compression: Optional[str] = None,
+    compression_level: Optional[int] = None,
+) -> None:
+    """Convert multi-channel image data into a format supported by MoBIE, reading the input only once.
+
+    Args:
+        in_path: The input data to be added. The channel axis must be the first axis.
+        in_key: The key of the input data to be added.
+        out_path: The output path for the converted data. If a list of paths is given, each channel
+            is written to its own output. Otherwise all channels are written to a single ome.zarr.
+        resolution: The resolution of the data in physical units.
+        scale_factors: The scale factors used for down-sampling the data.
+        chunks: The chunks of the data to be added.
+        tmp_folder: The folder for temporary files.
+        target: The computation target.
+        max_jobs: The number of jobs.
+        unit: The physical unit of the coordinate system.
+        source_names: The names of the sources, one per channel.
+        file_format: The file format the data will be converted into.
+        resumable: Whether to record the progress of the conversion, so that an interrupted
+            conversion can be resumed by calling this function again with the same arguments.
+            Only the conversion of file inputs can be resumed.
+        compression: The compression codec for the converted data, one of "blosc-lz4", "blosc-zstd",
+            "gzip" or "raw". By default the default compression of the file format is used.
+        compression_level: The compression level. By default the default level of the codec is used.
+    """
+    downscale_multichannel(in_path, in_key, out_path,
+                           resolution, scale_factors, chunks,
+                           tmp_folder, target, max_jobs,
+                           library="skimage", unit=unit, source_names=source_names,
+                           metadata_format=file_format, resumable=resumable,
+                           compression=compression, compression_level=compression_level)
+
+
+def import_timeseries_image_data(
+    in_path,
+    in_key: Optional[Union[str, Sequence[str]]],
+    out_path: str,
+    resolution: Sequence[float],
+    scale_factors: List[List[int]],
+    chunks: Sequence[int],
+    tmp_folder: Optional[str] = None,
+    target: str = "local",
+    max_jobs: int = mp.cpu_count(),
+    unit: str = "micrometer",
+    source_name: Optional[str] = None,
+    file_format: str = "ome.zarr",
+    channel_axis: bool = False,
+    time_unit: Optional[str] = None,
+    time_resolution: float = 1.0,
+    resumable: bool = False,
+    compression: Optional[str] = None,
+    compression_level: Optional[int] = None,
+) -> None:
+    """Convert time-series image data into an ome.zarr with a leading time axis, one timepoint at a time.
+
+    Args:
+        in_path: The input data to be added.
+        in_key: The key of the input data to be added, with the time axis as first axis.
+            Can also be a list of keys, one for each timepoint.
+        out_path: The output path for the converted data.
+        resolution: The resolution of the data in physical units.
+        scale_factors: The scale factors used for down-sampling the data.
+        chunks: The chunks of the data to be added, for the spatial axes.
+        tmp_folder: The folder for temporary files.
+        target: The computation target.
+        max_jobs: The number of jobs.
+        unit: The physical unit of the coordinate system.
+        source_name: The name of the source.
+        file_format: The file format the data will be converted into, either "ome.zarr" or "ome.zarr.v3".
+        channel_axis: Whether the data of each timepoint has a leading channel axis.
+        time_unit: The unit of the time axis.
+        time_resolution: The interval between two timepoints in the unit of the time axis.
+        resumable: Whether to record the progress of the conversion, so that an interrupted
+            conversion can be resumed by calling this function again with the same arguments.
+            Only the conversion of file inputs can be resumed.
+        compression: The compression codec for the converted data, one of "blosc-lz4", "blosc-zstd",
+            "gzip" or "raw". By default the default compression of the file format is used.
+        compression_level: The compression level. By default the default level of the codec is used.
+    """
+    downscale_timeseries(in_path, in_key, out_path,
+                         resolution, scale_factors, chunks,
+                         tmp_folder, target, max_jobs,
+                         library="skimage", unit=unit, source_name=source_name,
+                         metadata_format=file_format, channel_axis=channel_axis,
+                         time_unit=time_unit, time_resolution=time_resolution, resumable=resumable,
+                         compression=compression, compression_level=compression_level)
@@ -0,0 +1,147 @@
+"""Functionality to plan the multiscale pyramid (scale factors and chunks) for converting data into MoBIE.
+"""
+from math import ceil, log2
+from typing import List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import pandas as pd
+from pybdv.downsample import sample_shape
+
+from .utils import open_input
+
+# the number of voxels per chunk (64 x 64 x 64 in 3d, 512 x 512 in 2d). Chunks of this size are a good trade-off
+# between the number of requests and the amount of data that is loaded per request for remote access in MoBIE.
+_CHUNK_VOXELS = 2 ** 18
+
+
+def _plan_chunks(shape, resolution, itemsize, max_chunk_bytes):
+    n_voxels = min(_CHUNK_VOXELS, max(1, max_chunk_bytes // itemsize))
+    # the chunks can grow up to the shape of the data, rounded up to the next power of two.
+    max_chunks = [2 ** int(ceil(log2(max(int(sh), 1)))) for sh in shape]
+    chunks = [1] * len(shape)
+    # grow the axis with the smallest physical extent, so that the chunks cover a (roughly) isotropic
+    # region in physical space. For ties the last axis is preferred, which is contiguous in memory.
+    while 2 * int(np.prod(chunks)) <= n_voxels:
+        candidates = [axis for axis in range(len(shape)) if 2 * chunks[axis] <= max_chunks[axis]]
+        if not candidates:
+            break
+        axis = min(candidates[::-1], key=lambda ax: chunks[ax] * resolution[ax])
+        chunks[axis] *= 2
+    return chunks
+
+
+def _plan_scale_factors(shape, resolution, max_top_level_size):
+    scale_factors = []
+    shape, resolution = list(shape), list(resolution)
+    while max(shape) > max_top_level_size:
+        # downsample the axes whose voxel size is within a factor of two of the finest axis,
+        # so that anisotropic data becomes more isotropic with each level.
+        min_res = min(res for res, sh in zip(resolution, shape) if sh > 1)
+        factor = [2 if (sh > 1 and res < 2 * min_res) else 1 for res, sh in zip(resolution, shape)]
+        if all(f == 1 for f in factor):
+            break
+        scale_factors.append(factor)
+        shape = list(sample_shape(shape, factor))
+        resolution = [res * f for res, f in zip(resolution, factor)]
+    return scale_factors
+
+
+def plan_pyramid(
+    shape: Sequence[int],
+    resolution: Sequence[float],
+    dtype: Union[str, np.dtype] = "uint8",
+    max_top_level_size: int = 512,
+    max_chunk_bytes: int = 1024 ** 2,
+) -> Tuple[List[List[int]], List[int]]:
+    """Plan the scale factors and chunks for converting data into a MoBIE multiscale pyramid.
+
+    The data is downsampled by a factor of two along the axes with the finest resolution until
+    the lowest resolution level is at most `max_top_level_size` voxels along each axis.
+    The chunks cover a roughly isotropic region in physical space and hold 2 ** 18 voxels
+    (e.g. 64 x 64 x 64 for isotropic 3d data or 512 x 512 for 2d data), which is well suited
+    for remote access by the MoBIE viewer.
+
+    Args:
+        shape: The shape of the data.
+        resolution: The resolution of the data in physical units.
+        dtype: The data type of the data.
+        max_top_level_size: The maximal size of the lowest resolution level along each axis.
+        max_chunk_bytes: The maximal size of a chunk in bytes (uncompressed).
+
+    Returns:
+        The scale factors.
+        The chunks.
+    """
+    if len(shape) != len(resolution):
+        raise ValueError(f"The shape {shape} and resolution {resolution} must have the same length.")
+    scale_factors = _plan_scale_factors(shape, resolution, max_top_level_size)
+    chunks = _plan_chunks(shape, resolution, np.dtype(dtype).itemsize, max_chunk_bytes)
+    return scale_factors, chunks
+
+
+def describe_pyramid(
+    shape: Sequence[int],
+    scale_factors: List[List[int]],
+    chunks: Sequence[int],
+    dtype: Union[str, np.dtype] = "uint8",
+) -> pd.DataFrame:
+    """Describe the levels of a multiscale pyramid before converting the data.
+
+    Args:
+        shape: The shape of the data.
+        scale_factors: The scale factors used for down-sampling the data.
+        chunks: The chunks of the data.
+        dtype: The data type of the data.
+
+    Returns:
+        Table with the shape, the absolute scale factor, the number of chunks and the (uncompressed) size
+            in bytes of each level.
+    """
+    itemsize = np.dtype(dtype).itemsize
+    level_shape, abs_factor = [int(sh) for sh in shape], [1] * len(shape)
+    results = []
+    for level in range(len(scale_factors) + 1):
+        if level > 0:
+            factor = scale_factors[level - 1]
+            level_shape = [int(sh) for sh in sample_shape(level_shape, factor)]
+            abs_factor = [af * int(f) for af, f in zip(abs_factor, factor)]
+        n_chunks = int(np.prod([int(ceil(sh / min(ch, sh))) for sh, ch in zip(level_shape, chunks)]))
+        results.append([level, tuple(level_shape), tuple(abs_factor), n_chunks, int(np.prod(level_shape)) * itemsize])
+    return pd.DataFrame(results, columns=["level", "shape", "scale_factor", "n_chunks", "size"])
+
+
+def require_pyramid_parameters(
+    input_path: Union[str, np.ndarray],
+    input_key: Optional[str],
+    resolution: Sequence[float],
+    scale_factors: Optional[List[List[int]]],
+    chunks: Optional[Sequence[int]],
+    channel: Optional[int] = None,
+    max_top_level_size: int = 512,
+    verbose: bool = False,
+) -> Tuple[List[List[int]], List[int]]:
+    """@private
+
+    Plan the scale factors and chunks that are not given, see `plan_pyramid`.
+    With `verbose=True` the pyramid (planned or given) is printed.
+    """
+    if scale_factors is not None and chunks is not None and not verbose:
+        return scale_factors, chunks
+
+    src = open_input(input_path, input_key)
+    shape = tuple(src.shape) if channel is None else tuple(src.shape[1:])
+    # 2d data is converted to 3d for the bdv formats, in which case the resolution is given for 3 axes.
+    if len(shape) == len(resolution) - 1:
+        shape = (1,) + shape
+
+    if scale_factors is None or chunks is None:
+        planned_scale_factors, planned_chunks = plan_pyramid(
+            shape, resolution, src.dtype, max_top_level_size=max_top_level_size
+        )
+        scale_factors = planned_scale_factors if scale_factors is None else scale_factors
+        chunks = planned_chunks if chunks is None else chunks
+
+    if verbose:
+        print("Multiscale pyramid with chunks", chunks)
+        print(describe_pyramid(shape, scale_factors, chunks, src.dtype).to_string(index=False))
+    return scale_factors, chunks
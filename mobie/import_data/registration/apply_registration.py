@@ -86,15 +86,16 @@ def apply_affine(input_path, input_key,
                  transformation, interpolation,
                  shape, resolution, chunks,
                  tmp_folder, target, max_jobs,
-                 bounding_box, file_format):
+                 bounding_box, file_format, skip_empty_chunks=False):
     os.makedirs(tmp_folder, exist_ok=True)
-    registration_affine(input_path, input_key,
-                        output_path, output_key,
-                        transformation, interpolation,
-                        shape=shape, resolution=resolution,
-                        chunks=chunks, tmp_folder=tmp_folder,
-                        target=target, max_jobs=max_jobs,
-                        bounding_box=bounding_box, file_format=file_format)
+    return registration_affine(input_path, input_key,
+                               output_path, output_key,
+                               transformation, interpolation,
+                               shape=shape, resolution=resolution,
+                               chunks=chunks, tmp_folder=tmp_folder,
+                               target=target, max_jobs=max_jobs,
+                               bounding_box=bounding_box, file_format=file_format,
+                               skip_empty_chunks=skip_empty_chunks)
 
 
 def apply_bdv(input_path, output_path, transformation, resolution):
@@ -197,7 +198,7 @@ def apply_registration(input_path, input_key,
                        fiji_executable, elastix_directory,
                        shape, resolution, chunks,
                        tmp_folder, target, max_jobs,
-                       bounding_box=None, file_format="ome.zarr"):
+                       bounding_box=None, file_format="ome.zarr", skip_empty_chunks=False):
     if elastix_parser.get_transformation_type(transformation) is None:
         raise ValueError(f"{transformation} is not an elastix transformation")
 
@@ -234,7 +235,7 @@ def apply_registration(input_path, input_key,
                      transformation, interpolation,
                      shape, resolution, chunks,
                      tmp_folder, target, max_jobs,
-                     bounding_box, file_format)
+                     bounding_box, file_format, skip_empty_chunks=skip_empty_chunks)
     # transform via transformix coordinate mapping, resampled with map_coordinates
     elif method == 'coordinate':
         apply_coordinate(input_path, input_key,
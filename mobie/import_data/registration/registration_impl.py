@@ -15,7 +15,8 @@ from mobie.xml_utils import copy_xml_with_relpath
 from pybdv.metadata import write_affine
 
 from mobie.utils import get_run_config
-from mobie.import_data.utils import _create_level, _open_storage, _remove_output
+from mobie.import_data.utils import (_block_shape, _copy_block, _create_level, _open_storage, _reduce_results,
+                                     _remove_output, _run_blocks, _WriteOptions)
 
 # numpy/scipy interpolation order for the affine method.
 _INTERPOLATION_TO_ORDER = {"nearest": 0, "linear": 1, "quadratic": 2, "cubic": 3}
@@ -43,13 +44,16 @@ def registration_affine(input_path, input_key,
                         transformation, interpolation,
                         shape, resolution, chunks,
                         tmp_folder, target, max_jobs,
-                        bounding_box=None, file_format="ome.zarr"):
+                        bounding_box=None, file_format="ome.zarr", skip_empty_chunks=False):
     """Apply registration via bioimage-py's affine source wrapper.
 
     Only works for affine transformations. This replaces the former nifty-backed
     ``cluster_tools.transformations.AffineTransformationWorkflow``: the elastix transformation is
     converted to a native (numpy zyx, output->input) affine matrix, applied on read via an
     ``AffineSource`` and materialized into the scale-0 dataset with a block-wise ``bp.copy``.
+    With ``skip_empty_chunks`` the chunks that are empty after the transformation (e.g. outside of
+    the transformed input) are not written, see ``mobie.import_data.utils._write_nonempty``.
+    Returns the number of chunks that were skipped because they are empty (0 without ``skip_empty_chunks``).
     """
     # the native matrix is already in numpy (zyx) axis order and the output->input direction that
     # AffineSource expects, so it can be used directly (no axis flip / parameter conversion).
@@ -74,7 +78,8 @@ def registration_affine(input_path, input_key,
     _remove_output(output_path)
     with _open_storage(output_path, file_format, mode="a") as f:
         ds = _create_level(f, file_format, 0, shape, chunks, src.dtype)
-        block_shape = tuple(int(c) for c in ds.chunks)
+        # the shards for sharded data, so that no two workers write to the same shard.
+        block_shape = _block_shape(ds)
         # restrict the computation to the bounding box (output space) when one is given. We derive
         # the block ids from the same full-shape blocking that bp.copy uses internally, so only
         # blocks overlapping the box are written (matching the old block-granular roi behavior).
@@ -84,8 +89,24 @@ def registration_affine(input_path, input_key,
             begin = [0] * len(shape) if bounding_box[0] is None else [int(b) for b in bounding_box[0]]
             end = list(shape) if bounding_box[1] is None else [int(b) for b in bounding_box[1]]
             block_ids = blocking.get_block_ids_overlapping_bounding_box(begin, end)
-        bp.copy(affine, output=ds, block_shape=block_shape, block_ids=block_ids,
-                job_type=job_type, job_config=job_config, num_workers=num_workers)
+        if not skip_empty_chunks:
+            bp.copy(affine, output=ds, block_shape=block_shape, block_ids=block_ids,
+                    job_type=job_type, job_config=job_config, num_workers=num_workers)
+            return 0
+        n_blocks = bp.util.get_blocking(shape, block_shape).number_of_blocks
+
+    # the blocks are written by the workers, which open the output themselves.
+    source = affine if job_type == "local" else affine.to_spec()
+    run_kwargs = dict(job_type=job_type, job_config=job_config, num_workers=num_workers)
+    results = _run_blocks(
+        functools.partial(_copy_block, source=source, out_path=output_path, level=0, block_shape=block_shape,
+                          options=_WriteOptions(file_format, np.dtype(src.dtype).name, skip_empty_chunks=True)),
+        n_blocks, run_kwargs, name="affine", has_return_val=True, block_ids=block_ids,
+    )
+    n_skipped = _reduce_results(results)[1]
+    if skip_empty_chunks:
+        print("Skipped writing", n_skipped, "empty chunks")
+    return n_skipped
 
 
 def registration_bdv(input_path, output_path, transformation, resolution):
@@ -427,7 +448,8 @@ def registration_coordinate(input_path, input_key,
     _remove_output(output_path)
     with _open_storage(output_path, file_format, mode="a") as f:
         ds = _create_level(f, file_format, 0, shape, chunks, dtype)
-        block_shape = tuple(int(c) for c in ds.chunks)
+        # the shards for sharded data, so that no two workers write to the same shard.
+        block_shape = _block_shape(ds)
 
     blocking = bp.util.get_blocking(shape, block_shape)
     if bounding_box is None:
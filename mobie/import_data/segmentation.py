@@ -1,7 +1,11 @@
 """Functionality for converting segmentation data into a format compatible with MoBIE.
 """
 from typing import List, Optional, Sequence, Tuple
-from .utils import add_max_id, downscale, get_scale_key
+
+import numpy as np
+
+from .utils import (add_max_id, downscale, get_scale_key, label_downsampling_mode, narrowed_input_dtype,
+                    write_segmentation)
 
 
 def import_segmentation(
@@ -18,8 +22,17 @@ def import_segmentation(
     with_max_id: bool = True,
     unit: str = "micrometer",
     source_name: Optional[str] = None,
-    file_format: str = "ome.zarr"
-) -> None:
+    file_format: str = "ome.zarr",
+    resumable: bool = False,
+    compression: Optional[str] = None,
+    compression_level: Optional[int] = None,
+    read_slabs: bool = False,
+    narrow_dtype: bool = False,
+    skip_empty_chunks: bool = False,
+    relabel_consecutive: bool = False,
+    downsampling_mode: str = "nearest",
+    morphology_folder: Optional[str] = None,
+) -> Optional[np.ndarray]:
     """Import segmentation data into a MoBIE-compatible format.
 
     Args:
@@ -37,15 +50,66 @@ def import_segmentation(
         unit: The physical unit of the coordinate system.
         source_name: The name of the source.
         file_format: The output file format.
+        resumable: Whether to record the progress of the conversion, so that an interrupted
+            conversion can be resumed by calling this function again with the same arguments.
+            Only the conversion of file inputs can be resumed.
+        compression: The compression codec for the converted data, one of "blosc-lz4", "blosc-zstd",
+            "gzip" or "raw". By default the default compression of the file format is used.
+        compression_level: The compression level. By default the default level of the codec is used.
+        read_slabs: Whether to read the input in slabs along the first axis, which reads each page of a tif
+            stack or each file of a folder of slices only once. See `utils.downscale` for details.
+        narrow_dtype: Whether to store the segmentation with the smallest unsigned integer type that holds its
+            max id. The max id is read from the `maxId` attribute of the input if given; otherwise it is computed
+            in an additional pass over the input, whose result is also used for the `maxId` attribute.
+        skip_empty_chunks: Whether to leave the chunks that only contain background (0) unwritten,
+            which saves storage for sparse segmentations. See `utils.downscale` for details.
+        relabel_consecutive: Whether to relabel the ids of the segmentation to consecutive ids (1, 2, 3, ...,
+            the background id 0 is kept). The unique ids are computed block-wise and the mapping is applied
+            while writing the full resolution level. This makes the `maxId` attribute equal to the number of
+            segments, which also allows narrowing the dtype for sparse ids. The options `resumable` and
+            `read_slabs` are not used in this case.
+        downsampling_mode: How the labels are downsampled: "nearest" (nearest-neighbor sampling), "mode" (the most
+            frequent label of each window) or "mode-nonzero" (the most frequent non-zero label of each window,
+            so that objects are kept as long as they are present in the window). See `utils.downscale` for details.
+        morphology_folder: The folder for saving the per-label statistics of the blocks that are written to the
+            full resolution level, from which the default table can be computed without reading the data again.
+            See `utils.downscale` for details.
+
+    Returns:
+        The lookup table of ``(old_id, new_id)`` pairs if `relabel_consecutive` is set, None otherwise.
     """
+    mode = label_downsampling_mode(downsampling_mode)
+    if relabel_consecutive:
+        out_key = get_scale_key(file_format)
+        lut, _ = write_segmentation(in_path, in_key, out_path, out_key,
+                                    None, chunks, metadata_format=file_format,
+                                    target=target, max_jobs=max_jobs, tmp_folder=tmp_folder,
+                                    compression=compression, compression_level=compression_level,
+                                    narrow_dtype=narrow_dtype, skip_empty_chunks=skip_empty_chunks,
+                                    relabel_consecutive=True, morphology_folder=morphology_folder)
+        downscale(out_path, out_key, out_path,
+                  resolution, scale_factors, chunks,
+                  tmp_folder, target, max_jobs, block_shape,
+                  library="vigra", library_kwargs={"order": 0},
+                  unit=unit, source_name=source_name,
+                  metadata_format=file_format, skip_empty_chunks=skip_empty_chunks,
+                  compression=compression, compression_level=compression_level, downsampling_mode=mode)
+        return lut
+
+    dtype = narrowed_input_dtype(in_path, in_key, tmp_folder, target, max_jobs) if narrow_dtype else None
     # 2d input is promoted to 3d on the fly inside downscale for the bdv formats (ome.zarr keeps 2d).
     downscale(in_path, in_key, out_path,
               resolution, scale_factors, chunks,
               tmp_folder, target, max_jobs, block_shape,
               library="vigra", library_kwargs={"order": 0},
               unit=unit, source_name=source_name,
-              metadata_format=file_format)
+              metadata_format=file_format, resumable=resumable,
+              compression=compression, compression_level=compression_level, read_slabs=read_slabs,
+              with_max_id=with_max_id, dtype=dtype, skip_empty_chunks=skip_empty_chunks,
+              downsampling_mode=mode, morphology_folder=morphology_folder)
 
+    # the max id is computed while writing the data; it is only computed separately if the scale-0 level
+    # was not written by downscale.
     if with_max_id:
         out_key = get_scale_key(file_format)
         add_max_id(in_path, in_key, out_path, out_key, tmp_folder, target, max_jobs)
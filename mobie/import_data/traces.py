@@ -15,6 +15,8 @@ from pybdv.metadata import (write_h5_metadata,
 from pybdv.util import get_key
 from tqdm import tqdm
 
+from .utils import _write_region
+
 
 def is_ome_zarr(path):
     """@private
@@ -130,9 +132,10 @@ def parse_traces(trace_folder):
 
 
 def traces_to_volume(traces, out_path, key, shape, resolution, chunks,
-                     radius, n_threads, crop_overhanging=True):
+                     radius, n_threads, crop_overhanging=True, skip_empty_chunks=False):
     """@private
     """
+    n_skipped = 0
     # write temporary h5 dataset
     # and write coordinates (with some radius) to it
     with open_file(out_path, mode="a") as f:
@@ -161,7 +164,10 @@ def traces_to_volume(traces, out_path, key, shape, resolution, chunks,
             sub_vol = ds[bb]
             trace_mask = this_trace != 0
             sub_vol[trace_mask] = this_trace[trace_mask]
-            ds[bb] = sub_vol
+            n_skipped += _write_region(ds, bb, sub_vol, skip_empty_chunks)
+    if skip_empty_chunks:
+        print("Skipped writing", n_skipped, "empty chunks")
+    return n_skipped
 
 
 def import_traces(
@@ -176,6 +182,7 @@ def import_traces(
     max_jobs: int = 8,
     unit: str = "micrometer",
     source_name: Optional[str] = None,
+    skip_empty_chunks: bool = False,
 ) -> None:
     """Convert trace data into a MoBIE-compatible format.
 
@@ -191,6 +198,7 @@ def import_traces(
         max_jobs: The number of threads to use for parallelization.
         unit: The physical unit of the coordinate system.
         source_name: The name of the source.
+        skip_empty_chunks: Whether to leave the chunks around the traces that do not contain any trace unwritten.
     """
 
     traces = parse_traces(input_folder)
@@ -215,7 +223,8 @@ def import_traces(
 
     key0 = get_key(is_h5, timepoint=0, setup_id=0, scale=0)
     print("Writing traces ...")
-    traces_to_volume(traces, out_path, key0, shape, resolution, chunks, radius, max_jobs)
+    traces_to_volume(traces, out_path, key0, shape, resolution, chunks, radius, max_jobs,
+                     skip_empty_chunks=skip_empty_chunks)
 
     print("Downscaling traces ...")
     make_scales(out_path, scale_factors, downscale_mode="max",
@@ -1,30 +1,76 @@
 """@private
 """
+import functools
+import hashlib
+import itertools
+import json
+import mmap
 import os
 import shutil
+import socket
+import tempfile
+import threading
+import warnings
+from contextlib import ExitStack, contextmanager
+from dataclasses import asdict, dataclass
+from glob import glob
+from math import ceil, floor
+from typing import Optional
 
+import bioimage_cpp as bic
+import bioimage_py as bp
 import h5py
 import numpy as np
+import tifffile
 import z5py
 from bioimage_py import copy, open_source, stats
-from bioimage_py.sources import as_source
-from bioimage_py.wrapper import ExpandDimsSource, ResizedSource, RoiSource
+from bioimage_py.io import register_format
+from bioimage_py.sources import Source, SourceSpec, as_source, from_spec
+from bioimage_py.util import get_blocking, sigma_to_halo, to_roi
+from bioimage_py.wrapper import (ExpandDimsSource, ResizedSource, RoiSource, SimpleTransformationSource,
+                                 WrapperSource, register_wrapper)
 from elf.io import open_file
 from pybdv.downsample import sample_shape
 
+from ..tables.default_table import save_block_morphology
 from ..utils import get_run_config
 from ._format_metadata import write_format_metadata
 
+try:
+    import hdf5plugin
+except ImportError:
+    hdf5plugin = None
+
 # anti-aliasing (gaussian pre-smoothing before downsampling) is only supported for these dtypes.
 _ANTI_ALIASING_DTYPES = ("float32", "float64", "uint8", "uint16")
 
+# the label downsampling modes: the most frequent label of each window ("mode"), or the most frequent
+# non-zero label, so that objects only vanish if the window holds no object at all ("mode-nonzero").
+LABEL_DOWNSAMPLING_MODES = ("mode", "mode-nonzero")
+
+# the compression codecs that can be chosen for the converted data (in addition to the backend default).
+COMPRESSION_CODECS = ("blosc-lz4", "blosc-zstd", "gzip", "raw")
+
+# the sharded ome.zarr format groups the chunks into shards, which are stored in one file each.
+# a shard holds at most this many chunks and (uncompressed) bytes; the bytes limit keeps the shards,
+# which are the blocks written by one worker, small enough to be held in memory.
+_MAX_CHUNKS_PER_SHARD = 1024
+_SHARD_BYTES = 64 * 1024 ** 2
+
+# the maximal size (in bytes) of the base region that is held in memory per block of a fused
+# pyramid sweep. It determines how many levels can be computed from one read of the base level.
+_FUSED_BLOCK_BYTES = 256 * 1024 ** 2
+
+# the maximal size (in bytes) of a slab of the input that is read at once, see `_copy_level_slabs`.
+_SLAB_BYTES = 256 * 1024 ** 2
+
 
 def get_scale_key(file_format, scale=0):
     if file_format == "bdv.n5":
         out_key = f"setup0/timepoint0/s{scale}"
     elif file_format == "bdv.hdf5":
         out_key = f"t00000/s00/{scale}/cells"
-    elif file_format in ("ome.zarr", "ome.zarr.s3"):
+    elif file_format in ("ome.zarr", "ome.zarr.s3", "ome.zarr.v3"):
         out_key = f"s{scale}"
     else:
         raise ValueError("Invalid file-format: {file_format}")
@@ -34,12 +80,15 @@ def get_scale_key(file_format, scale=0):
 def _open_storage(path, metadata_format, mode="a"):
     """Open the output container with the backend that writes the on-disk format MoBIE expects.
 
-    ome.zarr is written as zarr v2 (`.zarray` + dimension_separator='/') via z5py, bdv.n5 as n5
-    via z5py, and bdv.hdf5 via h5py. (`elf.io.open_file` is intentionally not used here because it
-    writes zarr v3, which is incompatible with the MoBIE NGFF v0.4 layout.)
+    ome.zarr is written as zarr v2 (`.zarray` + dimension_separator='/') via z5py, ome.zarr.v3 as
+    sharded zarr v3 (NGFF v0.5 layout) via z5py, bdv.n5 as n5 via z5py, and bdv.hdf5 via h5py.
+    (`elf.io.open_file` is intentionally not used here because it writes zarr v3 for any zarr path,
+    which is incompatible with the MoBIE NGFF v0.4 layout.)
     """
     if metadata_format == "ome.zarr":
         return z5py.File(path, mode=mode, dimension_separator="/")
+    elif metadata_format == "ome.zarr.v3":
+        return z5py.File(path, mode=mode, zarr_format=3)
     elif metadata_format == "bdv.n5":
         return z5py.File(path, mode=mode)
     elif metadata_format in ("bdv", "bdv.hdf5"):
@@ -52,11 +101,203 @@ def _open_data(path, mode="r"):
     ext = os.path.splitext(path)[1]
     if ext == ".n5":
         return z5py.File(path, mode=mode)
+    elif ext in (".zarr", ".zr") and os.path.exists(os.path.join(path, "zarr.json")):
+        return z5py.File(path, mode=mode, zarr_format=3)
     elif ext in (".zarr", ".zr"):
         return z5py.File(path, mode=mode, dimension_separator="/")
     return h5py.File(path, mode=mode)
 
 
+def _slice_pattern(folder):
+    """The glob pattern for a folder of 2d slice files, which is opened as one volume."""
+    extensions = {os.path.splitext(name)[1] for name in os.listdir(folder) if not name.startswith(".")}
+    if len(extensions) != 1:
+        raise ValueError(
+            f"Could not determine the slice files in {folder}, please pass their glob pattern (e.g. '*.tif') as key."
+        )
+    return "*" + extensions.pop()
+
+
+class _TifPageSource(Source):
+    """A multi-page tif with compressed pages, each page holding one slice along the first axis.
+
+    bioimage-py memory-maps uncompressed tifs, but reads compressed tifs into memory at once.
+    This source only decodes the pages that overlap the requested region.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with tifffile.TiffFile(path) as tif:
+            series = tif.series[0]
+            self._shape = tuple(int(sh) for sh in series.shape)
+            self._dtype = np.dtype(series.dtype)
+
+    @staticmethod
+    def is_compressed_stack(path):
+        if not (str(path).lower().endswith((".tif", ".tiff")) and os.path.isfile(path)):
+            return False
+        with tifffile.TiffFile(path) as tif:
+            series = tif.series[0]
+            is_paged = len(series.shape) == 3 and len(tif.pages) == series.shape[0]
+            return is_paged and not series.dataoffset
+
+    @property
+    def shape(self):
+        return self._shape
+
+    @property
+    def dtype(self):
+        return self._dtype
+
+    def _getitem(self, roi):
+        begin, end = roi[0].start, roi[0].stop
+        if end <= begin:
+            return np.zeros((0,) + tuple(sl.stop - sl.start for sl in roi[1:]), dtype=self._dtype)
+        with tifffile.TiffFile(self.path) as tif:
+            data = tif.asarray(key=range(begin, end)).reshape((end - begin,) + self._shape[1:])
+        return data[(slice(None),) + tuple(roi[1:])]
+
+    def _setitem(self, roi, value):
+        raise NotImplementedError("The tif source is read-only.")
+
+    def to_spec(self):
+        raise ValueError("A compressed tif source cannot be reopened in another process.")
+
+
+def open_input(in_path, in_key=None):
+    """@private
+
+    Open the input data as a source. The input is either given by a file path (and the key of the data in it),
+    or by an array, e.g. a numpy array, numpy memmap, zarr array or dask array, which is used directly.
+    A folder of 2d slice files is opened as one volume, with the slices along the first axis,
+    and the pages of a compressed multi-page tif are decoded on demand. A numpy memmap is read from its file.
+    """
+    if isinstance(in_path, (str, os.PathLike)):
+        if in_key is None and os.path.isdir(in_path) and not os.path.splitext(str(in_path).rstrip(os.sep))[1]:
+            in_key = _slice_pattern(in_path)
+        if in_key is None and _TifPageSource.is_compressed_stack(in_path):
+            return _TifPageSource(in_path)
+        return open_source(in_path, in_key) if in_key else open_source(in_path)
+    if isinstance(in_path, np.memmap):
+        src = _memmap_source(in_path)
+        if src is not None:
+            return src
+    return as_source(in_path)
+
+
+def read_sample(in_path, in_key, shape):
+    """@private
+
+    Read a sample of the input with the given shape, which is clipped to the shape of the input.
+    The sample is read from the center of the data, which is more representative than the corner.
+    """
+    src = open_input(in_path, in_key)
+    shape = [min(int(sh), int(full_sh)) for sh, full_sh in zip(shape, src.shape)]
+    begin = [(full_sh - sh) // 2 for sh, full_sh in zip(shape, src.shape)]
+    bb = tuple(slice(b, b + sh) for b, sh in zip(begin, shape))
+    return np.asarray(src[bb])
+
+
+def _input_id(in_path):
+    """The identifier of the input in the conversion journal: the path of the file (or folder) that holds it,
+    or None for in-memory arrays."""
+    if isinstance(in_path, (str, os.PathLike)):
+        return os.path.abspath(in_path)
+    if isinstance(in_path, np.memmap) and in_path.filename is not None:
+        return os.path.abspath(in_path.filename)
+    return None
+
+
+def _input_fingerprint(in_path, in_key):
+    """The size and modification time of the files that hold the input, which tell the conversion journal
+    whether the input was changed or replaced since the interrupted conversion.
+
+    Inputs stored in a folder (n5 or zarr containers, folders of slices) are fingerprinted by the entries
+    of the dataset's folder or by the matching slice files. Nested chunks are only covered by the modification
+    time of their sub-folders, which changes when chunks are added or removed, but not when they are rewritten.
+    """
+    path = _input_id(in_path)
+    if path is None:
+        return None
+    if os.path.isfile(path):
+        paths = [path]
+    else:
+        paths = []
+        for key in (in_key if isinstance(in_key, (list, tuple)) else [in_key]):
+            folder = os.path.join(path, key) if key else path
+            if os.path.isdir(folder):
+                paths.extend(os.path.join(folder, name) for name in os.listdir(folder))
+            else:
+                paths.extend(glob(folder))
+    entries = sorted(
+        (os.path.relpath(entry, path), stat.st_size, stat.st_mtime_ns)
+        for entry, stat in ((entry, os.stat(entry)) for entry in paths)
+    )
+    return hashlib.sha1(json.dumps(entries).encode("utf-8")).hexdigest()
+
+
+def _open_memmap(path, mode="r", dtype="uint8", shape=None, offset=0, order="C"):
+    """Open a raw binary file as a numpy memmap, so that memmap inputs can be reopened by the workers."""
+    return np.memmap(path, mode=mode, dtype=dtype, shape=None if shape is None else tuple(shape),
+                     offset=offset, order=order)
+
+
+register_format("memmap", [], _open_memmap)
+
+
+def _memmap_source(data):
+    """Open a numpy memmap input from its file, so that its spec can be reopened by the workers.
+
+    Returns None for memmaps that are views into a file (e.g. slices), which can't be described by
+    the file, offset, shape and order alone.
+    """
+    if not isinstance(data.base, mmap.mmap) or data.filename is None:
+        return None
+    if data.flags.c_contiguous:
+        order = "C"
+    elif data.flags.f_contiguous:
+        order = "F"
+    else:
+        return None
+    return open_source(data.filename, "", format="memmap", dtype=data.dtype.str,
+                       shape=tuple(int(sh) for sh in data.shape), offset=int(data.offset), order=order)
+
+
+def _is_reopenable(src):
+    """Whether the source can be reopened in another process, i.e. by the workers of the distributed targets."""
+    try:
+        src.to_spec()
+    except ValueError:
+        return False
+    return True
+
+
+@contextmanager
+def _distributable(src, run_kwargs, tmp_folder):
+    """Make sure that the workers of the distributed targets can reopen the source.
+
+    In-memory arrays (numpy, dask) and compressed tifs can't be reopened in another process. For the
+    'subprocess' and 'slurm' targets they are handed off via an uncompressed n5 file in a folder of its own
+    in the tmp folder, so that conversions sharing the tmp folder don't clash. The handoff is removed on exit.
+    """
+    if run_kwargs["job_type"] == "local" or _is_reopenable(src):
+        yield src
+        return
+    os.makedirs(tmp_folder, exist_ok=True)
+    handoff_folder = tempfile.mkdtemp(prefix="input_", dir=tmp_folder)
+    try:
+        handoff_path = os.path.join(handoff_folder, "input.n5")
+        with z5py.File(handoff_path, mode="w") as f:
+            chunks = tuple(min(64, int(sh)) for sh in src.shape)
+            ds = f.create_dataset("data", shape=src.shape, chunks=chunks, dtype=src.dtype, compression="raw")
+            # copy in slabs along the first axis, so that the pages of a tif are only decoded once.
+            block_shape = chunks[:1] + tuple(int(sh) for sh in src.shape[1:])
+            copy(src, output=ds, block_shape=block_shape, num_workers=run_kwargs["num_workers"])
+        yield open_source(handoff_path, "data")
+    finally:
+        shutil.rmtree(handoff_folder, ignore_errors=True)
+
+
 def _downsampling_params(library, library_kwargs, dtype):
     """Translate the legacy (vigra/skimage) downscaling options into bioimage-py parameters.
 
@@ -75,6 +316,113 @@ def _downsampling_params(library, library_kwargs, dtype):
     return order, anti_aliasing
 
 
+# windows with up to this many voxels (e.g. for the scale factors 2 x 2 x 2 or 1 x 2 x 2) count the labels
+# by comparing all pairs of window positions, which is faster than sorting the windows for small windows.
+_MAX_PAIRWISE_WINDOW = 8
+
+
+def _label_mode(data, window, nonzero_wins=False):
+    """Downsample `data` by taking the most frequent label of each window; ties go to the smaller label.
+
+    The windows of ``window`` voxels tile the data, which must be divisible by the window along each axis.
+    With `nonzero_wins` the background (0) is only chosen for windows that don't contain any other label.
+    """
+    ndim = data.ndim
+    out_shape = tuple(sh // w for sh, w in zip(data.shape, window))
+    window_size = int(np.prod(window))
+    if window_size == 1:
+        return data
+    # (o0, w0, o1, w1, ...) -> (w0 * w1 * ..., o0, o1, ...), so that each entry of the first axis
+    # holds the labels at one position of all windows.
+    windows = data.reshape([x for o, w in zip(out_shape, window) for x in (o, w)])
+    windows = windows.transpose(list(range(1, 2 * ndim, 2)) + list(range(0, 2 * ndim, 2)))
+    windows = windows.reshape((window_size,) + out_shape)
+
+    if window_size <= _MAX_PAIRWISE_WINDOW:
+        counts = np.ones((window_size,) + out_shape, dtype="uint8")
+        for i in range(window_size):
+            for j in range(i + 1, window_size):
+                equal = windows[i] == windows[j]
+                counts[i] += equal
+                counts[j] += equal
+        if nonzero_wins:
+            counts[windows == 0] = 0
+        result, best_count = windows[0].copy(), counts[0]
+        for i in range(1, window_size):
+            better = (counts[i] > best_count) | ((counts[i] == best_count) & (windows[i] < result))
+            result[better] = windows[i][better]
+            best_count = np.where(better, counts[i], best_count)
+        return result
+
+    # sort the labels of each window (one window per row).
+    windows = np.sort(windows.reshape((window_size, -1)).T, axis=1)
+    # the length of the run of equal labels up to each position of the sorted windows.
+    positions = np.arange(window_size)
+    run_start = np.ones(windows.shape, dtype=bool)
+    run_start[:, 1:] = windows[:, 1:] != windows[:, :-1]
+    run_length = positions - np.maximum.accumulate(np.where(run_start, positions, 0), axis=1) + 1
+    if nonzero_wins:
+        run_length[windows == 0] = 0
+    best = run_length.argmax(axis=1)
+    return windows[np.arange(windows.shape[0]), best].reshape(out_shape)
+
+
+@register_wrapper
+class _LabelModeSource(WrapperSource):
+    """Downsample the wrapped label source to `shape` on read, see `_label_mode`.
+
+    Each output voxel covers a window of ``source_shape // shape`` input voxels, the input voxels at the
+    upper border that are not covered by a full window are dropped (as for the level shapes, see `sample_shape`).
+    """
+
+    def __init__(self, source, shape, nonzero_wins=False):
+        super().__init__(source)
+        self._shape = tuple(int(sh) for sh in shape)
+        self._window = tuple(max(1, int(ish) // osh) for ish, osh in zip(self._source.shape, self._shape))
+        self._nonzero_wins = bool(nonzero_wins)
+
+    @property
+    def shape(self):
+        return self._shape
+
+    @property
+    def chunks(self):
+        src_chunks = self._source.chunks
+        if src_chunks is None:
+            return None
+        return tuple(max(1, int(ch) // w) for ch, w in zip(src_chunks, self._window))
+
+    @property
+    def shards(self):
+        return None
+
+    def _params(self):
+        return {"shape": self._shape, "nonzero_wins": self._nonzero_wins}
+
+    def _getitem(self, roi):
+        in_bb = tuple(slice(sl.start * w, sl.stop * w) for sl, w in zip(roi, self._window))
+        return _label_mode(np.asarray(self._source[in_bb]), self._window, self._nonzero_wins)
+
+
+def label_downsampling_mode(downsampling_mode):
+    """Translate the `downsampling_mode` of the segmentation imports ("nearest", "mode" or "mode-nonzero")
+    into the argument of `downscale`, where nearest-neighbor sampling is given by None."""
+    if downsampling_mode == "nearest":
+        return None
+    if downsampling_mode not in LABEL_DOWNSAMPLING_MODES:
+        raise ValueError(
+            f"Invalid downsampling_mode {downsampling_mode}, choose one of {('nearest',) + LABEL_DOWNSAMPLING_MODES}."
+        )
+    return downsampling_mode
+
+
+def _resized(source, shape, order, anti_aliasing, downsampling_mode=None):
+    """Resize the source to the shape of the next level, with a label `downsampling_mode` if given."""
+    if downsampling_mode is None:
+        return ResizedSource(source, shape, order=order, anti_aliasing=anti_aliasing)
+    return _LabelModeSource(source, shape, nonzero_wins=downsampling_mode == "mode-nonzero")
+
+
 def _remove_output(out_path):
     """Remove a previous conversion at the output location (data + companion bdv xml)."""
     if os.path.isdir(out_path):
@@ -88,7 +436,7 @@ def _remove_output(out_path):
 
 def _validate(ndim, resolution, scale_factors, metadata_format):
     # ome.zarr can also be written in 2d, all other formats require 3d.
-    if metadata_format != "ome.zarr" and ndim != 3:
+    if not metadata_format.startswith("ome.zarr") and ndim != 3:
         raise ValueError(f"Expect 3d data for the {metadata_format} format, got ndim={ndim}")
     if len(resolution) != ndim:
         raise ValueError(f"Expect resolution of length {ndim}, got: resolution={resolution}")
@@ -97,24 +445,764 @@ def _validate(ndim, resolution, scale_factors, metadata_format):
             raise ValueError(f"Expect scale factors of length {ndim}, got: {sf}")
 
 
-def _create_level(f, metadata_format, scale, shape, chunks, dtype):
+def _compression_options(metadata_format, compression=None, compression_level=None):
+    """Translate the compression codec and level into `create_dataset` arguments for the format's backend.
+
+    `compression=None` keeps the default compression of the backend (blosc-lz4 for zarr, gzip for n5,
+    no compression for hdf5). Blosc compression for hdf5 requires the `hdf5plugin` package; the level of
+    blosc compression can only be chosen for hdf5 and zarr v3.
+    """
+    if compression is None:
+        if compression_level is not None:
+            raise ValueError("A compression_level can only be given together with a compression codec.")
+        return {}
+    if compression not in COMPRESSION_CODECS:
+        raise ValueError(f"Invalid compression {compression}, choose one of {COMPRESSION_CODECS}.")
+    codec, _, blosc_codec = compression.partition("-")
+
+    if metadata_format in ("bdv", "bdv.hdf5"):
+        if codec == "raw":
+            return {}
+        if codec == "gzip":
+            return {"compression": "gzip", "compression_opts": compression_level}
+        if hdf5plugin is None:
+            raise ValueError(f"The {compression} compression for the bdv.hdf5 format requires hdf5plugin.")
+        clevel = 5 if compression_level is None else compression_level
+        return dict(hdf5plugin.Blosc(cname=blosc_codec, clevel=clevel, shuffle=hdf5plugin.Blosc.SHUFFLE))
+
+    options = {"compression": codec}
+    if codec == "blosc" and metadata_format == "ome.zarr.v3":
+        options["codec"] = blosc_codec
+        if compression_level is not None:
+            options["level"] = compression_level
+    elif codec == "blosc":
+        options["codec"] = blosc_codec
+        # z5py always writes blosc with its default level for zarr v2 and n5.
+        if compression_level is not None:
+            warnings.warn(f"The compression level is not supported for {compression} in the {metadata_format} "
+                          "format and will be ignored.")
+    elif codec == "gzip" and compression_level is not None:
+        options["level"] = compression_level
+    return options
+
+
+def _check_output(metadata_format, target, compression=None, compression_level=None, downsampling_mode=None):
+    """Fail early for invalid output options, before any data is written."""
+    if metadata_format in ("bdv", "bdv.hdf5") and target == "slurm":
+        raise ValueError(
+            "The bdv.hdf5 format does not support distributed (slurm) writing. "
+            "Use target='local' or a different file format."
+        )
+    _compression_options(metadata_format, compression, compression_level)
+    if downsampling_mode is not None and downsampling_mode not in LABEL_DOWNSAMPLING_MODES:
+        raise ValueError(
+            f"Invalid downsampling_mode {downsampling_mode}, choose one of {LABEL_DOWNSAMPLING_MODES}."
+        )
+
+
+@dataclass(frozen=True)
+class _WriteOptions:
+    """How the blocks of a conversion are computed and written; passed to the block functions of all levels.
+
+    The levels are written in the `metadata_format` with the given `dtype` and compression, and downsampled
+    with the interpolation `order` and `anti_aliasing`, or with a label `downsampling_mode` (see `_resized`).
+    With `skip_empty_chunks` the empty chunks of all levels are left absent. The max id (`with_max_id`) and
+    the per-label statistics (`morphology_folder`) are computed from the blocks of the scale-0 level,
+    see `_write_block`.
+    """
+    metadata_format: str
+    dtype: str
+    order: int = 0
+    anti_aliasing: bool = False
+    downsampling_mode: Optional[str] = None
+    compression: Optional[str] = None
+    compression_level: Optional[int] = None
+    skip_empty_chunks: bool = False
+    with_max_id: bool = False
+    morphology_folder: Optional[str] = None
+
+    @property
+    def compression_kwargs(self):
+        return {"compression": self.compression, "compression_level": self.compression_level}
+
+    def writes_blocks(self, level):
+        """Whether the blocks of the level are written by `_write_block`, rather than copied as they are."""
+        return self.skip_empty_chunks or (level == 0 and (self.with_max_id or self.morphology_folder is not None))
+
+
+def _write_options(metadata_format, dtype, library, library_kwargs, **kwargs):
+    """The write options for data of the given dtype, downsampled as given by `library` and `library_kwargs`."""
+    order, anti_aliasing = _downsampling_params(library, library_kwargs, dtype)
+    return _WriteOptions(metadata_format, np.dtype(dtype).name, order, anti_aliasing, **kwargs)
+
+
+def _shard_shape(chunks, shape, itemsize):
+    """The shard shape for the sharded ome.zarr format: the same number of chunks along each axis,
+    limited by `_MAX_CHUNKS_PER_SHARD` and `_SHARD_BYTES`, and clipped to the (chunk-aligned) shape.
+    """
+    chunk_bytes = int(np.prod(chunks)) * itemsize
+    n_chunks = max(1, min(_MAX_CHUNKS_PER_SHARD, _SHARD_BYTES // chunk_bytes))
+    factor = max(1, int(floor(n_chunks ** (1.0 / len(chunks)) + 1e-6)))
+    return tuple(min(c * factor, ceil(s / c) * c) for c, s in zip(chunks, shape))
+
+
+def _block_shape(ds):
+    """The blocks of a level that can be written concurrently: the shards for sharded data, otherwise the chunks.
+    """
+    shards = getattr(ds, "shards", None)
+    return tuple(int(s) for s in (ds.chunks if shards is None else shards))
+
+
+def _create_level(f, metadata_format, scale, shape, chunks, dtype, exist_ok=False,
+                  compression=None, compression_level=None, n_leading_axes=0):
     key = get_scale_key(metadata_format, scale)
     shape = tuple(int(s) for s in shape)
     # clip the chunks to the level shape: h5py rejects chunks larger than the data shape, and
-    # keeping block_shape == chunks (see below) guarantees safe concurrent block writes.
+    # writing in blocks of the chunks (or shards, see `_block_shape`) guarantees safe concurrent block writes.
     level_chunks = tuple(int(min(c, s)) for c, s in zip(chunks, shape))
-    return f.create_dataset(key, shape=shape, chunks=level_chunks, dtype=dtype)
+    # an existing level is only re-used when resuming an interrupted conversion.
+    if exist_ok and key in f:
+        ds = f[key]
+        if tuple(ds.shape) != shape or np.dtype(ds.dtype) != np.dtype(dtype):
+            raise RuntimeError(f"The existing level {key} does not match the expected shape {shape} and dtype {dtype}")
+        return ds
+    compression_options = _compression_options(metadata_format, compression, compression_level)
+    if metadata_format == "ome.zarr.v3":
+        # the leading (time or channel) axes are written by separate blocks, so a shard spans a single index.
+        spatial_shards = _shard_shape(level_chunks[n_leading_axes:], shape[n_leading_axes:], np.dtype(dtype).itemsize)
+        compression_options["shards"] = (1,) * n_leading_axes + spatial_shards
+    # chunks that are not written (see `_write_nonempty`) are read as the fill value.
+    return f.create_dataset(key, shape=shape, chunks=level_chunks, dtype=dtype, fillvalue=0, **compression_options)
+
+
+class _PyramidJournal:
+    """Journal of the completed blocks of a pyramid conversion, stored in a folder next to the output.
+
+    Each process (and thread) appends the ids of the blocks it has written to its own file, so that
+    the records of concurrent workers don't interfere. The result of a block (e.g. its max id) is
+    recorded along with its id. The journal is only valid for the conversion config it was created for.
+    """
+
+    def __init__(self, out_path):
+        self.folder = os.path.abspath(out_path).rstrip(os.sep) + ".journal"
+
+    @property
+    def config_path(self):
+        return os.path.join(self.folder, "config.json")
+
+    def matches(self, config):
+        if not os.path.exists(self.config_path):
+            return False
+        with open(self.config_path) as f:
+            return json.load(f) == json.loads(json.dumps(config))
+
+    def reset(self, config):
+        self.remove()
+        os.makedirs(self.folder)
+        with open(self.config_path, "w") as f:
+            json.dump(config, f)
+
+    def remove(self):
+        if os.path.exists(self.folder):
+            shutil.rmtree(self.folder)
+
+    def record(self, step, block_id, result=None):
+        name = f"{step}.{socket.gethostname()}.{os.getpid()}.{threading.get_ident()}.txt"
+        with open(os.path.join(self.folder, name), "a") as f:
+            f.write(f"{block_id} {json.dumps(result)}\n")
+
+    def completed(self, step):
+        """Return the completed blocks of a step, mapping the block ids to their results."""
+        done = {}
+        for name in os.listdir(self.folder):
+            if not (name.startswith(f"{step}.") and name.endswith(".txt")):
+                continue
+            with open(os.path.join(self.folder, name)) as f:
+                # ignore a (possibly) truncated last line from an interrupted write.
+                lines = f.read().split("\n")[:-1]
+            for line in lines:
+                block_id, result = line.split(" ", 1)
+                done[int(block_id)] = json.loads(result)
+        return done
+
+
+def _journaled_block(block_id, function, journal, step):
+    result = function(block_id)
+    journal.record(step, block_id, result)
+    return result
+
+
+def _run_blocks(function, n_blocks, run_kwargs, name, journal=None, step=None, has_return_val=False,
+                block_ids=None):
+    """Run `function(block_id)` for all blocks (or the given `block_ids`), skipping the blocks that are
+    completed in the journal.
+
+    With `has_return_val=True` the results of all blocks are returned, including the (journaled)
+    results of the blocks that were completed before.
+    """
+    block_ids = list(range(n_blocks)) if block_ids is None else [int(block_id) for block_id in block_ids]
+    item_ids, results = block_ids, {}
+    if journal is not None:
+        results = journal.completed(step)
+        item_ids = [block_id for block_id in item_ids if block_id not in results]
+        function = functools.partial(_journaled_block, function=function, journal=journal, step=step)
+    if item_ids:
+        runner = bp.get_runner(run_kwargs["job_type"], run_kwargs["job_config"])
+        values = runner.map(function, item_ids=item_ids, num_workers=run_kwargs["num_workers"],
+                            has_return_val=has_return_val, name=name)
+        if has_return_val:
+            results.update(zip(item_ids, values))
+    return [results[block_id] for block_id in block_ids] if has_return_val else None
+
+
+def _block_max(data):
+    return int(data.max()) if data.size else 0
+
+
+def _write_nonempty(ds, bb, data):
+    """Write `data` to the region `bb` of the dataset, leaving the chunks that only hold the fill value (0) absent.
+
+    The chunks are the write blocks of the dataset (the shards for sharded data, see `_block_shape`).
+    Absent chunks are read as the fill value. Returns the number of chunks that were skipped.
+    """
+    grid = _block_shape(ds)
+    chunk_ranges = [range(b.start // g, ceil(b.stop / g)) for b, g in zip(bb, grid)]
+    if not data.any():
+        return int(np.prod([len(rg) for rg in chunk_ranges]))
+    n_skipped = 0
+    for chunk_id in itertools.product(*chunk_ranges):
+        chunk_bb = tuple(slice(max(c * g, b.start), min((c + 1) * g, b.stop)) for c, g, b in zip(chunk_id, grid, bb))
+        chunk_data = data[tuple(slice(cb.start - b.start, cb.stop - b.start) for cb, b in zip(chunk_bb, bb))]
+        if chunk_data.any():
+            ds[chunk_bb] = chunk_data
+        else:
+            n_skipped += 1
+    return n_skipped
+
+
+def _write_region(ds, bb, data, skip_empty_chunks=False):
+    """Write `data` to the region `bb` of the dataset and return the number of skipped (empty) chunks."""
+    if skip_empty_chunks:
+        return _write_nonempty(ds, bb, data)
+    ds[bb] = data
+    return 0
+
+
+def _write_block(ds, bb, data, options, level, block_id):
+    """Write a block to a level of the output and return its result.
+
+    The result holds the number of chunks that were skipped because they are empty and, for a block of
+    the scale-0 level, its max value (if `options.with_max_id`, otherwise None). The per-label statistics
+    of the scale-0 blocks are saved to the `options.morphology_folder`, see `save_block_morphology`.
+    """
+    n_skipped = _write_region(ds, bb, data, options.skip_empty_chunks)
+    max_id = None
+    if level == 0:
+        if options.morphology_folder is not None:
+            save_block_morphology(options.morphology_folder, block_id, data, [b.start for b in bb])
+        if options.with_max_id:
+            max_id = _block_max(data)
+    return {"max_id": max_id, "skipped": n_skipped}
+
+
+def _reduce_results(results):
+    """Reduce the results of the blocks (see `_write_block`) to the max id and the number of skipped chunks."""
+    max_ids = [res["max_id"] for res in results if res["max_id"] is not None]
+    return (max(max_ids) if max_ids else None), sum(res["skipped"] for res in results)
+
+
+def _copy_block(block_id, source, out_path, level, block_shape, options):
+    """Copy one block of the source into the given level of the output, see `_write_block` for the result."""
+    source = from_spec(source) if isinstance(source, SourceSpec) else as_source(source)
+    with _open_storage(out_path, options.metadata_format, mode="a") as f:
+        ds = f[get_scale_key(options.metadata_format, level)]
+        bb = to_roi(get_blocking(ds.shape, block_shape).get_block(block_id))
+        return _write_block(ds, bb, np.asarray(source[bb]), options, level, block_id)
+
+
+def _copy_level(source, f, out_path, level, options, run_kwargs, journal=None):
+    """Copy the source into a level of the output. With a journal, blocks completed before are skipped.
+
+    Returns the max value of the level (for the scale-0 level with `options.with_max_id`, otherwise None)
+    and the number of skipped chunks.
+    """
+    ds = f[get_scale_key(options.metadata_format, level)]
+    block_shape = _block_shape(ds)
+    # the workers of bp.copy don't import this module, so they can't rebuild a label mode source from its spec.
+    if journal is None and not options.writes_blocks(level) and not isinstance(source, _LabelModeSource):
+        copy(source, output=ds, block_shape=block_shape, **run_kwargs)
+        return None, 0
+    if run_kwargs["job_type"] != "local":
+        source = as_source(source).to_spec()
+    n_blocks = get_blocking(ds.shape, block_shape).number_of_blocks
+    results = _run_blocks(
+        functools.partial(_copy_block, source=source, out_path=out_path, level=level, block_shape=block_shape,
+                          options=options),
+        n_blocks, run_kwargs, name=f"copy-s{level}", journal=journal, step=f"s{level}", has_return_val=True,
+    )
+    return _reduce_results(results)
+
+
+def _copy_slab(slab_id, source, in_path, in_key, out_path, slab_shape, options):
+    """Copy one slab of the input into the scale-0 level of the output, see `_write_block` for the result.
+
+    The input is reopened from its path in the workers of the distributed targets (`source` is None),
+    or from its spec for the decoded pages of a compressed tif (see `_decoded_pages`).
+    """
+    if source is None:
+        source = open_input(in_path, in_key)
+    elif isinstance(source, SourceSpec):
+        source = from_spec(source)
+    with _open_storage(out_path, options.metadata_format, mode="a") as f:
+        ds = f[get_scale_key(options.metadata_format, 0)]
+        bb = to_roi(get_blocking(ds.shape, slab_shape).get_block(slab_id))
+        data = np.asarray(source[bb]).astype(ds.dtype, copy=False)
+        return _write_block(ds, bb, data, options, 0, slab_id)
+
+
+def _slab_shape(shape, block_shape, itemsize):
+    """The shape of the slabs for `_copy_level_slabs`: one write block deep along the first axis and spanning
+    the full extent of the other axes, unless this exceeds `_SLAB_BYTES`. Then the slab is split along the
+    second axis, and along the following axes if a single write block along it is still too large,
+    into multiples of the write blocks.
+    """
+    slab_shape = [int(block_shape[0])] + [int(sh) for sh in shape[1:]]
+    for axis in range(1, len(shape)):
+        if itemsize * np.prod(slab_shape) <= _SLAB_BYTES:
+            break
+        other_bytes = itemsize * np.prod(slab_shape[:axis] + slab_shape[axis + 1:])
+        n_blocks = max(1, int(_SLAB_BYTES // (other_bytes * block_shape[axis])))
+        slab_shape[axis] = min(int(shape[axis]), n_blocks * int(block_shape[axis]))
+    return tuple(slab_shape)
+
 
+@contextmanager
+def _decoded_pages(src, tmp_folder):
+    """Decode the pages of a compressed tif once into an uncompressed memmap and open it as a source.
 
-def _build_pyramid(f, base, base_shape, scale_factors, metadata_format, chunks, dtype,
-                   order, anti_aliasing, run_kwargs):
+    The memmap is written to a folder of its own in the tmp folder, so that it can be reopened by the workers
+    of the distributed targets and conversions sharing the tmp folder don't clash. It is removed on exit.
+    """
+    os.makedirs(tmp_folder, exist_ok=True)
+    handoff_folder = tempfile.mkdtemp(prefix="pages_", dir=tmp_folder)
+    try:
+        handoff_path = os.path.join(handoff_folder, "pages.raw")
+        data = np.memmap(handoff_path, mode="w+", dtype=src.dtype, shape=src.shape)
+        with tifffile.TiffFile(src.path) as tif:
+            for page_id in range(src.shape[0]):
+                data[page_id] = tif.asarray(key=page_id).reshape(src.shape[1:])
+        data.flush()
+        del data
+        yield open_source(handoff_path, "", format="memmap", dtype=src.dtype.str, shape=src.shape)
+    finally:
+        shutil.rmtree(handoff_folder, ignore_errors=True)
+
+
+def _copy_level_slabs(source, in_path, in_key, out_path, options, run_kwargs, tmp_folder, journal=None):
+    """Copy the input into the scale-0 level of the output in slabs along the first axis.
+
+    The slabs span the full extent of the other axes, so that each page of a tif (or each slice file)
+    is only read once. Their depth is given by the write blocks of the output, which keeps concurrent writes safe.
+    Slabs that would be larger than `_SLAB_BYTES` are split along the other axes (see `_slab_shape`).
+    In this case the pages of a compressed tif are decoded once into an uncompressed file in the tmp folder
+    (see `_decoded_pages`), from which the parts of the slabs are read, instead of once per part of the slab.
+    Returns the max value of the input (if `options.with_max_id`, otherwise None) and the number of skipped chunks.
+    """
+    with _open_storage(out_path, options.metadata_format, mode="r") as f:
+        ds = f[get_scale_key(options.metadata_format, 0)]
+        slab_shape = _slab_shape(ds.shape, _block_shape(ds), ds.dtype.itemsize)
+        n_slabs = get_blocking(ds.shape, slab_shape).number_of_blocks
+    is_split = tuple(slab_shape[1:]) != tuple(int(sh) for sh in ds.shape[1:])
+    with ExitStack() as stack:
+        if is_split and isinstance(source, _TifPageSource):
+            source = stack.enter_context(_decoded_pages(source, tmp_folder))
+            source = source if run_kwargs["job_type"] == "local" else source.to_spec()
+        else:
+            source = source if run_kwargs["job_type"] == "local" else None
+        results = _run_blocks(
+            functools.partial(_copy_slab, source=source, in_path=in_path, in_key=in_key, out_path=out_path,
+                              slab_shape=slab_shape, options=options),
+            n_slabs, run_kwargs, name="copy-s0-slabs", journal=journal, step="s0-slabs", has_return_val=True,
+        )
+    return _reduce_results(results)
+
+
+def _build_pyramid(f, out_path, base, base_shape, scale_factors, chunks, options, run_kwargs, journal=None):
+    """Write the downsampled levels one after the other. Returns the number of skipped (empty) chunks."""
     prev, prev_shape = base, tuple(int(s) for s in base_shape)
+    n_skipped = 0
     for level, factor in enumerate(scale_factors, start=1):
         level_shape = tuple(int(s) for s in sample_shape(prev_shape, factor))
-        ds = _create_level(f, metadata_format, level, level_shape, chunks, dtype)
-        resized = ResizedSource(as_source(prev), level_shape, order=order, anti_aliasing=anti_aliasing)
-        copy(resized, output=ds, block_shape=tuple(int(c) for c in ds.chunks), **run_kwargs)
+        ds = _create_level(f, options.metadata_format, level, level_shape, chunks, options.dtype,
+                           exist_ok=journal is not None, **options.compression_kwargs)
+        resized = _resized(as_source(prev), level_shape, options.order, options.anti_aliasing,
+                           options.downsampling_mode)
+        n_skipped += _copy_level(resized, f, out_path, level, options, run_kwargs, journal=journal)[1]
         prev, prev_shape = ds, level_shape
+    return n_skipped
+
+
+class _RegionSource(Source):
+    """A region of a (virtual) volume that is held in memory.
+
+    Used to chain the in-memory levels of a fused pyramid block: the resampling of the next level
+    reads from this region instead of the level that was (not yet) written to disk.
+    """
+
+    def __init__(self, data, offset, shape):
+        self._data = data
+        self._offset = tuple(int(off) for off in offset)
+        self._shape = tuple(int(sh) for sh in shape)
+
+    @property
+    def shape(self):
+        return self._shape
+
+    @property
+    def dtype(self):
+        return self._data.dtype
+
+    def _getitem(self, roi):
+        local_roi = tuple(
+            slice(sl.start - off, sl.stop - off) for sl, off in zip(roi, self._offset)
+        )
+        if any(sl.start < 0 or sl.stop > sh for sl, sh in zip(local_roi, self._data.shape)):
+            raise RuntimeError(f"The requested region {roi} is not contained in the in-memory region.")
+        return self._data[local_roi]
+
+    def _setitem(self, roi, value):
+        raise NotImplementedError("The in-memory region is read-only.")
+
+    def to_spec(self):
+        raise ValueError("An in-memory region cannot be reopened in another process.")
+
+
+def _resize_input_bb(begin, end, in_shape, out_shape, order, anti_aliasing, downsampling_mode=None):
+    """The input region that ResizedSource reads for the output region [begin, end).
+
+    Mirrors the region computation in `ResizedSource._getitem`, including the halo for the
+    interpolation and anti-aliasing. For a label `downsampling_mode` it is the region of the
+    windows of `_LabelModeSource`, which does not need a halo.
+    """
+    ndim = len(in_shape)
+    if downsampling_mode is not None:
+        window = [max(1, int(ish) // int(osh)) for ish, osh in zip(in_shape, out_shape)]
+        return [int(b) * w for b, w in zip(begin, window)], [int(e) * w for e, w in zip(end, window)]
+    scale = [ish / float(osh) for ish, osh in zip(in_shape, out_shape)]
+    halo = [order + 1] * ndim
+    if anti_aliasing:
+        matrix = np.diag(scale + [1.0])
+        sigma = np.asarray(bic.transformation.compute_anti_aliasing_sigma(matrix, ndim), dtype="float64")
+        if np.any(sigma > 0):
+            halo = [h + sigma_to_halo(float(sig), order) for h, sig in zip(halo, sigma)]
+    in_begin = [max(0, int(floor(sc * b)) - h) for sc, b, h in zip(scale, begin, halo)]
+    in_end = [min(int(ish), int(ceil(sc * e)) + h) for sc, e, h, ish in zip(scale, end, halo, in_shape)]
+    return in_begin, in_end
+
+
+def _channel_outputs(out_path, n_channels, timepoint=None):
+    """The output of each channel as (path, index prefix) for writing the data of a pyramid level.
+
+    Single-channel data is written to `out_path`. Multi-channel data is either written to one output
+    per channel (`out_path` is a list) or to a single output with a leading channel axis.
+    For a timepoint of time-series data the prefix starts with the index of the time axis.
+    """
+    time_prefix = () if timepoint is None else (slice(timepoint, timepoint + 1),)
+    if n_channels is None:
+        return [(out_path, time_prefix)]
+    if isinstance(out_path, (list, tuple)):
+        return [(path, time_prefix) for path in out_path]
+    return [(out_path, time_prefix + (slice(channel, channel + 1),)) for channel in range(n_channels)]
+
+
+def _fused_pyramid_block(block_id, base, out_path, levels, shapes, factors, block_shape, options,
+                         base_key=None, n_channels=None, n_timepoints=None):
+    """Compute and write all levels of a fused pyramid sweep for one block of the last level.
+
+    The base region (including the halo needed by all downstream levels) is read once, the levels
+    are computed from each other in memory, and the share of each level is written to disk.
+    If `base_key` is given, the first level already exists at this key and is only read,
+    otherwise it is read from `base` (a source or source spec) and written as well.
+    For multi-channel data (`n_channels` is given) the base has a leading channel axis, the region of
+    all channels is read at once and the channels are written as described in `_channel_outputs`.
+    For time-series data (`n_timepoints` is given) `base` holds one source per timepoint and
+    `block_id` enumerates the blocks of all timepoints, so that only a single timepoint is held in memory.
+    The result holds the max value of the scale-0 region of this block and the number of chunks
+    that were skipped because they are empty, see `_write_block`.
+    """
+    n_levels = len(levels)
+    order, anti_aliasing, downsampling_mode = options.order, options.anti_aliasing, options.downsampling_mode
+    blocking = get_blocking(shapes[-1], block_shape)
+    timepoint = None
+    if n_timepoints is not None:
+        timepoint, block_id = divmod(block_id, blocking.number_of_blocks)
+    block = blocking.get_block(block_id)
+
+    # the region each level writes: the block of the last level, scaled up by the relative factor.
+    # the level shapes are rounded down, so blocks at the upper border extend to the end of the level.
+    write_bbs = []
+    for shape, factor in zip(shapes, factors):
+        rel_factor = [fl // f for fl, f in zip(factors[-1], factor)]
+        write_begin = [int(b) * rf for b, rf in zip(block.begin, rel_factor)]
+        write_end = [
+            sh if int(e) == last_sh else min(int(e) * rf, sh)
+            for e, rf, sh, last_sh in zip(block.end, rel_factor, shape, shapes[-1])
+        ]
+        write_bbs.append((write_begin, write_end))
+
+    # the region each level has to be computed for: its write region and the input region
+    # (including the halo) that is needed to compute the region of the next level.
+    need_bbs = [None] * n_levels
+    need_bbs[-1] = write_bbs[-1]
+    for i in range(n_levels - 1, 0, -1):
+        in_begin, in_end = _resize_input_bb(*need_bbs[i], shapes[i - 1], shapes[i], order, anti_aliasing,
+                                            downsampling_mode)
+        if i > 1 or base_key is None:
+            in_begin = [min(b, wb) for b, wb in zip(in_begin, write_bbs[i - 1][0])]
+            in_end = [max(e, we) for e, we in zip(in_end, write_bbs[i - 1][1])]
+        need_bbs[i - 1] = (in_begin, in_end)
+
+    def _local_bb(i):
+        (write_begin, write_end), (need_begin, _) = write_bbs[i], need_bbs[i]
+        return tuple(slice(wb - nb, we - nb) for wb, we, nb in zip(write_begin, write_end, need_begin))
+
+    def _global_bb(bb):
+        return tuple(slice(b, e) for b, e in zip(*bb))
+
+    def _write(f, prefix, data, i):
+        out = np.ascontiguousarray(data[_local_bb(i)])
+        ds = f[get_scale_key(options.metadata_format, levels[i])]
+        bb = prefix + _global_bb(write_bbs[i])
+        return _write_block(ds, bb, out[(None,) * len(prefix)], options, levels[i], block_id)
+
+    outputs = _channel_outputs(out_path, n_channels, timepoint)
+    with ExitStack() as stack:
+        files = {}
+        for path, _ in outputs:
+            if path not in files:
+                files[path] = stack.enter_context(_open_storage(path, options.metadata_format, mode="a"))
+
+        base_bb = _global_bb(need_bbs[0])
+        if base_key is None:
+            source = base if timepoint is None else base[timepoint]
+            source = from_spec(source) if isinstance(source, SourceSpec) else as_source(source)
+            if n_channels is None:
+                channel_data = [np.asarray(source[base_bb])]
+            else:
+                channel_data = list(np.asarray(source[(slice(None),) + base_bb]))
+        else:
+            channel_data = []
+            for path, prefix in outputs:
+                data = np.asarray(as_source(files[path][base_key])[prefix + base_bb])
+                channel_data.append(data[(0,) * len(prefix)])
+
+        results = []
+        for (path, prefix), data in zip(outputs, channel_data):
+            f = files[path]
+            data = data.astype(options.dtype, copy=False)
+            if base_key is None:
+                results.append(_write(f, prefix, data, 0))
+            for i in range(1, n_levels):
+                prev = _RegionSource(data, need_bbs[i - 1][0], shapes[i - 1])
+                resized = _resized(prev, shapes[i], order, anti_aliasing, downsampling_mode)
+                data = np.asarray(resized[_global_bb(need_bbs[i])]).astype(options.dtype, copy=False)
+                results.append(_write(f, prefix, data, i))
+    max_id, n_skipped = _reduce_results(results)
+    return {"max_id": max_id, "skipped": n_skipped}
+
+
+def _plan_fused_sweeps(shapes, factors, block_shapes, itemsize):
+    """Group the pyramid levels into sweeps whose base region per block fits into memory.
+
+    Each sweep reads its first level once and computes the following levels from it; all sweeps
+    after the first start at the last level of the previous sweep. `block_shapes` are the write
+    blocks of the levels, see `_block_shape`.
+    """
+    n_levels = len(shapes)
+    sweeps, start = [], 0
+    while start < n_levels - 1:
+        stop = start + 1
+        while stop + 1 < n_levels:
+            candidate = stop + 1
+            block_shape = block_shapes[candidate]
+            region = [
+                min(bs * (fc // fs), sh)
+                for bs, fc, fs, sh in zip(block_shape, factors[candidate], factors[start], shapes[start])
+            ]
+            if int(np.prod(region)) * itemsize > _FUSED_BLOCK_BYTES:
+                break
+            stop = candidate
+        sweeps.append((start, stop))
+        start = stop
+    return sweeps
+
+
+def _build_pyramid_fused(out_path, source, base_shape, scale_factors, chunks, options, run_kwargs,
+                         base_key=None, journal=None, n_channels=None, n_timepoints=None):
+    """Write the pyramid in fused sweeps, see `_fused_pyramid_block` for the per-block computation.
+
+    In contrast to `_build_pyramid`, a level is not re-read from disk to compute the next one.
+    If `base_key` is None the scale-0 level is written from `source` in the first sweep, otherwise
+    the scale-0 level already exists at `base_key` and only the downsampled levels are written.
+    For multi-channel data `base_shape` is the spatial shape and the outputs are given by `_channel_outputs`.
+    For time-series data `source` is a list with one source per timepoint and a single output with a
+    leading time axis is written; the blocks of all timepoints are processed in parallel.
+    Returns the max value of the scale-0 level (if it is written and `options.with_max_id`, otherwise None)
+    and the number of chunks that were skipped because they are empty (if `options.skip_empty_chunks`).
+    """
+    shapes = [tuple(int(s) for s in base_shape)]
+    factors = [[1] * len(base_shape)]
+    for factor in scale_factors:
+        shapes.append(tuple(int(s) for s in sample_shape(shapes[-1], factor)))
+        factors.append([int(fp) * int(fl) for fp, fl in zip(factors[-1], factor)])
+
+    first_level = 0 if base_key is None else 1
+    # the block shapes of the first level are only used if there are no downsampled levels,
+    # otherwise the blocks are given by the last level of a sweep.
+    block_shapes = [None] * first_level
+    # a single multi-channel output has a leading channel axis with one chunk per channel,
+    # time-series data has a leading time axis with one chunk per timepoint (before the channel axis).
+    has_channel_axis = n_channels is not None and not isinstance(out_path, (list, tuple))
+    leading_shape = () if n_timepoints is None else (n_timepoints,)
+    leading_shape += (n_channels,) if has_channel_axis else ()
+    leading_chunks = (1,) * len(leading_shape)
+    paths = [out_path] if n_channels is None or has_channel_axis else list(out_path)
+    for path in paths:
+        with _open_storage(path, options.metadata_format, mode="a") as f:
+            for level in range(first_level, len(shapes)):
+                ds = _create_level(f, options.metadata_format, level, leading_shape + shapes[level],
+                                   leading_chunks + tuple(chunks), options.dtype, exist_ok=journal is not None,
+                                   n_leading_axes=len(leading_shape), **options.compression_kwargs)
+                if path == paths[0]:
+                    block_shapes.append(_block_shape(ds)[len(leading_shape):])
+
+    # distributed workers reopen the input from its spec.
+    if base_key is None and run_kwargs["job_type"] != "local":
+        if n_timepoints is None:
+            source = as_source(source).to_spec()
+        else:
+            source = [as_source(src).to_spec() for src in source]
+
+    # the base region of all channels is held in memory at once.
+    itemsize = np.dtype(options.dtype).itemsize * (1 if n_channels is None else n_channels)
+    sweeps = _plan_fused_sweeps(shapes, factors, block_shapes, itemsize) if len(shapes) > 1 else [(0, 0)]
+    results = []
+    for sweep_id, (start, stop) in enumerate(sweeps):
+        block_shape = block_shapes[stop]
+        n_blocks = get_blocking(shapes[stop], block_shape).number_of_blocks
+        n_blocks *= 1 if n_timepoints is None else n_timepoints
+        # the first sweep reads the input data, later sweeps read the last level of the previous sweep.
+        sweep_base_key = base_key if sweep_id == 0 else get_scale_key(options.metadata_format, start)
+        name = f"fused-pyramid-s{start}-s{stop}"
+        results += _run_blocks(
+            functools.partial(_fused_pyramid_block,
+                              base=source, out_path=out_path, levels=list(range(start, stop + 1)),
+                              shapes=shapes[start:stop + 1], factors=factors[start:stop + 1],
+                              block_shape=block_shape, options=options, base_key=sweep_base_key,
+                              n_channels=n_channels, n_timepoints=n_timepoints),
+            n_blocks, run_kwargs, name=name, journal=journal, step=name, has_return_val=True,
+        )
+    return _reduce_results(results)
+
+
+def _write_pyramid(out_path, source, base_shape, scale_factors, chunks, options, run_kwargs,
+                   base_key=None, journal=None, fused_pyramid=True):
+    """Write the pyramid of a single-channel source, in fused sweeps or one level after the other.
+
+    If `base_key` is given, the scale-0 level already exists at this key and only the downsampled levels are
+    written. Returns the max value of the scale-0 level and the number of skipped chunks, see `_build_pyramid_fused`.
+    """
+    if fused_pyramid and scale_factors:
+        return _build_pyramid_fused(out_path, source, base_shape, scale_factors, chunks, options, run_kwargs,
+                                    base_key=base_key, journal=journal)
+    max_id, n_skipped = None, 0
+    with _open_storage(out_path, options.metadata_format, mode="a") as f:
+        if base_key is None:
+            base = _create_level(f, options.metadata_format, 0, base_shape, chunks, options.dtype,
+                                 exist_ok=journal is not None, **options.compression_kwargs)
+            max_id, n_skipped = _copy_level(source, f, out_path, 0, options, run_kwargs, journal=journal)
+        else:
+            base = f[base_key]
+        n_skipped += _build_pyramid(f, out_path, base, base_shape, scale_factors, chunks, options, run_kwargs,
+                                    journal=journal)
+    return max_id, n_skipped
+
+
+def _run_kwargs(target, max_jobs, tmp_folder):
+    job_type, job_config, num_workers = get_run_config(target, max_jobs, tmp_folder)
+    return dict(job_type=job_type, job_config=job_config, num_workers=num_workers)
+
+
+def _journal_config(in_path, in_key, shape, scale_factors, chunks, options, out_paths, in_place=False, **layout):
+    """The config of a conversion, which its journal is only valid for.
+
+    The input is identified by its path and its fingerprint, see `_input_fingerprint`.
+    `layout` holds further arguments that determine the blocks of the conversion, e.g. the channel.
+    """
+    # the hdf5 file of an in-place conversion changes while the levels are written to it.
+    fingerprint = None if in_place and os.path.isfile(in_path) else _input_fingerprint(in_path, in_key)
+    return {
+        "input": [_input_id(in_path), in_key, fingerprint], "outputs": [os.path.abspath(path) for path in out_paths],
+        "shape": [int(sh) for sh in shape], "scale_factors": [[int(sf) for sf in factor] for factor in scale_factors],
+        "chunks": [int(ch) for ch in chunks], "options": asdict(options),
+        # the block layout of the fused sweeps depends on the memory limit, so it is part of the config.
+        "fused_block_bytes": _FUSED_BLOCK_BYTES, **layout,
+    }
+
+
+def _open_journal(out_path, in_path, resumable):
+    """The journal of a resumable conversion, or None if the conversion is not resumable.
+
+    Only the conversion of file inputs (including memmaps) can be resumed: for in-memory arrays it can't be
+    told whether the array is the same as in the interrupted conversion, see `_input_fingerprint`.
+    """
+    if not resumable:
+        return None
+    if _input_id(in_path) is None:
+        raise ValueError("Only the conversion of a file input can be resumed, not of an in-memory array.")
+    return _PyramidJournal(out_path)
+
+
+def _start_conversion(out_paths, journal, config, in_place=False):
+    """Remove previous conversions at the outputs, unless an interrupted conversion with the same config is
+    resumed from its journal. The output of an in-place conversion holds the input and is never removed.
+    """
+    if journal is not None and journal.matches(config) and all(os.path.exists(path) for path in out_paths):
+        return
+    if not in_place:
+        for path in out_paths:
+            _remove_output(path)
+    if journal is not None:
+        journal.reset(config)
+
+
+def _finish_conversion(outputs, scale_factors, metadata_format, journal):
+    """Write the format metadata of the outputs, given as (path, metadata) pairs, once all blocks are written."""
+    for path, metadata_dict in outputs:
+        write_format_metadata(metadata_format, path, metadata_dict, scale_factors)
+    if journal is not None:
+        journal.remove()
+
+
+def _downscale_input(in_path, in_key, channel, metadata_format, dtype, read_slabs, run_kwargs, tmp_folder, stack):
+    """Open the input of `downscale` as a source of the data that is written to the scale-0 level."""
+    if read_slabs and (channel is not None or not isinstance(in_path, (str, os.PathLike))):
+        raise ValueError("Reading in slabs is only supported for file inputs without channel.")
+    src = open_input(in_path, in_key)
+    # the slabs are read from the input path by the workers, see `_copy_level_slabs`.
+    if not read_slabs:
+        src = stack.enter_context(_distributable(src, run_kwargs, tmp_folder))
+    if read_slabs and src.ndim != 3:
+        raise ValueError(f"Reading in slabs is only supported for 3d inputs, got {src.ndim}d.")
+    if channel is not None:
+        src = RoiSource(src, roi=(channel,), squeeze=True)
+    # the bdv formats require 3d data; promote a 2d source to (1, y, x) on the fly via a wrapper
+    # view (ome.zarr keeps 2d data as-is). This replaces the former on-disk temp file.
+    if not metadata_format.startswith("ome.zarr") and src.ndim == 2:
+        src = ExpandDimsSource(src, axis=0)
+    if dtype is not None and np.dtype(dtype) != src.dtype:
+        src = SimpleTransformationSource(src, functools.partial(_cast_ids, dtype=np.dtype(dtype)), dtype=dtype)
+    return src
 
 
 def downscale(in_path, in_key, out_path,
@@ -123,56 +1211,452 @@ def downscale(in_path, in_key, out_path,
               library="vigra", library_kwargs=None,
               metadata_format="ome.zarr",
               unit="micrometer", source_name=None,
-              channel=None):
+              channel=None, fused_pyramid=True,
+              resumable=False, compression=None,
+              compression_level=None, read_slabs=False,
+              with_max_id=False, dtype=None, skip_empty_chunks=False, downsampling_mode=None,
+              morphology_folder=None):
     """Convert input data into a MoBIE multiscale pyramid using bioimage-py and write the metadata.
 
+    By default the pyramid is computed in fused sweeps (`fused_pyramid=True`): each block that is read
+    also produces its share of the following levels in memory, so that the levels are not re-read from
+    disk. Set `fused_pyramid=False` to write one level after the other instead.
+
+    With `resumable=True` the completed blocks are recorded in a journal next to the output
+    (`<out_path>.journal`). If the conversion is interrupted, calling this function again with the
+    same arguments only writes the missing blocks instead of starting from scratch. The format
+    metadata is only written once all blocks are done, after which the journal is removed.
+    If the input file was changed in the meantime, the conversion starts from scratch (see `_input_fingerprint`).
+    Only the conversion of file inputs can be resumed.
+
+    The `compression` codec (one of `COMPRESSION_CODECS`) and `compression_level` are used for all levels;
+    by default the compression of the storage backend is used.
+
+    With `read_slabs=True` the input is read in slabs along the first axis that span the full extent of the
+    other axes: the scale-0 level is written from these slabs and the downsampled levels are computed from it.
+    This reads each page of a (multi-page) tif or each file of a folder of slices only once, whereas reading
+    in blocks decodes a page for each block that overlaps it. Uncompressed tif pages are memory-mapped.
+    If the slabs have to be split because they exceed `_SLAB_BYTES`, the pages of a compressed tif are
+    decoded once into an uncompressed file in the `tmp_folder`, which needs space for the full input.
+
+    With `with_max_id=True` the max value of the data is computed from the blocks that are written to the
+    scale-0 level and stored as the `maxId` attribute of this level, so that it does not need to be computed
+    in a second pass over the data. This has no effect when downscaling in place, where scale-0 is not written.
+
+    The output is written with the given `dtype` (e.g. a narrower integer type for a segmentation, see
+    `_narrowed_dtype`); by default the dtype of the input is kept. Input values that don't fit into an
+    integer `dtype` raise an error instead of wrapping around.
+
+    With `skip_empty_chunks=True` the chunks (or shards) of all levels that only contain the fill value 0
+    are not written, which saves storage and requests for sparse data such as segmentations or masks.
+    The levels are created with the fill value 0, so readers treat the absent chunks as empty. The number
+    of skipped chunks is printed after the conversion.
+
+    A label `downsampling_mode` (one of `LABEL_DOWNSAMPLING_MODES`) replaces the interpolation given by
+    `library` and `library_kwargs` for the downsampled levels: "mode" takes the most frequent label of each
+    window of a level's scale factor, "mode-nonzero" the most frequent non-zero label. Unlike nearest-neighbor
+    sampling, which picks a single voxel per window, small objects are kept at the coarser levels.
+
+    With a `morphology_folder` the per-label statistics (size, center of mass and bounding box) of each block
+    that is written to the scale-0 level are saved to this folder, so that the default table of a segmentation
+    can be computed without reading the data again, see `tables.default_table.compute_default_table_from_blocks`.
+    This has no effect when downscaling in place, where scale-0 is not written.
+
     Note: the `block_shape` argument is accepted for backwards compatibility but is no longer used;
     write blocks now follow the (per-level) storage chunks, which keeps concurrent writes safe.
-    """
-    if metadata_format in ("bdv", "bdv.hdf5") and target == "slurm":
-        raise ValueError(
-            "The bdv.hdf5 format does not support distributed (slurm) writing. "
-            "Use target='local' or a different file format."
-        )
-
-    job_type, job_config, num_workers = get_run_config(target, max_jobs, tmp_folder)
-    run_kwargs = dict(job_type=job_type, job_config=job_config, num_workers=num_workers)
 
+    Returns the number of chunks that were skipped because they are empty (0 without `skip_empty_chunks`).
+    """
+    _check_output(metadata_format, target, compression, compression_level, downsampling_mode)
+    run_kwargs = _run_kwargs(target, max_jobs, tmp_folder)
     # downscaling in-place: the scale-0 data already exists at out_path/in_key (e.g. when importing
     # a segmentation from node labels). In that case we only add the downsampled levels.
-    in_place = os.path.abspath(in_path) == os.path.abspath(out_path)
+    in_place = _input_id(in_path) == os.path.abspath(out_path)
+    journal = _open_journal(out_path, in_path, resumable)
+
+    with ExitStack() as stack:
+        if in_place:
+            with _open_storage(out_path, metadata_format, mode="r") as f:
+                shape, src_dtype = tuple(f[in_key].shape), f[in_key].dtype
+            src, base_key = None, in_key
+        else:
+            src = _downscale_input(in_path, in_key, channel, metadata_format, dtype, read_slabs, run_kwargs,
+                                   tmp_folder, stack)
+            shape, src_dtype, base_key = tuple(src.shape), src.dtype, None
+        _validate(len(shape), resolution, scale_factors, metadata_format)
+        options = _write_options(metadata_format, src_dtype, library, library_kwargs,
+                                 downsampling_mode=downsampling_mode, compression=compression,
+                                 compression_level=compression_level, skip_empty_chunks=skip_empty_chunks,
+                                 with_max_id=with_max_id, morphology_folder=morphology_folder)
+        config = _journal_config(in_path, in_key, shape, scale_factors, chunks, options, [out_path],
+                                 in_place=in_place, channel=channel, fused_pyramid=fused_pyramid,
+                                 read_slabs=read_slabs)
+        _start_conversion([out_path], journal, config, in_place=in_place)
 
-    if in_place:
+        max_id, n_skipped = None, 0
+        if read_slabs:
+            # write the scale-0 level from slabs of the input, and downsample it in place.
+            with _open_storage(out_path, metadata_format, mode="a") as f:
+                _create_level(f, metadata_format, 0, shape, chunks, options.dtype,
+                              exist_ok=journal is not None, **options.compression_kwargs)
+            max_id, n_skipped = _copy_level_slabs(src, in_path, in_key, out_path, options, run_kwargs, tmp_folder,
+                                                  journal=journal)
+            src, base_key = None, get_scale_key(metadata_format, 0)
+        pyramid_max_id, pyramid_skipped = _write_pyramid(out_path, src, shape, scale_factors, chunks, options,
+                                                         run_kwargs, base_key=base_key, journal=journal,
+                                                         fused_pyramid=fused_pyramid)
+    max_id = max_id if pyramid_max_id is None else pyramid_max_id
+    n_skipped += pyramid_skipped
+
+    if max_id is not None:
         with _open_storage(out_path, metadata_format, mode="a") as f:
-            base = f[in_key]
-            ndim = base.ndim
-            _validate(ndim, resolution, scale_factors, metadata_format)
-            order, anti_aliasing = _downsampling_params(library, library_kwargs, base.dtype)
-            _build_pyramid(f, base, base.shape, scale_factors, metadata_format, chunks,
-                           base.dtype, order, anti_aliasing, run_kwargs)
+            f[get_scale_key(metadata_format, 0)].attrs["maxId"] = max_id
+    if skip_empty_chunks:
+        print("Skipped writing", n_skipped, "empty chunks")
+    metadata_dict = {"resolution": list(resolution), "unit": unit, "setup_name": source_name}
+    _finish_conversion([(out_path, metadata_dict)], scale_factors, metadata_format, journal)
+    return n_skipped
+
+
+def downscale_multichannel(in_path, in_key, out_path,
+                           resolution, scale_factors, chunks,
+                           tmp_folder, target, max_jobs,
+                           library="skimage", library_kwargs=None,
+                           metadata_format="ome.zarr",
+                           unit="micrometer", source_names=None,
+                           resumable=False, compression=None,
+                           compression_level=None):
+    """Convert multi-channel input data into MoBIE multiscale pyramids, reading each input block only once.
+
+    The channel axis must be the first axis of the input. Each block of the input is read for all channels
+    at once and the pyramid levels of all channels are computed from it in fused sweeps (see `downscale`).
+    If `out_path` is a list, each channel is written to its own output with the corresponding name in
+    `source_names`. Otherwise all channels are written to a single ome.zarr with a leading channel axis,
+    named after the first entry of `source_names`.
+    """
+    separate_outputs = isinstance(out_path, (list, tuple))
+    if not separate_outputs and not metadata_format.startswith("ome.zarr"):
+        raise ValueError(f"A single multi-channel output is only supported for ome.zarr, got {metadata_format}.")
+    _check_output(metadata_format, target, compression, compression_level)
+    run_kwargs = _run_kwargs(target, max_jobs, tmp_folder)
+    out_paths = list(out_path) if separate_outputs else [out_path]
+    # the journal of an interrupted conversion is stored next to the first output.
+    journal = _open_journal(out_paths[0], in_path, resumable)
+
+    with _distributable(open_input(in_path, in_key), run_kwargs, tmp_folder) as src:
+        n_channels = int(src.shape[0])
+        if separate_outputs and len(out_path) != n_channels:
+            raise ValueError(f"Expect one output per channel, got {len(out_path)} outputs for {n_channels} channels.")
+        # the bdv formats require 3d data, see `downscale`.
+        if not metadata_format.startswith("ome.zarr") and src.ndim == 3:
+            src = ExpandDimsSource(src, axis=1)
+        spatial_shape = tuple(src.shape[1:])
+        _validate(len(spatial_shape), resolution, scale_factors, metadata_format)
+        options = _write_options(metadata_format, src.dtype, library, library_kwargs,
+                                 compression=compression, compression_level=compression_level)
+        config = _journal_config(in_path, in_key, src.shape, scale_factors, chunks, options, out_paths)
+        _start_conversion(out_paths, journal, config)
+        _build_pyramid_fused(out_path, src, spatial_shape, scale_factors, chunks, options, run_kwargs,
+                             journal=journal, n_channels=n_channels)
+
+    source_names = [None] * n_channels if source_names is None else source_names
+    if separate_outputs:
+        outputs = [
+            (path, {"resolution": list(resolution), "unit": unit, "setup_name": name})
+            for path, name in zip(out_paths, source_names)
+        ]
     else:
-        src = open_source(in_path, in_key) if in_key else open_source(in_path)
-        if channel is not None:
-            src = RoiSource(src, roi=(channel,), squeeze=True)
-        # the bdv formats require 3d data; promote a 2d source to (1, y, x) on the fly via a wrapper
-        # view (ome.zarr keeps 2d data as-is). This replaces the former on-disk temp file.
-        if metadata_format != "ome.zarr" and src.ndim == 2:
-            src = ExpandDimsSource(src, axis=0)
-        ndim = src.ndim
-        _validate(ndim, resolution, scale_factors, metadata_format)
-        order, anti_aliasing = _downsampling_params(library, library_kwargs, src.dtype)
+        outputs = [(out_path, {"resolution": list(resolution), "unit": unit, "setup_name": source_names[0],
+                               "channel_axis": True})]
+    _finish_conversion(outputs, scale_factors, metadata_format, journal)
 
-        # overwrite any previous conversion of this source at the output location.
-        _remove_output(out_path)
 
+def downscale_timeseries(in_path, in_key, out_path,
+                         resolution, scale_factors, chunks,
+                         tmp_folder, target, max_jobs,
+                         library="skimage", library_kwargs=None,
+                         metadata_format="ome.zarr",
+                         unit="micrometer", source_name=None,
+                         channel_axis=False, time_unit=None,
+                         time_resolution=1.0, resumable=False,
+                         compression=None, compression_level=None):
+    """Convert time-series input data into a MoBIE multiscale pyramid with a leading time axis.
+
+    The input is either a single dataset with the time axis first (`in_key` is a string), or one dataset
+    per timepoint (`in_key` is a list of keys, e.g. the timepoints of a bdv file). With `channel_axis=True`
+    the (per timepoint) data has a leading channel axis and the output is tczyx, otherwise it is tzyx.
+    Each block of the pyramid sweeps (see `downscale`) only reads the data of a single timepoint, and the
+    blocks of all timepoints are processed in parallel. Time series are only supported for ome.zarr.
+    """
+    if not metadata_format.startswith("ome.zarr"):
+        raise ValueError(f"Time series are only supported for ome.zarr, got {metadata_format}.")
+    _check_output(metadata_format, target, compression, compression_level)
+    run_kwargs = _run_kwargs(target, max_jobs, tmp_folder)
+    journal = _open_journal(out_path, in_path, resumable)
+
+    with ExitStack() as stack:
+        if isinstance(in_key, (list, tuple)):
+            sources = [open_source(in_path, key) for key in in_key]
+        else:
+            src = stack.enter_context(_distributable(open_input(in_path, in_key), run_kwargs, tmp_folder))
+            sources = [RoiSource(src, roi=(timepoint,), squeeze=True) for timepoint in range(src.shape[0])]
+        shape, dtype = tuple(sources[0].shape), sources[0].dtype
+        if any(tuple(src.shape) != shape or src.dtype != dtype for src in sources):
+            raise ValueError("The shape and dtype of all timepoints must agree.")
+        n_timepoints = len(sources)
+        n_channels = int(shape[0]) if channel_axis else None
+        spatial_shape = shape[1:] if channel_axis else shape
+        _validate(len(spatial_shape), resolution, scale_factors, metadata_format)
+        options = _write_options(metadata_format, dtype, library, library_kwargs,
+                                 compression=compression, compression_level=compression_level)
+        config = _journal_config(in_path, in_key, (n_timepoints,) + shape, scale_factors, chunks, options,
+                                 [out_path])
+        _start_conversion([out_path], journal, config)
+        _build_pyramid_fused(out_path, sources, spatial_shape, scale_factors, chunks, options, run_kwargs,
+                             journal=journal, n_channels=n_channels, n_timepoints=n_timepoints)
+
+    metadata_dict = {"resolution": list(resolution), "unit": unit, "setup_name": source_name,
+                     "channel_axis": channel_axis, "time_axis": True,
+                     "time_unit": time_unit, "time_resolution": time_resolution}
+    _finish_conversion([(out_path, metadata_dict)], scale_factors, metadata_format, journal)
+
+
+def _input_max_id(in_path, in_key):
+    """Return the maxId attribute of the input, or None if it does not have it."""
+    if isinstance(in_path, (str, os.PathLike)):
+        if not in_key:
+            return None
+        with open_file(in_path, "r") as f:
+            return f[in_key].attrs.get("maxId", None)
+    # arrays only carry the max id if they have attributes, e.g. zarr arrays.
+    return getattr(in_path, "attrs", {}).get("maxId", None)
+
+
+def _cast_ids(data, dtype):
+    """Cast a block of the input to the (narrowed) integer `dtype` of the output.
+
+    Raises if the values of the block don't fit into the dtype, e.g. because the `maxId` attribute
+    of the input that the dtype was narrowed to is wrong, instead of silently wrapping them around.
+    """
+    data = np.asarray(data)
+    if data.size and np.issubdtype(dtype, np.integer):
+        info = np.iinfo(dtype)
+        min_id, max_id = int(data.min()), int(data.max())
+        if min_id < info.min or max_id > info.max:
+            raise ValueError(
+                f"The input values in the range [{min_id}, {max_id}] don't fit into the output dtype {dtype}. "
+                "Check the maxId attribute of the input or don't narrow the dtype."
+            )
+    return data.astype(dtype, copy=False)
+
+
+def _narrowed_dtype(max_id):
+    """Return the smallest unsigned integer dtype that holds the ids up to `max_id`."""
+    for dtype in ("uint8", "uint16", "uint32", "uint64"):
+        if max_id <= np.iinfo(dtype).max:
+            return np.dtype(dtype)
+    raise ValueError(f"The max id {max_id} exceeds the range of uint64.")
+
+
+def narrowed_input_dtype(in_path, in_key, tmp_folder, target, max_jobs):
+    """Return the smallest unsigned integer dtype that holds the ids of the input segmentation.
+
+    The max id is taken from the `maxId` attribute of the input if it is given, otherwise it is computed
+    in a pass over the input. Inputs with negative ids keep their dtype. The ids are checked against the
+    range of the narrowed dtype when the data is written, see `_cast_ids`.
+    """
+    src = open_input(in_path, in_key)
+    if not np.issubdtype(src.dtype, np.integer):
+        raise ValueError(f"Expect an integer segmentation for narrowing the dtype, got {src.dtype}.")
+    max_id = _input_max_id(in_path, in_key)
+    if max_id is None:
+        job_type, job_config, num_workers = get_run_config(target, max_jobs, tmp_folder)
+        # inputs that the workers can't reopen (e.g. in-memory arrays) are read in this process, instead of
+        # writing a handoff (see `_distributable`) in addition to the one that is written for the conversion.
+        if not _is_reopenable(src):
+            job_type, job_config = "local", None
+        # unchunked (in-memory) inputs are processed in the blocks of the handoff.
+        block_shape = None if src.chunks is not None else tuple(min(64, int(sh)) for sh in src.shape)
+        min_id, max_id = stats.min_and_max(src, block_shape=block_shape, job_type=job_type, job_config=job_config,
+                                           num_workers=num_workers)
+        if min_id < 0:
+            warnings.warn(f"The segmentation has negative ids, its dtype {src.dtype} is kept.")
+            return src.dtype
+    return _narrowed_dtype(int(max_id))
+
+
+# a 2d assignment table is turned into a dense lookup table if the fragment id range is at most
+# this many times larger than the number of fragments, otherwise it is looked up in the sorted fragment ids.
+_MAX_DENSE_FACTOR = 4
+
+
+class _NodeLabels:
+    """Array-backed fragment -> segment id mapping that is applied to a block of fragment ids.
+
+    The mapping is either a dense lookup table (``values[old_id] = new_id``, ``keys`` is None)
+    or the sorted fragment ids ``keys`` with the segment ids ``values``, which are looked up with
+    ``np.searchsorted``. After `save` the (pickled) mapping only holds the paths of the arrays,
+    which are memory-mapped when it is unpickled by the workers of the distributed targets.
+    """
+
+    def __init__(self, values, keys=None, missing=None):
+        self.values, self.keys, self.missing = values, keys, missing
+        self.paths = None
+
+    @classmethod
+    def from_table(cls, old, new):
+        # later assignments of the same fragment take precedence, as for a dict.
+        keys, index = np.unique(old[::-1], return_index=True)
+        values = new[::-1][index]
+        # fragment ids that are not assigned are marked in the dense table, unless the marker is a segment id.
+        if not (np.issubdtype(keys.dtype, np.integer) and np.issubdtype(values.dtype, np.integer)):
+            raise ValueError(f"Expect integer node labels, got {keys.dtype} and {values.dtype}.")
+        missing = np.iinfo(values.dtype).max
+        if keys.size and int(keys[-1]) < _MAX_DENSE_FACTOR * keys.size and not (values == missing).any():
+            dense = np.full(int(keys[-1]) + 1, missing, dtype=values.dtype)
+            dense[keys] = values
+            return cls(dense, missing=missing)
+        return cls(values, keys=keys)
+
+    def max_id(self):
+        """The largest segment id of the mapping, which bounds the ids of the relabeled segmentation."""
+        values = self.values if self.missing is None else self.values[self.values != self.missing]
+        return int(values.max()) if values.size else 0
+
+    def save(self, folder):
+        os.makedirs(folder, exist_ok=True)
+        self.paths = {}
+        for name in ("values", "keys"):
+            if getattr(self, name) is not None:
+                self.paths[name] = os.path.join(folder, f"{name}.npy")
+                np.save(self.paths[name], getattr(self, name))
+
+    def __getstate__(self):
+        if self.paths is None:
+            return self.__dict__
+        return {"paths": self.paths, "missing": self.missing}
+
+    def __setstate__(self, state):
+        if state.get("paths") is None:
+            self.__dict__.update(state)
+            return
+        self.paths, self.missing = state["paths"], state["missing"]
+        self.values = np.load(self.paths["values"], mmap_mode="r")
+        self.keys = np.load(self.paths["keys"], mmap_mode="r") if "keys" in self.paths else None
+
+    def __call__(self, data):
+        # look up the unique ids of the block only, which touches far fewer entries of a memory-mapped table.
+        ids, inverse = np.unique(data, return_inverse=True)
+        if self.keys is None:
+            if ids.size and int(ids[-1]) >= self.values.shape[0]:
+                raise ValueError(f"The node labels do not assign the fragment id {ids[-1]}.")
+            new_ids = np.asarray(self.values[ids])
+            if self.missing is not None and (new_ids == self.missing).any():
+                raise ValueError(f"The node labels do not assign the fragment ids {ids[new_ids == self.missing]}.")
+        else:
+            index = np.minimum(np.searchsorted(self.keys, ids), self.keys.shape[0] - 1)
+            found = np.asarray(self.keys[index]) == ids
+            if not found.all():
+                raise ValueError(f"The node labels do not assign the fragment ids {ids[~found]}.")
+            new_ids = np.asarray(self.values[index])
+        return new_ids[inverse.ravel()].reshape(data.shape)
+
+
+def _consecutive_ids(ids):
+    """Return consecutive ids for the sorted unique `ids`, starting at 1; the background id 0 is kept."""
+    if ids.size and ids[0] < 0:
+        raise ValueError(f"Expect non-negative ids for consecutive relabeling, got {ids[0]}.")
+    new_ids = np.arange(1, ids.size + 1, dtype="uint64")
+    if ids.size and ids[0] == 0:
+        new_ids -= 1
+    return new_ids
+
+
+def _consecutive_labels(src, chunks, run_kwargs, labeling=None):
+    """Compute the mapping of the ids of the segmentation to consecutive ids.
+
+    The unique ids are computed block-wise (with the output chunks as blocks). If a node-label `labeling`
+    is given, the segment ids it assigns to the fragments of the segmentation are made consecutive instead.
+    Returns the mapping from the input ids to the consecutive ids and the ``(N, 2)`` lookup table of
+    ``(old_id, new_id)`` pairs, where the old ids are the ids that would be written without relabeling.
+    """
+    ids = stats.unique(src, block_shape=tuple(chunks[-src.ndim:]), **run_kwargs)
+    if labeling is None:
+        old_ids = ids
+        new_ids = _consecutive_ids(old_ids)
+        mapping = _NodeLabels.from_table(ids, new_ids)
+    else:
+        old_ids, index = np.unique(labeling(ids), return_inverse=True)
+        new_ids = _consecutive_ids(old_ids)
+        mapping = _NodeLabels.from_table(ids, new_ids[index])
+    return mapping, np.stack([old_ids.astype("uint64"), new_ids], axis=1)
+
+
+def _relabel_block(block_id, source, labeling, out_path, out_key, block_shape, options):
+    """Relabel one block of the fragment segmentation into the scale-0 level, see `_write_block` for the result."""
+    source = from_spec(source) if isinstance(source, SourceSpec) else as_source(source)
+    with _open_storage(out_path, options.metadata_format, mode="a") as f:
+        ds = f[out_key]
+        bb = to_roi(get_blocking(ds.shape, block_shape).get_block(block_id))
+        data = labeling(np.asarray(source[bb])).astype(ds.dtype, copy=False)
+        return _write_block(ds, bb, data, options, 0, block_id)
+
+
+def write_segmentation(in_path, in_key, out_path, out_key,
+                       labeling, chunks, metadata_format,
+                       target, max_jobs, tmp_folder,
+                       compression=None, compression_level=None, narrow_dtype=False, skip_empty_chunks=False,
+                       relabel_consecutive=False, morphology_folder=None):
+    """Apply the `labeling` (a `_NodeLabels` mapping) to the segmentation, writing the relabeled scale-0
+    dataset to ``out_path/out_key``. 2d inputs are promoted to 3d for the bdv formats, as in `downscale`.
+    The max id is computed from the relabeled blocks and written as the ``maxId`` attribute of the dataset.
+    With ``narrow_dtype`` the dataset is stored with the smallest unsigned integer type that holds the segment
+    ids of the labeling. With ``relabel_consecutive``
+    the ids are made consecutive (see `_consecutive_labels`, the labeling may be None in this case)
+    and the ``(old_id, new_id)`` lookup table is returned, otherwise None. With a ``morphology_folder`` the per-label
+    statistics of the relabeled blocks are saved to it, see `utils.downscale`. Also returns the number of chunks
+    that were skipped because they are empty (0 without ``skip_empty_chunks``)."""
+    run_kwargs = _run_kwargs(target, max_jobs, tmp_folder)
+    with _distributable(open_input(in_path, in_key), run_kwargs, tmp_folder) as src:
+        # the bdv formats require 3d data, see `downscale`.
+        if not metadata_format.startswith("ome.zarr") and src.ndim == 2:
+            src = ExpandDimsSource(src, axis=0)
+        lut = None
+        if relabel_consecutive:
+            labeling, lut = _consecutive_labels(src, chunks, run_kwargs, labeling)
+        # overwrite any previous conversion of this segmentation at the output location.
+        _remove_output(out_path)
         with _open_storage(out_path, metadata_format, mode="a") as f:
-            base = _create_level(f, metadata_format, 0, src.shape, chunks, src.dtype)
-            copy(src, output=base, block_shape=tuple(int(c) for c in base.chunks), **run_kwargs)
-            _build_pyramid(f, base, src.shape, scale_factors, metadata_format, chunks,
-                           src.dtype, order, anti_aliasing, run_kwargs)
+            # segment ids can exceed the fragment-id range, so store the relabeled output as uint64
+            # unless the dtype is narrowed to the range of the segment ids.
+            dtype = _narrowed_dtype(labeling.max_id()) if narrow_dtype else np.dtype("uint64")
+            options = _WriteOptions(metadata_format, dtype.name, compression=compression,
+                                    compression_level=compression_level, skip_empty_chunks=skip_empty_chunks,
+                                    with_max_id=True, morphology_folder=morphology_folder)
+            ds = _create_level(f, metadata_format, 0, src.shape, chunks, dtype, **options.compression_kwargs)
+            block_shape = _block_shape(ds)
+            n_blocks = get_blocking(ds.shape, block_shape).number_of_blocks
 
-    metadata_dict = {"resolution": list(resolution), "unit": unit, "setup_name": source_name}
-    write_format_metadata(metadata_format, out_path, metadata_dict, scale_factors)
+        # relabel is a disjoint per-block point op; block_shape == the output chunks (or shards) keeps
+        # concurrent block writes safe (same idiom as downscale's copy calls).
+        source = src if run_kwargs["job_type"] == "local" else src.to_spec()
+        # the workers of the distributed targets memory-map the node labels instead of unpickling a copy.
+        label_folder = os.path.join(tmp_folder, "node_labels")
+        if run_kwargs["job_type"] != "local":
+            labeling.save(label_folder)
+        results = _run_blocks(
+            functools.partial(_relabel_block, source=source, labeling=labeling, out_path=out_path, out_key=out_key,
+                              block_shape=block_shape, options=options),
+            n_blocks, run_kwargs, name="relabel", has_return_val=True,
+        )
+    max_id, n_skipped = _reduce_results(results)
+    with _open_storage(out_path, metadata_format, mode="a") as f:
+        f[out_key].attrs["maxId"] = max_id
+    if skip_empty_chunks:
+        print("Skipped writing", n_skipped, "empty chunks")
+    if os.path.exists(label_folder):
+        shutil.rmtree(label_folder)
+    return lut, n_skipped
 
 
 def compute_max_id(path, key, tmp_folder, target, max_jobs):
@@ -189,9 +1673,7 @@ def add_max_id(in_path, in_key, out_path, out_key,
         if "maxId" in f_out[out_key].attrs:
             return
 
-    with open_file(in_path, "r") as f:
-        max_id = f[in_key].attrs.get("maxId", None)
-
+    max_id = _input_max_id(in_path, in_key)
     if max_id is None:
         max_id = compute_max_id(out_path, out_key, tmp_folder, target, max_jobs)
 
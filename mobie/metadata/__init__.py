@@ -1,6 +1,6 @@
 """Functionality for manipulating MoBIE metadata files.
 """
-from .dataset_metadata import (add_view_to_dataset, copy_dataset_folder,
+from .dataset_metadata import (DatasetMetadataTransaction, add_view_to_dataset, copy_dataset_folder,
                                create_dataset_structure, create_dataset_metadata,
                                read_dataset_metadata, set_is2d, write_dataset_metadata)
 from .project_metadata import (add_dataset, create_project_metadata,
@@ -8,7 +8,8 @@ from .project_metadata import (add_dataset, create_project_metadata,
                                read_project_metadata, project_exists, write_project_metadata)
 from .remote_metadata import (add_remote_dataset_metadata, add_remote_project_metadata, add_remote_source_metadata,
                               upload_source)
-from .source_metadata import add_regions_to_dataset, add_source_to_dataset, get_image_metadata, get_segmentation_metadata
+from .source_metadata import (add_regions_to_dataset, add_source_to_dataset, add_sources_to_dataset,
+                              get_image_metadata, get_segmentation_metadata)
 from .view_metadata import (is_grid_view, create_region_display,
                             get_affine_source_transform, get_crop_source_transform, get_default_view,
                             get_merged_grid_source_transform,
@@ -1,13 +1,15 @@
 """Functionality for MoBIE dataset metadata.
 """
+import copy
 import os
 import shutil
+import threading
 import warnings
 from glob import glob
 from typing import Callable, Dict, List, Optional, Sequence
 
 from pybdv.metadata import get_data_path, get_bdv_format
-from .utils import read_metadata, write_metadata
+from .utils import metadata_lock, read_metadata, update_metadata, write_metadata
 from ..validation import validate_view_metadata
 from ..validation.utils import validate_with_schema
 from ..xml_utils import copy_xml_with_newpath
@@ -17,14 +19,83 @@ from ..xml_utils import copy_xml_with_newpath
 # functionality for reading / writing dataset.json
 #
 
+# the open transactions of each thread, mapping the absolute dataset folder to the transaction.
+_TRANSACTIONS = threading.local()
+
+
+def _open_transactions():
+    if not hasattr(_TRANSACTIONS, "transactions"):
+        _TRANSACTIONS.transactions = {}
+    return _TRANSACTIONS.transactions
+
+
+class DatasetMetadataTransaction:
+    """Context manager for applying many changes to the metadata of a dataset with a single write.
+
+    The dataset metadata is read once when entering the context. Within the context, `read_dataset_metadata`
+    and `write_dataset_metadata` for this dataset operate on the metadata in memory, so that all
+    functions that add sources or views, e.g. `add_source_to_dataset` or `mobie.add_image`, join the transaction.
+    The metadata is written when leaving the context; if an exception was raised nothing is written.
+    Nested transactions for the same dataset join the outer one.
+
+    The transaction holds a lock on dataset.json, so that other threads and processes,
+    including jobs on other nodes of a shared filesystem, wait for it to finish before modifying the metadata.
+    All functions that add sources or views to a dataset use a transaction, so that they can be called in parallel.
+
+    Args:
+        dataset_folder: The folder of the dataset.
+
+    Example:
+        >>> with DatasetMetadataTransaction(dataset_folder):
+        >>>     for name, path in zip(source_names, metadata_paths):
+        >>>         add_source_to_dataset(dataset_folder, "image", name, path)
+    """
+    def __init__(self, dataset_folder: str):
+        self.dataset_folder = os.path.abspath(dataset_folder)
+        self.metadata = None
+        self._lock = None
+
+    def __enter__(self):
+        transactions = _open_transactions()
+        if self.dataset_folder in transactions:
+            return transactions[self.dataset_folder]
+        path = os.path.join(self.dataset_folder, "dataset.json")
+        lock = metadata_lock(path)
+        lock.__enter__()
+        try:
+            self.metadata = read_metadata(path)
+        except BaseException:
+            lock.__exit__(None, None, None)
+            raise
+        self._lock = lock
+        transactions[self.dataset_folder] = self
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self._lock is None:
+            return
+        _open_transactions().pop(self.dataset_folder)
+        try:
+            if exc_type is None:
+                write_metadata(os.path.join(self.dataset_folder, "dataset.json"), self.metadata)
+        finally:
+            lock, self._lock = self._lock, None
+            lock.__exit__(None, None, None)
+
 
 def write_dataset_metadata(dataset_folder: str, dataset_metadata: Dict):
     """Write dataset metadata.
 
+    Within a `DatasetMetadataTransaction` for this dataset, the metadata is only written when the transaction ends.
+
     Args:
         dataset_folder: The folder of the dataset metadata.
         dataset_metadata: The dataset metadata to write.
     """
+    transaction = _open_transactions().get(os.path.abspath(dataset_folder))
+    if transaction is not None:
+        transaction.metadata = copy.deepcopy(dataset_metadata)
+        return
     path = os.path.join(dataset_folder, "dataset.json")
     write_metadata(path, dataset_metadata)
 
@@ -32,12 +103,18 @@ def write_dataset_metadata(dataset_folder: str, dataset_metadata: Dict):
 def read_dataset_metadata(dataset_folder: str) -> Dict:
     """Read dataset metadata.
 
+    Within a `DatasetMetadataTransaction` for this dataset, a copy of the metadata of the transaction is returned,
+    so that changes only take effect when they are written with `write_dataset_metadata`.
+
     Args:
         dataset_folder: The folder of the dataset metadata.
 
     Returns:
         The dataset metadata.
     """
+    transaction = _open_transactions().get(os.path.abspath(dataset_folder))
+    if transaction is not None:
+        return copy.deepcopy(transaction.metadata)
     path = os.path.join(dataset_folder, "dataset.json")
     return read_metadata(path)
 
@@ -101,28 +178,26 @@ def add_view_to_dataset(
     """
     validate_view_metadata(view)
 
+    def add_view(metadata):
+        if view_name in metadata["views"]:
+            msg = f"A view with name {view_name} already exists for the dataset {dataset_folder}"
+            if overwrite:
+                warnings.warn(msg)
+            else:
+                raise ValueError(msg)
+        metadata["views"][view_name] = view
+
     if bookmark_file_name is None:
-        metadata = read_dataset_metadata(dataset_folder)
+        with DatasetMetadataTransaction(dataset_folder) as transaction:
+            add_view(transaction.metadata)
     else:
         if not bookmark_file_name.endswith(".json"):
             bookmark_file_name += ".json"
         view_file = os.path.join(dataset_folder, "misc", "views", bookmark_file_name)
-        metadata = read_metadata(view_file)
-        if "views" not in metadata:
-            metadata["views"] = {}
-
-    if view_name in metadata["views"]:
-        msg = f"A view with name {view_name} already exists for the dataset {dataset_folder}"
-        if overwrite:
-            warnings.warn(msg)
-        else:
-            raise ValueError(msg)
-    metadata["views"][view_name] = view
-
-    if bookmark_file_name is None:
-        write_dataset_metadata(dataset_folder, metadata)
-    else:
-        write_metadata(view_file, metadata)
+        with update_metadata(view_file) as metadata:
+            if "views" not in metadata:
+                metadata["views"] = {}
+            add_view(metadata)
 
 
 def add_default_location_to_dataset(dataset_folder: str, location) -> None:
@@ -132,10 +207,11 @@ def add_default_location_to_dataset(dataset_folder: str, location) -> None:
         dataset_folder: The folder of the dataset.
         location: The default location for this dataset.
     """
-    metadata = read_dataset_metadata(dataset_folder)
-    metadata["defaultLocation"] = location
-    validate_with_schema(metadata, "dataset")
-    write_dataset_metadata(dataset_folder, metadata)
+    with DatasetMetadataTransaction(dataset_folder) as transaction:
+        metadata = transaction.metadata
+        # validate before updating the metadata, so that an invalid location doesn't end up in the transaction.
+        validate_with_schema({**metadata, "defaultLocation": location}, "dataset")
+        metadata["defaultLocation"] = location
 
 
 def create_dataset_structure(root: str, dataset_name: str, file_formats: Optional[Sequence[str]] = None) -> str:
@@ -167,9 +243,10 @@ def set_is2d(dataset_folder: str, is2d: bool) -> None:
         is2d: The value for the is2d flag.
     """
     assert isinstance(is2d, bool)
-    metadata = read_dataset_metadata(dataset_folder)
-    metadata["is2D"] = is2d
-    write_dataset_metadata(dataset_folder, metadata)
+    with DatasetMetadataTransaction(dataset_folder):
+        metadata = read_dataset_metadata(dataset_folder)
+        metadata["is2D"] = is2d
+        write_dataset_metadata(dataset_folder, metadata)
 
 
 def get_file_formats(dataset_folder: str) -> List[str]:
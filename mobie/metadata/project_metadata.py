@@ -4,7 +4,7 @@ import os
 import warnings
 from typing import Dict, List, Optional, Sequence
 
-from .utils import read_metadata, write_metadata
+from .utils import read_metadata, update_metadata, write_metadata
 from ..__version__ import SPEC_VERSION
 
 #
@@ -105,18 +105,15 @@ def add_dataset(root: str, dataset_name: str, is_default: bool):
         dataset_name: The name of the dataset to add.
         is_default: Whether this is the default dataset.
     """
-    project = read_project_metadata(root)
-
-    if dataset_name in project["datasets"]:
-        warnings.warn(f"Dataset {dataset_name} is already present!")
-    else:
-        project["datasets"].append(dataset_name)
-
-    # if this is the only dataset we set it as default
-    if is_default or len(project["datasets"]) == 1:
-        project["defaultDataset"] = dataset_name
-
-    write_project_metadata(root, project)
+    with update_metadata(os.path.join(root, "project.json")) as project:
+        if dataset_name in project["datasets"]:
+            warnings.warn(f"Dataset {dataset_name} is already present!")
+        else:
+            project["datasets"].append(dataset_name)
+
+        # if this is the only dataset we set it as default
+        if is_default or len(project["datasets"]) == 1:
+            project["defaultDataset"] = dataset_name
 
 
 def get_datasets(root: str) -> List[str]:
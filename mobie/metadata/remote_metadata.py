@@ -63,7 +63,7 @@ def _to_bdv_s3(file_format,
     return new_format, {"relativePath": xml_remote}
 
 
-def _to_ome_zarr_s3(dataset_folder, dataset_name, storage,
+def _to_ome_zarr_s3(file_format, dataset_folder, dataset_name, storage,
                     service_endpoint, bucket_name, region):
     rel_path = storage["relativePath"]
     abs_path = os.path.abspath(os.path.join(dataset_folder, rel_path))
@@ -82,7 +82,7 @@ def _to_ome_zarr_s3(dataset_folder, dataset_name, storage,
         s3_storage["region"] = region
     if "channel" in storage:
         s3_storage["channel"] = storage["channel"]
-    return "ome.zarr.s3", s3_storage
+    return file_format + ".s3", s3_storage
 
 
 def add_remote_source_metadata(metadata, dataset_folder, dataset_name,
@@ -105,7 +105,7 @@ def add_remote_source_metadata(metadata, dataset_folder, dataset_name,
                                                 service_endpoint, bucket_name, region)
             new_metadata[source_type]["imageData"][new_format] = s3_storage
         elif file_format == "ome.zarr":
-            new_format, s3_storage = _to_ome_zarr_s3(dataset_folder, dataset_name, storage,
+            new_format, s3_storage = _to_ome_zarr_s3(file_format, dataset_folder, dataset_name, storage,
                                                      service_endpoint, bucket_name, region)
             new_metadata[source_type]["imageData"][new_format] = s3_storage
         elif file_format.endswith("s3"):
@@ -3,13 +3,13 @@
 import json
 import os
 import warnings
-from typing import Dict, Optional
+from typing import Dict, Optional, Sequence
 
 import pandas as pd
 import elf.transformation as trafo_utils
 from pybdv import metadata as bdv_metadata
 
-from .dataset_metadata import read_dataset_metadata, write_dataset_metadata
+from .dataset_metadata import DatasetMetadataTransaction
 from .utils import get_table_metadata
 from .view_metadata import get_default_view
 from ..tables import read_table
@@ -36,17 +36,24 @@ def _load_json_from_file(path):
 
 
 def _load_ome_zarr_metadata(dataset_folder, storage, data_format):
+    # sharded ome.zarr (zarr v3, NGFF v0.5) stores the attributes in zarr.json, under the "ome" key.
     if data_format == "ome.zarr":
-        attrs_path = os.path.join(dataset_folder, storage["relativePath"], ".zattrs")
-        attrs = _load_json_from_file(attrs_path)
+        path = os.path.join(dataset_folder, storage["relativePath"])
+        is_v3 = os.path.exists(os.path.join(path, "zarr.json"))
+        attrs = _load_json_from_file(os.path.join(path, "zarr.json" if is_v3 else ".zattrs"))
     else:
         assert data_format == "ome.zarr.s3"
-        address = os.path.join(storage["s3Address"], ".zattrs")
-        try:
-            attrs = load_json_from_s3(address)
-        except Exception:
-            attrs = None
-    return None if attrs is None else attrs["multiscales"][0]
+        attrs, is_v3 = None, False
+        for attrs_name in (".zattrs", "zarr.json"):
+            try:
+                attrs = load_json_from_s3(os.path.join(storage["s3Address"], attrs_name))
+            except Exception:
+                continue
+            is_v3 = attrs_name == "zarr.json"
+            break
+    if attrs is None:
+        return None
+    return attrs["attributes"]["ome"]["multiscales"][0] if is_v3 else attrs["multiscales"][0]
 
 
 def _load_image_metadata(source_metadata, dataset_folder):
@@ -69,16 +76,17 @@ def get_shape(source_metadata, dataset_folder):
         shape = bdv_metadata.get_size(image_metadata, setup_id=0)
     elif data_format == "ome.zarr":
         dataset_path = image_metadata["datasets"][0]["path"]
-        array_path = os.path.join(
-            dataset_folder, source_metadata[data_format]["relativePath"], dataset_path, ".zarray"
-        )
-        array_metadata = _load_json_from_file(array_path)
+        array_path = os.path.join(dataset_folder, source_metadata[data_format]["relativePath"], dataset_path)
+        array_name = "zarr.json" if os.path.exists(os.path.join(array_path, "zarr.json")) else ".zarray"
+        array_metadata = _load_json_from_file(os.path.join(array_path, array_name))
         shape = array_metadata["shape"]
     elif data_format == "ome.zarr.s3":
         dataset_path = image_metadata["datasets"][0]["path"]
-        address = source_metadata[data_format]["s3Address"]
-        array_address = os.path.join(address, dataset_path, ".zarray")
-        array_metadata = load_json_from_s3(array_address)
+        address = os.path.join(source_metadata[data_format]["s3Address"], dataset_path)
+        try:
+            array_metadata = load_json_from_s3(os.path.join(address, ".zarray"))
+        except Exception:
+            array_metadata = load_json_from_s3(os.path.join(address, "zarr.json"))
         shape = array_metadata["shape"]
     else:
         raise ValueError(f"Unsupported data format {data_format}")
@@ -174,6 +182,9 @@ def _get_file_format(path):
 
 def _get_image_metadata(dataset_folder, path, type_, file_format, channel):
     file_format = _get_file_format(path) if file_format is None else file_format
+    # sharded ome.zarr data (zarr v3) is registered as ome.zarr, the zarr version is detected from the data.
+    if file_format == "ome.zarr.v3":
+        file_format = "ome.zarr"
 
     if file_format.startswith("bdv"):
         format_ = {"relativePath": os.path.relpath(path, dataset_folder)}
@@ -193,7 +204,7 @@ def _get_image_metadata(dataset_folder, path, type_, file_format, channel):
             format_[key] = format_[key].replace("\\", "/")
 
     if channel is not None:
-        if file_format not in ("ome.zarr", "ome.zarr.s3"):
+        if not file_format.startswith("ome.zarr"):
             raise NotImplementedError
         format_["channel"] = channel
 
@@ -240,6 +251,59 @@ def get_spot_metadata(dataset_folder, table_folder,
     return source_metadata
 
 
+def _source_entries(
+    dataset_metadata, dataset_folder, source_type, source_name, image_metadata_path,
+    file_format, view, table_folder, overwrite, channel, is_2d, **kwargs
+):
+    """Create and validate the metadata and the view of a source, without adding them to the dataset metadata.
+    The view is None if no view is added.
+    """
+    if source_name in dataset_metadata["sources"] or source_name in dataset_metadata["views"]:
+        msg = f"A source with name {source_name} already exists for the dataset {dataset_folder}"
+        if overwrite:
+            warnings.warn(msg)
+        else:
+            raise ValueError(msg)
+
+    if source_type == "image":
+        source_metadata = get_image_metadata(dataset_folder, image_metadata_path,
+                                             file_format=file_format,
+                                             channel=channel)
+    elif source_type == "segmentation":
+        source_metadata = get_segmentation_metadata(dataset_folder,
+                                                    image_metadata_path,
+                                                    table_folder,
+                                                    file_format=file_format,
+                                                    channel=channel)
+    elif source_type == "spots":
+        source_metadata = get_spot_metadata(dataset_folder,
+                                            table_folder,
+                                            **kwargs)
+    else:
+        raise ValueError(f"Invalid source type: {source_type}, expect one of 'image', 'segmentation' or 'spots'")
+
+    if is_2d is None:
+        is_2d = dataset_metadata.get("is2D", False)
+    # the source metadata is created by mobie, so it doesn't need to be checked against the json schema
+    validate_source_metadata(source_name, source_metadata, dataset_folder, is_2d=is_2d, trusted=True)
+
+    if view == {}:
+        return source_metadata, None
+    trusted_view = view is None
+    if view is None:
+        view = get_default_view(source_type, source_name)
+    validate_view_metadata(view, trusted=trusted_view)
+    return source_metadata, view
+
+
+def _add_entries(dataset_metadata, entries):
+    """Add the source metadata and views (see `_source_entries`) to the dataset metadata."""
+    for source_name, (source_metadata, view) in entries.items():
+        dataset_metadata["sources"][source_name] = source_metadata
+        if view is not None:
+            dataset_metadata["views"][source_name] = view
+
+
 def add_source_to_dataset(
     dataset_folder: str,
     source_type: str,
@@ -271,48 +335,61 @@ def add_source_to_dataset(
         is_2d: Whether this is a 2d source.
         kwargs: Additional keyword arguments for spot sources.
     """
-    dataset_metadata = read_dataset_metadata(dataset_folder)
-    sources_metadata = dataset_metadata["sources"]
-    view_metadata = dataset_metadata["views"]
-
-    if source_name in sources_metadata or source_name in view_metadata:
-        msg = f"A source with name {source_name} already exists for the dataset {dataset_folder}"
-        if overwrite:
-            warnings.warn(msg)
-        else:
-            raise ValueError(msg)
+    # the source is only added once its metadata and view are valid, so that a failure doesn't leave partial edits.
+    with DatasetMetadataTransaction(dataset_folder) as transaction:
+        entries = {source_name: _source_entries(
+            transaction.metadata, dataset_folder, source_type, source_name, image_metadata_path,
+            file_format, view, table_folder, overwrite, channel, is_2d, **kwargs
+        )}
+        _add_entries(transaction.metadata, entries)
 
-    if source_type == "image":
-        source_metadata = get_image_metadata(dataset_folder, image_metadata_path,
-                                             file_format=file_format,
-                                             channel=channel)
-    elif source_type == "segmentation":
-        source_metadata = get_segmentation_metadata(dataset_folder,
-                                                    image_metadata_path,
-                                                    table_folder,
-                                                    file_format=file_format,
-                                                    channel=channel)
-    elif source_type == "spots":
-        source_metadata = get_spot_metadata(dataset_folder,
-                                            table_folder,
-                                            **kwargs)
-    else:
-        raise ValueError(f"Invalid source type: {source_type}, expect one of 'image', 'segmentation' or 'spots'")
 
-    if is_2d is None:
-        is_2d = dataset_metadata.get("is2D", False)
-    validate_source_metadata(source_name, source_metadata, dataset_folder, is_2d=is_2d)
-    sources_metadata[source_name] = source_metadata
-    dataset_metadata["sources"] = sources_metadata
+def add_sources_to_dataset(
+    dataset_folder: str,
+    source_type: str,
+    source_names: Sequence[str],
+    image_metadata_paths: Sequence[str],
+    file_format: Optional[str] = None,
+    views: Optional[Sequence[Optional[Dict]]] = None,
+    table_folders: Optional[Sequence[Optional[str]]] = None,
+    overwrite: bool = True,
+    channels: Optional[Sequence[Optional[int]]] = None,
+    is_2d: Optional[bool] = None,
+) -> None:
+    """Add the metadata of several image or segmentation sources to a MoBIE dataset.
 
-    if view != {}:
-        if view is None:
-            view = get_default_view(source_type, source_name)
-        validate_view_metadata(view)
-        view_metadata[source_name] = view
-        dataset_metadata["views"] = view_metadata
+    In contrast to calling `add_source_to_dataset` for each source, the dataset metadata is only written once.
 
-    write_dataset_metadata(dataset_folder, dataset_metadata)
+    Args:
+        dataset_folder: The path to the dataset folder.
+        source_type: The type of the sources, either 'image' or 'segmentation'.
+        source_names: The names of the sources.
+        image_metadata_paths: The paths to the image metadata (like BDV-XML) corresponding to the sources.
+        file_format: The the file format. Normally this will be autodetected
+            and it only needs to be passed here if autodetection fails.
+        views: The views for the sources. By default, will create a default view for each source.
+        table_folders: The table folders for segmentations.
+        overwrite: Whether to overwrite existing entries.
+        channels: The channels to load from the data. Currently only supported for the ome.zarr format.
+        is_2d: Whether these are 2d sources.
+    """
+    n_sources = len(source_names)
+    if len(image_metadata_paths) != n_sources:
+        raise ValueError(f"Expect {n_sources} image metadata paths, got {len(image_metadata_paths)}.")
+    views = [None] * n_sources if views is None else views
+    table_folders = [None] * n_sources if table_folders is None else table_folders
+    channels = [None] * n_sources if channels is None else channels
+
+    # the sources are only added once all of them are valid.
+    with DatasetMetadataTransaction(dataset_folder) as transaction:
+        entries = {
+            name: _source_entries(transaction.metadata, dataset_folder, source_type, name, path,
+                                  file_format, view, table_folder, overwrite, channel, is_2d)
+            for name, path, view, table_folder, channel in zip(
+                source_names, image_metadata_paths, views, table_folders, channels
+            )
+        }
+        _add_entries(transaction.metadata, entries)
 
 
 def add_regions_to_dataset(
@@ -331,9 +408,6 @@ def add_regions_to_dataset(
         table_folder: Optional table folder for this region source. If not given, will be created at a default location.
         additional_tables: Optional dictionary with additional tables for this region source.
     """
-    dataset_metadata = read_dataset_metadata(dataset_folder)
-    sources_metadata = dataset_metadata["sources"]
-
     if table_folder is None:
         table_folder = os.path.join(dataset_folder, "tables", source_name)
     default_table = read_table(default_table)
@@ -350,9 +424,8 @@ def add_regions_to_dataset(
     table_data = get_table_metadata(relative_table_location)
     source_metadata = {"regions": {"tableData": table_data}}
 
-    is_2d = dataset_metadata.get("is2D", False)
-    validate_source_metadata(source_name, source_metadata, dataset_folder, is_2d=is_2d)
-    sources_metadata[source_name] = source_metadata
-    dataset_metadata["sources"] = sources_metadata
-
-    write_dataset_metadata(dataset_folder, dataset_metadata)
+    with DatasetMetadataTransaction(dataset_folder) as transaction:
+        dataset_metadata = transaction.metadata
+        is_2d = dataset_metadata.get("is2D", False)
+        validate_source_metadata(source_name, source_metadata, dataset_folder, is_2d=is_2d, trusted=True)
+        dataset_metadata["sources"][source_name] = source_metadata
@@ -2,12 +2,92 @@
 """
 import json
 import os
+import threading
+import time
+from contextlib import contextmanager
+
 import numpy as np
 
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+    import msvcrt
+
+# the locks held by this process, mapping the lock file to its state;
+# the thread lock makes the file lock re-entrant within a thread and exclusive between threads.
+_LOCKS = {}
+_LOCKS_GUARD = threading.Lock()
+
+
+def _acquire_file_lock(lock_path):
+    lock_file = open(lock_path, "a+")
+    if fcntl is not None:
+        # posix record locks (unlike flock) are also supported on NFS.
+        fcntl.lockf(lock_file, fcntl.LOCK_EX)
+        return lock_file
+    while True:
+        try:
+            lock_file.seek(0)
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_NBLCK, 1)
+            return lock_file
+        except OSError:
+            time.sleep(0.05)
+
+
+def _release_file_lock(lock_file):
+    if fcntl is not None:
+        fcntl.lockf(lock_file, fcntl.LOCK_UN)
+    else:
+        lock_file.seek(0)
+        msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+    lock_file.close()
+
+
+@contextmanager
+def metadata_lock(path):
+    """Advisory lock for read-modify-write updates of a metadata file.
+
+    The lock is held on a hidden lock file next to the metadata file, so that it works across processes,
+    including processes on different nodes that share a filesystem. It is re-entrant within a thread.
+    """
+    folder, name = os.path.split(os.path.abspath(path))
+    os.makedirs(folder, exist_ok=True)
+    lock_path = os.path.join(folder, f".{name}.lock")
+    with _LOCKS_GUARD:
+        lock = _LOCKS.setdefault(lock_path, {"thread_lock": threading.RLock(), "depth": 0, "file": None})
+    with lock["thread_lock"]:
+        if lock["depth"] == 0:
+            lock["file"] = _acquire_file_lock(lock_path)
+        lock["depth"] += 1
+        try:
+            yield
+        finally:
+            lock["depth"] -= 1
+            if lock["depth"] == 0:
+                _release_file_lock(lock["file"])
+                lock["file"] = None
+
+
+@contextmanager
+def update_metadata(path):
+    """Read a metadata file, yield it for modifications and write it, while holding the lock for the file."""
+    with metadata_lock(path):
+        metadata = read_metadata(path)
+        yield metadata
+        write_metadata(path, metadata)
+
 
 def write_metadata(path, metadata):
-    with open(path, "w") as f:
-        json.dump(metadata, f, indent=2, sort_keys=True, cls=NPTypesEncoder)
+    # write to a temporary file that is then renamed, so that readers never see a partially written file.
+    tmp_path = f"{path}.{os.getpid()}-{threading.get_ident()}.tmp"
+    try:
+        with open(tmp_path, "w") as f:
+            json.dump(metadata, f, indent=2, sort_keys=True, cls=NPTypesEncoder)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
 
 
 def read_metadata(path):
@@ -9,6 +9,7 @@ import numpy as np
 from .dataset_metadata import read_dataset_metadata, write_dataset_metadata
 from .utils import get_table_metadata
 from ..tables import check_region_table, compute_region_table
+from ..tables.utils import get_default_table_path
 
 
 #
@@ -508,8 +509,7 @@ def require_region_table(dataset_folder, table_source, table_folder, this_source
         table_folder_path = os.path.join(
             dataset_folder, sources[table_source]["regions"]["tableData"]["tsv"]["relativePath"]
         )
-        default_table_path = os.path.join(table_folder_path, "default.tsv")
-        check_region_table(this_sources, default_table_path)
+        check_region_table(this_sources, get_default_table_path(table_folder_path))
     else:
         # create and write the default region table
         table_folder_path = os.path.join(dataset_folder, table_folder)
@@ -42,6 +42,7 @@ def add_registered_source(
     bounding_box: Optional[List[List[int]]] = None,
     is_default_dataset: bool = False,
     description: Optional[str] = None,
+    skip_empty_chunks: bool = False,
 ) -> None:
     """Add a volume after registration in elastix format.
 
@@ -76,6 +77,8 @@ def add_registered_source(
             needs to be specified in the output dataset space.
         is_default_dataset: Whether to set new dataset as default dataset. Only applies if the dataset is created.
         description: The description of this source.
+        skip_empty_chunks: Whether to leave the chunks that are empty after the registration (e.g. outside of
+            the transformed volume) unwritten. Only supported for the 'affine' method.
     """
     if apply_registration is None:
         raise ValueError("Could not import 'apply_registration' functionality")
@@ -99,7 +102,8 @@ def add_registered_source(
                                               fiji_executable=fiji_executable, elastix_directory=elastix_directory,
                                               shape=shape, resolution=resolution, chunks=chunks,
                                               tmp_folder=tmp_folder, target=target, max_jobs=max_jobs,
-                                              bounding_box=bounding_box, file_format=file_format)
+                                              bounding_box=bounding_box, file_format=file_format,
+                                              skip_empty_chunks=skip_empty_chunks)
 
     data_key = get_scale_key(file_format, 0)
     # we don"t need to downscale the data if the transformation is applied on the fly by bdv
@@ -114,7 +118,8 @@ def add_registered_source(
                   effective_resolution, scale_factors, chunks,
                   tmp_folder, target, max_jobs, block_shape=chunks,
                   library=ds_library, library_kwargs=ds_library_kwargs,
-                  metadata_format=file_format, source_name=source_name)
+                  metadata_format=file_format, source_name=source_name,
+                  skip_empty_chunks=skip_empty_chunks)
         add_max_id(input_path, input_key, data_path, data_key,
                    tmp_folder, target, max_jobs)
 
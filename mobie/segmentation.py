@@ -3,28 +3,55 @@
 
 import multiprocessing
 import os
+import warnings
+from shutil import rmtree
 from typing import Dict, List, Optional, Sequence, Union
 
 import mobie
 import numpy as np
 import pandas as pd
+from pybdv.metadata import get_data_path
 
 from mobie.import_data import (import_segmentation,
                                import_segmentation_from_node_labels)
+from mobie.import_data.pyramid import require_pyramid_parameters
 from mobie.tables import check_and_copy_default_table, compute_default_table
+from mobie.tables.default_table import compute_default_table_from_blocks
+from mobie.tables.intensity_table import compute_intensity_table
+from mobie.tables.utils import read_table
+
+
+def _save_relabeling(dataset_folder, segmentation_name, lut):
+    """Save the lookup table of the consecutive relabeling in the misc folder of the dataset."""
+    lut_folder = os.path.join(dataset_folder, "misc", "relabeling")
+    os.makedirs(lut_folder, exist_ok=True)
+    lut_path = os.path.join(lut_folder, f"{segmentation_name}.tsv")
+    pd.DataFrame(lut, columns=["old_id", "new_id"]).to_csv(lut_path, sep="\t", index=False)
+    return lut_path
+
+
+def _relabel_table(table, lut):
+    """Map the label ids of a table to the consecutive ids of the relabeled segmentation."""
+    table = read_table(table).copy()
+    new_ids = table["label_id"].map(pd.Series(lut[:, 1], index=lut[:, 0]))
+    missing = new_ids.isna()
+    if missing.any():
+        warnings.warn(f"Dropping {int(missing.sum())} rows of the table whose label ids are not in the segmentation.")
+    table = table[~missing]
+    table["label_id"] = new_ids[~missing].astype("uint64")
+    return table
 
 
 # TODO support transformation
-# TODO support default arguments for scale factors and chunks
 def add_segmentation(
-    input_path: str,
+    input_path: Union[str, np.ndarray],
     input_key: str,
     root: str,
     dataset_name: str,
     segmentation_name: str,
     resolution: Sequence[float],
-    scale_factors: List[List[int]],
-    chunks: Sequence[int],
+    scale_factors: Optional[List[List[int]]] = None,
+    chunks: Optional[Sequence[int]] = None,
     menu_name: Optional[str] = None,
     file_format: str = "ome.zarr",
     node_label_path: Optional[str] = None,
@@ -38,18 +65,31 @@ def add_segmentation(
     is_default_dataset: bool = False,
     description: Optional[str] = None,
     is_2d: Optional[bool] = None,
+    compression: Optional[str] = None,
+    compression_level: Optional[int] = None,
+    max_top_level_size: int = 512,
+    read_slabs: bool = False,
+    narrow_dtype: bool = False,
+    skip_empty_chunks: bool = False,
+    relabel_consecutive: bool = False,
+    downsampling_mode: str = "nearest",
+    pipelined_table: bool = False,
+    dry_run: bool = False,
 ) -> None:
     """Add segmentation source to MoBIE dataset.
 
     Args:
         input_path: The path to the segmentation to add.
+            This can also be an in-memory array (numpy array, numpy memmap, zarr or dask array),
+            which is converted directly, without writing it to a temporary file.
         input_key: The key to the segmentation to add.
         root: The data root folder.
         dataset_name: The name of the dataset the segmentation should be added to.
         segmentation_name: The name of the segmentation.
         resolution: The resolution of the segmentation in micrometer.
         scale_factors: The scale factors used for down-sampling.
-        chunks: The chunks for the data.
+            By default they are planned from the shape and resolution of the data, see `import_data.plan_pyramid`.
+        chunks: The chunks for the data. By default they are planned together with the scale factors.
         menu_name: The menu name for this source.
             If none is given will be created based on the sourec name.
         file_format: The file format used to store the data internally.
@@ -67,9 +107,32 @@ def add_segmentation(
         is_default_dataset: Whether to set new dataset as default dataset. Only applies if the dataset is being created.
         description: The description for this segmentation source.
         is_2d: Whether this is a 2d segmentation.
+        compression: The compression codec for the data, one of "blosc-lz4", "blosc-zstd", "gzip" or "raw".
+            By default the default compression of the file format is used.
+        compression_level: The compression level. By default the default level of the codec is used.
+        max_top_level_size: The maximal size of the lowest resolution level along each axis.
+            Only used if the scale factors are planned automatically.
+        read_slabs: Whether to read the input in slabs along the first axis, which reads each page of a tif stack
+            or each file of a folder of slices only once. Uncompressed tif pages are memory-mapped.
+        narrow_dtype: Whether to store the segmentation with the smallest unsigned integer type that holds its
+            max id (e.g. uint16 instead of uint64), which reduces the size of the data.
+        skip_empty_chunks: Whether to leave the chunks that only contain background (0) unwritten,
+            which saves storage for sparse segmentations.
+        relabel_consecutive: Whether to relabel the ids of the segmentation to consecutive ids (1, 2, 3, ...).
+            The lookup table from the old to the new ids is saved to "misc/relabeling/<segmentation_name>.tsv"
+            in the dataset folder, so that existing annotations can be mapped to the new ids.
+            If an initial default table is passed, its label ids are mapped as well.
+        downsampling_mode: How the labels are downsampled: "nearest" (nearest-neighbor sampling), "mode" (the most
+            frequent label) or "mode-nonzero" (the most frequent non-zero label), see `import_data.import_segmentation`.
+        pipelined_table: Whether to accumulate the statistics of the default table while the segmentation is written,
+            instead of computing the table in a second pass over the data.
+        dry_run: Whether to only print the multiscale pyramid that would be written, without converting the data
+            or adding the source. See `import_data.describe_pyramid` for the printed table.
     """
-    if isinstance(input_path, np.ndarray):
-        input_path, input_key = mobie.utils.save_temp_input(input_path, tmp_folder, segmentation_name)
+    if dry_run:
+        require_pyramid_parameters(input_path, input_key, resolution, scale_factors, chunks,
+                                   max_top_level_size=max_top_level_size, verbose=True)
+        return
 
     view = mobie.utils.require_dataset_and_view(root, dataset_name, file_format,
                                                 source_type="segmentation",
@@ -84,23 +147,49 @@ def add_segmentation(
     # import the segmentation data
     data_path, image_metadata_path = mobie.utils.get_internal_paths(dataset_folder, file_format,
                                                                     segmentation_name)
+    scale_factors, chunks = require_pyramid_parameters(input_path, input_key, resolution, scale_factors, chunks,
+                                                       max_top_level_size=max_top_level_size)
+    # the per-block statistics of the default table, which are saved while the segmentation is written.
+    morphology_folder = None
+    if pipelined_table and not isinstance(add_default_table, (str, pd.DataFrame)) and add_default_table:
+        morphology_folder = os.path.join(tmp_folder, "morphology")
+        if os.path.exists(morphology_folder):
+            rmtree(morphology_folder)
+        os.makedirs(morphology_folder)
+
     if node_label_path is not None:
         if node_label_key is None:
             raise ValueError("Expect node_label_key if node_label_path is given")
-        import_segmentation_from_node_labels(input_path, input_key, data_path,
-                                             node_label_path, node_label_key,
-                                             resolution, scale_factors, chunks,
-                                             tmp_folder=tmp_folder, target=target,
-                                             max_jobs=max_jobs, unit=unit,
-                                             source_name=segmentation_name,
-                                             file_format=file_format)
+        lut = import_segmentation_from_node_labels(input_path, input_key, data_path,
+                                                   node_label_path, node_label_key,
+                                                   resolution, scale_factors, chunks,
+                                                   tmp_folder=tmp_folder, target=target,
+                                                   max_jobs=max_jobs, unit=unit,
+                                                   source_name=segmentation_name,
+                                                   file_format=file_format,
+                                                   compression=compression,
+                                                   compression_level=compression_level,
+                                                   narrow_dtype=narrow_dtype,
+                                                   skip_empty_chunks=skip_empty_chunks,
+                                                   relabel_consecutive=relabel_consecutive,
+                                                   downsampling_mode=downsampling_mode,
+                                                   morphology_folder=morphology_folder)
     else:
-        import_segmentation(input_path, input_key, data_path,
-                            resolution, scale_factors, chunks,
-                            tmp_folder=tmp_folder, target=target,
-                            max_jobs=max_jobs, unit=unit,
-                            source_name=segmentation_name,
-                            file_format=file_format)
+        lut = import_segmentation(input_path, input_key, data_path,
+                                  resolution, scale_factors, chunks,
+                                  tmp_folder=tmp_folder, target=target,
+                                  max_jobs=max_jobs, unit=unit,
+                                  source_name=segmentation_name,
+                                  file_format=file_format,
+                                  compression=compression,
+                                  compression_level=compression_level,
+                                  read_slabs=read_slabs, narrow_dtype=narrow_dtype,
+                                  skip_empty_chunks=skip_empty_chunks,
+                                  relabel_consecutive=relabel_consecutive,
+                                  downsampling_mode=downsampling_mode,
+                                  morphology_folder=morphology_folder)
+    if lut is not None:
+        _save_relabeling(dataset_folder, segmentation_name, lut)
 
     if is_2d is None:
         is_2d = mobie.metadata.read_dataset_metadata(dataset_folder).get("is2D", False)
@@ -109,7 +198,7 @@ def add_segmentation(
         table_folder = os.path.join(dataset_folder, "tables", segmentation_name)
         table_path = os.path.join(table_folder, "default.tsv")
         os.makedirs(table_folder, exist_ok=True)
-        input_table = add_default_table
+        input_table = add_default_table if lut is None else _relabel_table(add_default_table, lut)
         check_and_copy_default_table(input_table, table_path, is_2d)
 
     # compute the default segmentation table
@@ -118,9 +207,14 @@ def add_segmentation(
         table_path = os.path.join(table_folder, "default.tsv")
         os.makedirs(table_folder, exist_ok=True)
         key = mobie.utils.get_data_key(file_format, scale=0, path=data_path)
-        compute_default_table(data_path, key, table_path, resolution,
-                              tmp_folder=tmp_folder, target=target,
-                              max_jobs=max_jobs)
+        if morphology_folder is None:
+            compute_default_table(data_path, key, table_path, resolution,
+                                  tmp_folder=tmp_folder, target=target,
+                                  max_jobs=max_jobs)
+        else:
+            compute_default_table_from_blocks(morphology_folder, data_path, key, table_path, resolution,
+                                              tmp_folder=tmp_folder, target=target, max_jobs=max_jobs)
+            rmtree(morphology_folder)
     else:
         table_folder = None
 
@@ -130,17 +224,89 @@ def add_segmentation(
                                          table_folder=table_folder, view=view, is_2d=is_2d)
 
 
+def _get_local_image_data(dataset_folder, sources, name):
+    """Get the path, key and resolution of the (local) image data of a source in the dataset."""
+    if name not in sources:
+        raise ValueError(f"The source {name} is not in the dataset {dataset_folder}.")
+    image_data = next(iter(sources[name].values()))["imageData"]
+    local_formats = [file_format for file_format in image_data if not file_format.endswith(".s3")]
+    if not local_formats:
+        raise ValueError(f"The source {name} has no local image data.")
+    file_format = local_formats[0]
+    path = os.path.join(dataset_folder, image_data[file_format]["relativePath"])
+    if file_format.startswith("bdv"):
+        path = get_data_path(path, return_absolute_path=True)
+    key = mobie.utils.get_data_key(file_format, scale=0, path=path)
+    resolution = mobie.metadata.source_metadata.get_resolution({file_format: image_data[file_format]}, dataset_folder)
+    return {"path": path, "key": key, "resolution": resolution}
+
+
+def add_intensity_table(
+    root: str,
+    dataset_name: str,
+    segmentation_name: str,
+    image_names: Sequence[str],
+    table_name: str = "intensities.tsv",
+    statistics: Sequence[str] = ("mean", "median", "std"),
+    tmp_folder: Optional[str] = None,
+    target: str = "local",
+    max_jobs: int = multiprocessing.cpu_count(),
+) -> None:
+    """Add a table with the intensity statistics of image sources to a segmentation in a MoBIE dataset.
+
+    The table is computed block-wise with `mobie.tables.compute_intensity_table` and saved in the table folder
+    of the segmentation, next to its default table.
+
+    Args:
+        root: The root folder of the MoBIE project.
+        dataset_name: The name of the dataset.
+        segmentation_name: The name of the segmentation source.
+        image_names: The names of the image sources to compute the statistics for.
+        table_name: The file name of the table. The table is saved in parquet format if it has the extension
+            .parquet, otherwise in tsv format.
+        statistics: The statistics to compute, see `mobie.tables.intensity_table.INTENSITY_STATISTICS`.
+        tmp_folder: The folder for temporary files.
+        target: The computation target.
+        max_jobs: The number of jobs for parallelization.
+    """
+    dataset_folder = os.path.join(root, dataset_name)
+    sources = mobie.metadata.read_dataset_metadata(dataset_folder)["sources"]
+    if segmentation_name not in sources or "segmentation" not in sources[segmentation_name]:
+        raise ValueError(f"The segmentation {segmentation_name} is not in the dataset {dataset_name}.")
+    segmentation_metadata = sources[segmentation_name]["segmentation"]
+    if "tableData" not in segmentation_metadata:
+        raise ValueError(f"The segmentation {segmentation_name} does not have tables.")
+    if os.path.splitext(table_name)[0] == "default":
+        raise ValueError("The intensity table cannot replace the default table.")
+
+    segmentation_data = _get_local_image_data(dataset_folder, sources, segmentation_name)
+    image_sources = {name: _get_local_image_data(dataset_folder, sources, name) for name in image_names}
+    table_folder = os.path.join(dataset_folder, segmentation_metadata["tableData"]["tsv"]["relativePath"])
+    tmp_folder = f"tmp_{dataset_name}_{segmentation_name}_intensities" if tmp_folder is None else tmp_folder
+    compute_intensity_table(
+        segmentation_data["path"], segmentation_data["key"], os.path.join(table_folder, table_name),
+        segmentation_data["resolution"], image_sources,
+        tmp_folder=tmp_folder, target=target, max_jobs=max_jobs, statistics=statistics,
+    )
+
+
 def main():
     """@private
     """
     description = "Add segmentation source to MoBIE dataset."
-    parser = mobie.utils.get_base_parser(description)
+    parser = mobie.utils.get_base_parser(description, compression=True, plan_pyramid=True)
     parser.add_argument("--node_label_path", type=str, default=None,
                         help="path to the node_labels for the segmentation")
     parser.add_argument("--node_label_key", type=str, default=None,
                         help="key for the node labels for segmentation")
     parser.add_argument("--add_default_table", type=int, default=1,
                         help="whether to add the default table")
+    parser.add_argument("--relabel_consecutive", type=int, default=0,
+                        help="whether to relabel the segmentation ids consecutively")
+    parser.add_argument("--downsampling_mode", type=str, default="nearest",
+                        help="how the labels are downsampled: 'nearest', 'mode' or 'mode-nonzero'")
+    parser.add_argument("--pipelined_table", type=int, default=0,
+                        help="whether to compute the default table while the segmentation is written")
     args = parser.parse_args()
 
     resolution, scale_factors, chunks, transformation = mobie.utils.parse_spatial_args(args)
@@ -156,4 +322,10 @@ def main():
                      add_default_table=bool(args.add_default_table),
                      view=view, unit=args.unit, menu_name=args.menu_name,
                      tmp_folder=args.tmp_folder, target=args.target, max_jobs=args.max_jobs,
-                     is_default_dataset=bool(args.is_default_dataset))
+                     is_default_dataset=bool(args.is_default_dataset),
+                     compression=args.compression, compression_level=args.compression_level,
+                     max_top_level_size=args.max_top_level_size,
+                     relabel_consecutive=bool(args.relabel_consecutive),
+                     downsampling_mode=args.downsampling_mode,
+                     pipelined_table=bool(args.pipelined_table),
+                     dry_run=bool(args.dry_run))
@@ -7,6 +7,7 @@ from typing import Dict, Optional, Sequence, Union
 import mobie
 import pandas as pd
 from mobie.tables import process_spot_table, read_table
+from mobie.tables.utils import get_default_table_path
 
 
 def _get_spot_metadata_from_source(dataset_folder, source, is_2d):
@@ -44,8 +45,7 @@ def _process_spot_metadata(
 
     # if bounding_box_min or max are not passed determine it from the table
     if bounding_box_min is None or bounding_box_max is None:
-        table = read_table(os.path.join(table_folder, "default.tsv"))
-        coordinates = table[["y", "x"]] if is_2d else table[["z", "y", "x"]]
+        coordinates = read_table(get_default_table_path(table_folder), columns=["y", "x"] if is_2d else ["z", "y", "x"])
         if bounding_box_min is None:
             bounding_box_min = coordinates.min(axis=0).values.tolist()
         if bounding_box_max is None:
@@ -1,7 +1,8 @@
 """Functionality for creating tables for MoBIE.
 """
 from .default_table import compute_default_table, check_and_copy_default_table
+from .intensity_table import compute_intensity_table
 from .region_table import compute_region_table, check_region_table
 from .spot_table import process_spot_table
 from .traces_table import compute_trace_default_table
-from .utils import read_table
+from .utils import convert_tables_to_parquet, read_table
@@ -1,16 +1,25 @@
 """Functionality for creating segmentation tables.
 """
+import functools
 import os
 import warnings
 from typing import Sequence
 
 import bioimage_py as bp
+import numpy as np
 import pandas as pd
+from bioimage_py.sources import SourceSpec, as_source, from_spec
 
-from .utils import read_table
+from .utils import read_table, write_table
 from ..utils import get_run_config
 from ..validation.tables import get_columns_for_table_format
 
+# 2d segmentations up to this number of pixels (e.g. the tiles of high-throughput microscopy) are computed
+# in-memory; larger ones (e.g. whole-slide images) are computed tile-wise with the configured target.
+_MAX_IN_MEMORY_PIXELS = 4096 ** 2
+# the minimal size of the tiles for 2d segmentations along each axis.
+_MIN_TILE_SIZE = 2048
+
 
 def check_and_copy_default_table(input_path, output_path, is_2d, suppress_warnings=False):
     """@private
@@ -23,7 +32,7 @@ def check_and_copy_default_table(input_path, output_path, is_2d, suppress_warnin
     missing_columns = list(recommended_column_names - set(tab.columns))
     if missing_columns and not suppress_warnings:
         warnings.warn(f"The table at {input_path} is missing the following recommended columns: {missing_columns}")
-    tab.to_csv(output_path, sep="\t", index=False, na_rep="nan")
+    write_table(tab, output_path)
 
 
 def _output_columns(ndim):
@@ -39,15 +48,151 @@ def _output_columns(ndim):
             "n_pixels"]
 
 
-def _compute_table_df(src, resolution, run_kwargs, correct_anchors):
+def _block_morphology(seg, offset):
+    """@private
+    The per-label statistics of one block of a segmentation, which are merged by `_merge_block_morphology`.
+
+    Returns the labels and a float64 array with the size, the coordinate sums and the inclusive bounding box
+    (min and max coordinates) of each label, or None if the block only holds background (0).
+    """
+    if not seg.any():
+        return None
+    ndim = seg.ndim
+    # a single sort of the labels groups the voxels of each label for all statistics.
+    flat = seg.ravel()
+    order = np.argsort(flat)
+    sorted_labels = flat[order]
+    starts = np.flatnonzero(np.concatenate(([True], sorted_labels[1:] != sorted_labels[:-1])))
+    labels = sorted_labels[starts]
+
+    stats = np.empty((labels.shape[0], 1 + 3 * ndim), dtype="float64")
+    stats[:, 0] = np.diff(np.append(starts, flat.size))
+    for axis in range(ndim):
+        shape = [1] * ndim
+        shape[axis] = seg.shape[axis]
+        coords = np.arange(seg.shape[axis], dtype="float64").reshape(shape) + offset[axis]
+        coords = np.broadcast_to(coords, seg.shape).ravel()[order]
+        stats[:, 1 + axis] = np.add.reduceat(coords, starts)
+        stats[:, 1 + ndim + axis] = np.minimum.reduceat(coords, starts)
+        stats[:, 1 + 2 * ndim + axis] = np.maximum.reduceat(coords, starts)
+    foreground = labels != 0
+    return labels[foreground], stats[foreground]
+
+
+def save_block_morphology(folder, block_id, seg, offset):
+    """@private
+    Save the per-label statistics of a block of a segmentation, see `compute_default_table_from_blocks`.
+    """
+    result = _block_morphology(seg, offset)
+    if result is not None:
+        np.savez(os.path.join(folder, f"{block_id}.npz"), labels=result[0], stats=result[1])
+
+
+def _merge_block_morphology(folder, ndim):
+    """@private
+    Merge the per-block statistics saved in the folder into the per-label morphology,
+    with the same columns as the result of `bp.morphology.morphology`.
+    """
+    labels, stats = [], []
+    for name in sorted(os.listdir(folder)):
+        with np.load(os.path.join(folder, name)) as f:
+            labels.append(f["labels"])
+            stats.append(f["stats"])
+    if not labels:
+        return pd.DataFrame()
+    labels, stats = np.concatenate(labels), np.concatenate(stats)
+    order = np.argsort(labels)
+    labels, stats = labels[order], stats[order]
+    starts = np.flatnonzero(np.concatenate(([True], labels[1:] != labels[:-1])))
+
+    sums = np.add.reduceat(stats[:, :1 + ndim], starts, axis=0)
+    bb_min = np.minimum.reduceat(stats[:, 1 + ndim:1 + 2 * ndim], starts, axis=0)
+    bb_max = np.maximum.reduceat(stats[:, 1 + 2 * ndim:], starts, axis=0)
+    axes = ["y", "x"] if ndim == 2 else ["z", "y", "x"]
+    morph = {"label": labels[starts].astype("uint64"), "size": sums[:, 0].astype("int64")}
+    for axis, ax in enumerate(axes):
+        morph[f"com_{ax}"] = sums[:, 1 + axis] / sums[:, 0]
+        morph[f"bb_min_{ax}"] = bb_min[:, axis].astype("int64")
+        # the exclusive stop of the bounding box, as for bp.morphology.morphology.
+        morph[f"bb_max_{ax}"] = bb_max[:, axis].astype("int64") + 1
+    return pd.DataFrame(morph)
+
+
+def _anchor_block(index, ctx):
+    """@private
+    Check for the anchors in one chunk of the segmentation whether they lie inside their object."""
+    src = from_spec(ctx["src"]) if isinstance(ctx["src"], SourceSpec) else as_source(ctx["src"])
+    rows = ctx["order"][ctx["starts"][index]:ctx["starts"][index + 1]]
+    points = ctx["points"][rows]
+    begin = ctx["chunk_ids"][index] * ctx["chunks"]
+    roi = tuple(slice(int(b), min(int(b) + ch, sh)) for b, ch, sh in zip(begin, ctx["chunks"], src.shape))
+    data = np.asarray(src[roi])
+    return data[tuple((points - begin).T)] == ctx["labels"][rows]
+
+
+def _anchors_inside(src, labels, com, run_kwargs):
+    """@private
+    Check for each label whether its center of mass (rounded to the closest voxel) lies inside the object.
+
+    The anchors are grouped by the chunks of the segmentation, so that only the chunks that contain an anchor
+    are read, each of them once.
+    """
+    chunks = np.asarray(src.chunks if src.chunks is not None else [min(64, int(sh)) for sh in src.shape])
+    points = np.round(com).astype("int64")
+    chunk_ids, group = np.unique(points // chunks, axis=0, return_inverse=True)
+    group = group.ravel()
+    order = np.argsort(group, kind="stable")
+    starts = np.searchsorted(group[order], np.arange(len(chunk_ids) + 1))
+
+    src_arg = src if run_kwargs["job_type"] == "local" else src.to_spec()
+    ctx = {"src": src_arg, "points": points, "labels": labels, "order": order, "starts": starts,
+           "chunk_ids": chunk_ids, "chunks": chunks}
+    runner = bp.get_runner(run_kwargs["job_type"], run_kwargs.get("job_config"))
+    results = runner.map(functools.partial(_anchor_block, ctx=ctx), item_ids=list(range(len(chunk_ids))),
+                         num_workers=run_kwargs["num_workers"], has_return_val=True, name="anchors")
+    inside = np.zeros(len(labels), dtype=bool)
+    for index, result in enumerate(results):
+        inside[order[starts[index]:starts[index + 1]]] = result
+    return inside
+
+
+def _corrected_anchors(src, morph, axes, resolution, run_kwargs):
+    """@private
+    The anchors of the objects in physical units: the center of mass if it lies inside the object,
+    otherwise the deepest-interior voxel, which is only computed (via `bp.morphology.regionprops`)
+    for the objects whose center of mass lies outside.
+    """
+    com = morph[[f"com_{ax}" for ax in axes]].values
+    anchors = com * np.asarray(resolution)
+    outside = ~_anchors_inside(src, morph["label"].values, com, run_kwargs)
+    if outside.any():
+        # regionprops is sorted by label like morph, so the rows align positionally.
+        props = bp.morphology.regionprops(src, morph[outside], resolution=resolution, **run_kwargs)
+        anchors[outside] = props[[f"centroid_{ax}" for ax in axes]].values
+    return {ax: anchors[:, axis] for axis, ax in enumerate(axes)}
+
+
+def _tile_shape(src):
+    """@private
+    The tiles for computing the morphology of a large 2d segmentation: multiples of its chunks that are at least
+    `_MIN_TILE_SIZE` along each axis, so that the number of tiles stays manageable for small chunks.
+    """
+    if src.chunks is None:
+        return (_MIN_TILE_SIZE,) * src.ndim
+    return tuple(int(ch) * max(1, _MIN_TILE_SIZE // int(ch)) for ch in src.chunks)
+
+
+def _compute_table_df(src, resolution, run_kwargs, correct_anchors, morph=None, block_shape=None):
     """@private
     Compute the MoBIE default table for a segmentation source via bioimage-py.
 
     The per-label base statistics (size, center of mass, bounding box) come from
-    `bp.morphology.morphology`. If `correct_anchors` is set, a second (more expensive) pass via
-    `bp.morphology.regionprops` moves the anchor inside the object (the center of mass when it lies
+    `bp.morphology.morphology`, unless they are given as `morph` (see `_merge_block_morphology`).
+    If `correct_anchors` is set, the anchor is moved inside the object (the center of mass when it lies
     inside, otherwise the deepest-interior voxel); otherwise the center of mass is used directly.
-    Works for 2d and 3d.
+    Only the chunks that contain a center of mass are read for checking whether it lies inside its object,
+    and only the objects where it does not are cropped for the correction, see `_corrected_anchors`.
+    Works for 2d and 3d; `block_shape` sets the blocks of the morphology computation (by default the chunks).
     """
     ndim = src.ndim
     axes = ["y", "x"] if ndim == 2 else ["z", "y", "x"]
@@ -55,17 +200,15 @@ def _compute_table_df(src, resolution, run_kwargs, correct_anchors):
     assert len(resolution) == ndim, f"{len(resolution)}, {ndim}"
 
     # base morphology (size, com, bbox); always required.
-    morph = bp.morphology.morphology(src, **run_kwargs)
+    if morph is None:
+        morph = bp.morphology.morphology(src, block_shape=block_shape, **run_kwargs)
 
     columns = _output_columns(ndim)
     if len(morph) == 0:
         return pd.DataFrame(columns=columns)
 
     if correct_anchors:
-        # second pass to move the anchor inside the object; the centroid is already in physical
-        # units and regionprops is sorted by label like morph, so the rows align positionally.
-        props = bp.morphology.regionprops(src, morph, resolution=resolution, **run_kwargs)
-        anchors = {ax: props[f"centroid_{ax}"].values for ax in axes}
+        anchors = _corrected_anchors(src, morph, axes, resolution, run_kwargs)
     else:
         # cheaper: the center of mass (in voxels) scaled to physical units.
         anchors = {ax: morph[f"com_{ax}"].values * res for ax, res in zip(axes, resolution)}
@@ -93,32 +236,65 @@ def compute_default_table(
 ) -> None:
     """Compute the default table for a segmentation, containing the attributes required to view it in MoBIE.
 
+    The table is computed block-wise with the given target, except for small 2d segmentations
+    (up to 4096 x 4096 pixels), which are computed in-memory. Large 2d segmentations are processed in tiles.
+
     Args:
         seg_path: The input path to the segmentation.
         seg_key: The key to the segmenation.
-        table_path: The path to the output table.
+        table_path: The path to the output table. The table is saved in parquet format if it has
+            the extension .parquet, otherwise in tsv format.
         resolution: The resolution of the data in physical units.
         tmp_folder: The folder for temporary files.
         target: The computation target.
         max_jobs: The number of jobs for parallelization.
         correct_anchors: Whether to move the anchor points into the segmentation objects, so that
             concave objects do not get an anchor outside of their boundaries (via
-            `bioimage_py.morphology.regionprops`). This is an additional, relatively expensive pass,
-            so it can be deactivated; the (cheaper) center of mass is then used as the anchor.
+            `bioimage_py.morphology.regionprops`). Only the objects whose center of mass lies outside
+            of them are corrected; if deactivated, the center of mass is always used as the anchor.
     """
     src = bp.open_source(seg_path, seg_key) if seg_key else bp.open_source(seg_path)
 
-    if src.ndim == 2:
-        # 2d data is small; compute it in-memory. Parallelization over many 2d images (e.g. for
+    block_shape = None
+    if src.ndim == 2 and int(np.prod(src.shape)) <= _MAX_IN_MEMORY_PIXELS:
+        # small 2d data; compute it in-memory. Parallelization over many 2d images (e.g. for
         # high-throughput microscopy) is the caller's responsibility, not bioimage-py's block runner.
         run_kwargs = dict(job_type="local", num_workers=1)
     else:
         job_type, job_config, num_workers = get_run_config(target, max_jobs, tmp_folder)
         run_kwargs = dict(job_type=job_type, job_config=job_config, num_workers=num_workers)
+        if src.ndim == 2:
+            block_shape = _tile_shape(src)
+
+    table = _compute_table_df(src, resolution, run_kwargs, correct_anchors, block_shape=block_shape)
+
+    table_folder = os.path.split(table_path)[0]
+    os.makedirs(table_folder, exist_ok=True)
+    write_table(table, table_path)
 
-    table = _compute_table_df(src, resolution, run_kwargs, correct_anchors)
 
-    # write output to csv
+def compute_default_table_from_blocks(
+    block_folder: str,
+    seg_path: str,
+    seg_key: str,
+    table_path: str,
+    resolution: Sequence[float],
+    tmp_folder: str,
+    target: str,
+    max_jobs: int,
+    correct_anchors: bool = True,
+) -> None:
+    """@private
+    Compute the default table from the per-block statistics that were saved while the segmentation was written,
+    see `save_block_morphology`, without a full pass over the segmentation. Only the chunks needed for correcting
+    the anchors are read, see `_corrected_anchors`.
+    """
+    src = bp.open_source(seg_path, seg_key) if seg_key else bp.open_source(seg_path)
+    job_type, job_config, num_workers = get_run_config(target, max_jobs, tmp_folder)
+    run_kwargs = dict(job_type=job_type, job_config=job_config, num_workers=num_workers)
+    morph = _merge_block_morphology(block_folder, src.ndim)
+    table = _compute_table_df(src, resolution, run_kwargs, correct_anchors, morph=morph)
+
     table_folder = os.path.split(table_path)[0]
     os.makedirs(table_folder, exist_ok=True)
-    table.to_csv(table_path, sep="\t", index=False, na_rep="nan")
+    write_table(table, table_path)
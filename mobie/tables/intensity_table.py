@@ -0,0 +1,234 @@
+"""Functionality for computing per-label intensity statistics of segmentations.
+"""
+import functools
+import os
+from typing import Dict, Sequence
+
+import bioimage_py as bp
+import numpy as np
+import pandas as pd
+from bioimage_py.util import get_blocking, to_roi
+
+from .utils import write_table
+from ..utils import get_run_config
+
+INTENSITY_STATISTICS = ("mean", "median", "std", "min", "max", "sum")
+"""The intensity statistics that can be computed by `compute_intensity_table`.
+"""
+
+# the number of bins for the median of floating point images; the median of integer images is exact.
+_MEDIAN_BINS = 4096
+# the blocks for segmentations that are not chunked.
+_DEFAULT_BLOCK_SIZE = 256
+
+
+def _open(path, key):
+    return bp.open_source(path, key) if key else bp.open_source(path)
+
+
+def _image_coordinates(roi, seg_resolution, image_resolution, image_shape):
+    """@private
+    The image coordinates (per axis) of the voxels of `roi` in the segmentation, via nearest neighbor
+    sampling of the voxel centers, so that the image values are not interpolated.
+    """
+    return [
+        np.clip(np.floor((np.arange(bb.start, bb.stop) + 0.5) * sres / ires).astype("int64"), 0, sh - 1)
+        for bb, sres, ires, sh in zip(roi, seg_resolution, image_resolution, image_shape)
+    ]
+
+
+def _image_block(image, roi, seg_resolution, image_resolution):
+    """@private
+    Read the image values for the block `roi` of the segmentation, resampled to the segmentation grid.
+    """
+    if np.allclose(seg_resolution, image_resolution) and all(bb.stop <= sh for bb, sh in zip(roi, image.shape)):
+        return np.asarray(image[roi])
+    coords = _image_coordinates(roi, seg_resolution, image_resolution, image.shape)
+    image_roi = tuple(slice(int(coord[0]), int(coord[-1]) + 1) for coord in coords)
+    data = np.asarray(image[image_roi])
+    return data[np.ix_(*[coord - bb.start for coord, bb in zip(coords, image_roi)])]
+
+
+def _median_bins(values, value_range):
+    if value_range is None:
+        return values.astype("int64")
+    min_val, max_val = value_range
+    scale = _MEDIAN_BINS / max(max_val - min_val, np.finfo("float64").tiny)
+    return np.clip(((values - min_val) * scale).astype("int64"), 0, _MEDIAN_BINS - 1)
+
+
+def _block_statistics(labels, index, values, value_range, with_median):
+    """@private
+    The per-label statistics of the image values in one block, which are merged over the blocks in
+    `_merge_statistics`. The values for the median are stored as (label, value, count) histograms.
+    """
+    values = values.astype("float64")
+    order = np.argsort(index, kind="stable")
+    starts = np.searchsorted(index[order], np.arange(len(labels)))
+    stats = pd.DataFrame({
+        "label": labels,
+        "count": np.bincount(index, minlength=len(labels)),
+        "sum": np.bincount(index, weights=values, minlength=len(labels)),
+        "sum_sq": np.bincount(index, weights=values ** 2, minlength=len(labels)),
+        "min": np.minimum.reduceat(values[order], starts),
+        "max": np.maximum.reduceat(values[order], starts),
+    })
+    if not with_median:
+        return stats, None
+    bins = _median_bins(values, value_range)
+    keys, counts = np.unique(np.stack([index, bins]), axis=1, return_counts=True)
+    hist = pd.DataFrame({"label": labels[keys[0]], "value": keys[1], "count": counts})
+    return stats, hist
+
+
+def _intensity_block(block_id, seg_path, seg_key, resolution, image_sources, block_shape, value_ranges, with_median):
+    """@private
+    Compute the per-label statistics of all image sources for one block of the segmentation.
+    """
+    seg_src = _open(seg_path, seg_key)
+    roi = to_roi(get_blocking(seg_src.shape, block_shape).get_block(block_id))
+    seg = np.asarray(seg_src[roi])
+    foreground = seg != 0
+    if not foreground.any():
+        return None
+    labels, index = np.unique(seg[foreground], return_inverse=True)
+    index = index.ravel()
+
+    results = {}
+    for name, image_source in image_sources.items():
+        image = _open(image_source["path"], image_source.get("key"))
+        image_resolution = image_source["resolution"][-seg.ndim:]
+        values = _image_block(image, roi, resolution, image_resolution)[foreground]
+        results[name] = _block_statistics(labels, index, values, value_ranges[name], with_median)
+    return results
+
+
+def _median(hist, value_range):
+    """@private
+    The median per label from the merged (label, value, count) histograms, averaging the two middle values
+    for an even number of values (like numpy.median).
+    """
+    hist = hist.groupby(["label", "value"], sort=True)["count"].sum().reset_index()
+    cum_count = hist.groupby("label")["count"].cumsum().values
+    n_values = hist.groupby("label")["count"].transform("sum").values
+    lower, upper = (n_values - 1) // 2, n_values // 2
+    prev_count = cum_count - hist["count"].values
+    values = hist["value"].values.astype("float64")
+    if value_range is not None:
+        min_val, max_val = value_range
+        values = min_val + (values + 0.5) * (max_val - min_val) / _MEDIAN_BINS
+    labels = hist["label"].values
+    in_lower = (prev_count <= lower) & (lower < cum_count)
+    in_upper = (prev_count <= upper) & (upper < cum_count)
+    median = pd.Series(values[in_lower], index=labels[in_lower])
+    median += pd.Series(values[in_upper], index=labels[in_upper])
+    return median / 2
+
+
+def _merge_statistics(block_results, name, statistics, value_range):
+    """@private
+    Merge the per-block statistics of one image source and compute the requested statistics per label.
+    """
+    stats = pd.concat([result[name][0] for result in block_results])
+    stats = stats.groupby("label", sort=True).agg(
+        {"count": "sum", "sum": "sum", "sum_sq": "sum", "min": "min", "max": "max"}
+    )
+    mean = stats["sum"] / stats["count"]
+    columns = {}
+    for statistic in statistics:
+        if statistic == "mean":
+            columns[f"{name}_mean"] = mean
+        elif statistic == "median":
+            hist = pd.concat([result[name][1] for result in block_results])
+            columns[f"{name}_median"] = _median(hist, value_range)
+        elif statistic == "std":
+            columns[f"{name}_std"] = np.sqrt(np.maximum(stats["sum_sq"] / stats["count"] - mean ** 2, 0))
+        else:
+            columns[f"{name}_{statistic}"] = stats[statistic]
+    return pd.DataFrame(columns)
+
+
+def _value_range(image_source, run_kwargs):
+    """@private
+    The value range of floating point images, for the histograms of the median.
+    """
+    image = _open(image_source["path"], image_source.get("key"))
+    if np.issubdtype(image.dtype, np.integer):
+        return None
+    min_val, max_val = bp.stats.min_and_max(image, **run_kwargs)
+    return float(min_val), float(max_val)
+
+
+def compute_intensity_table(
+    seg_path: str,
+    seg_key: str,
+    table_path: str,
+    resolution: Sequence[float],
+    image_sources: Dict[str, Dict],
+    tmp_folder: str,
+    target: str,
+    max_jobs: int,
+    statistics: Sequence[str] = ("mean", "median", "std"),
+) -> None:
+    """Compute a table with the intensity statistics of image sources for the objects of a segmentation.
+
+    The statistics are computed block-wise over the segmentation, reading the matching region from each image.
+    If the resolution of an image differs from the segmentation it is resampled (with nearest neighbor sampling)
+    to the segmentation grid; the image and segmentation are expected to have the same origin.
+    The table contains the column `label_id` and `<name>_<statistic>` for each image source and statistic,
+    so that it can be added to the tables of the segmentation next to the default table.
+    The median is exact for integer images and computed from a histogram with 4096 bins for floating point images.
+
+    Args:
+        seg_path: The input path to the segmentation.
+        seg_key: The key to the segmentation.
+        table_path: The path to the output table, in tsv or parquet format (with the extension .parquet).
+        resolution: The resolution of the segmentation in physical units.
+        image_sources: The image sources, mapping their name to a dictionary with the "path", "key"
+            and "resolution" of the image data.
+        tmp_folder: The folder for temporary files.
+        target: The computation target.
+        max_jobs: The number of jobs for parallelization.
+        statistics: The statistics to compute, see `INTENSITY_STATISTICS`.
+    """
+    invalid_statistics = set(statistics) - set(INTENSITY_STATISTICS)
+    if invalid_statistics:
+        raise ValueError(f"Invalid statistics {invalid_statistics}, expected any of {INTENSITY_STATISTICS}.")
+    if not image_sources:
+        raise ValueError("At least one image source is required for the intensity table.")
+
+    seg_src = _open(seg_path, seg_key)
+    resolution = [float(res) for res in resolution][-seg_src.ndim:]
+    block_shape = tuple(seg_src.chunks) if seg_src.chunks is not None else (_DEFAULT_BLOCK_SIZE,) * seg_src.ndim
+    n_blocks = get_blocking(seg_src.shape, block_shape).number_of_blocks
+
+    job_type, job_config, num_workers = get_run_config(target, max_jobs, tmp_folder)
+    run_kwargs = dict(job_type=job_type, job_config=job_config, num_workers=num_workers)
+    with_median = "median" in statistics
+    value_ranges = {
+        name: _value_range(image_source, run_kwargs) if with_median else None
+        for name, image_source in image_sources.items()
+    }
+
+    runner = bp.get_runner(job_type, job_config)
+    block_results = runner.map(
+        functools.partial(_intensity_block, seg_path=seg_path, seg_key=seg_key, resolution=resolution,
+                          image_sources=image_sources, block_shape=block_shape, value_ranges=value_ranges,
+                          with_median=with_median),
+        item_ids=list(range(n_blocks)), num_workers=num_workers, has_return_val=True, name="intensity-table",
+    )
+    block_results = [result for result in block_results if result is not None]
+
+    if block_results:
+        table = pd.concat([
+            _merge_statistics(block_results, name, statistics, value_ranges[name]) for name in image_sources
+        ], axis=1)
+        table = table.rename_axis("label_id").reset_index()
+    else:
+        table = pd.DataFrame(columns=["label_id"] + [
+            f"{name}_{statistic}" for name in image_sources for statistic in statistics
+        ])
+
+    table_folder = os.path.split(table_path)[0]
+    os.makedirs(table_folder, exist_ok=True)
+    write_table(table, table_path)
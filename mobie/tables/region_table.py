@@ -4,7 +4,7 @@ import os
 from typing import Dict, List, Union
 
 import pandas as pd
-from .utils import read_table
+from .utils import read_table, write_table
 
 
 def compute_region_table(
@@ -16,7 +16,7 @@ def compute_region_table(
 
     Args:
         sources: The image, segmentation or spot sources in the the region display.
-        table_path: The path for saving the region table.
+        table_path: The path for saving the region table, in tsv or parquet format (with the extension .parquet).
         additional_columns: Additonal columns to add to the region table.
     """
     first_col_name = "region_id"
@@ -36,7 +36,7 @@ def compute_region_table(
 
     table = pd.DataFrame(data, columns=columns)
     os.makedirs(os.path.split(table_path)[0], exist_ok=True)
-    table.to_csv(table_path, sep="\t", index=False, na_rep="nan")
+    write_table(table, table_path)
 
 
 def check_region_table(sources: Union[List, Dict], table_path: str) -> None:
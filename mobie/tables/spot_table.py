@@ -6,7 +6,7 @@ from typing import Dict, Optional
 
 import numpy as np
 
-from .utils import read_table
+from .utils import TABLE_FORMATS, read_table, write_table
 
 
 def _process_additional_spot_table(input_table, table_out_path, spot_ids):
@@ -20,7 +20,7 @@ def _process_additional_spot_table(input_table, table_out_path, spot_ids):
         warnings.warn("Extra spot table was missing the 'spot_id' column. Same spot ids as in the main table are used.")
         input_table["spot_id"] = spot_ids
 
-    input_table.to_csv(table_out_path, sep="\t", index=False, na_rep="nan")
+    write_table(input_table, table_out_path)
 
 
 def process_spot_table(
@@ -29,6 +29,7 @@ def process_spot_table(
     is_2d: bool,
     additional_tables: Optional[Dict[str, str]] = None,
     float_precision: Optional[str] = "%.4f",
+    table_format: str = "tsv",
 ) -> None:
     """Process an input table for a spot source and save it in the associated table folder.
 
@@ -38,7 +39,12 @@ def process_spot_table(
         is_2d: Whether this spot data is two dimensional.
         additional_tables: Optional dictionary with additional tables for the spot data.
         float_precision: The string for the float precision to use when saving the coordinates in the spot table.
+            Only applies to tables in tsv format.
+        table_format: The format for saving the tables, "tsv" or "parquet". Note that the MoBIE viewer
+            reads the tables in tsv format.
     """
+    if table_format not in TABLE_FORMATS or table_format == "csv":
+        raise ValueError(f"Invalid table format {table_format}, expected 'tsv' or 'parquet'.")
     os.makedirs(table_folder, exist_ok=True)
 
     # process the input table
@@ -55,10 +61,12 @@ def process_spot_table(
     for col in coordinate_columns:
         input_table[col] = input_table[col].astype("float64")
 
-    table_out_path = os.path.join(table_folder, "default.tsv")
-    input_table.to_csv(table_out_path, sep="\t", index=False, na_rep="nan", float_format=float_precision)
+    table_out_path = os.path.join(table_folder, f"default.{table_format}")
+    write_table(input_table, table_out_path, float_format=float_precision)
 
     if additional_tables:
         for name, table in additional_tables.items():
-            table_out_path = os.path.join(table_folder, name if name.endswith(".tsv") else f"{name}.tsv")
+            table_out_path = os.path.join(
+                table_folder, name if name.endswith(f".{table_format}") else f"{name}.{table_format}"
+            )
             _process_additional_spot_table(table, table_out_path, spot_ids)
@@ -11,7 +11,7 @@ from pybdv.metadata import get_data_path
 from pybdv.util import get_key
 from tqdm import tqdm
 
-from .utils import remove_background_label_row
+from .utils import remove_background_label_row, write_table
 from ..import_data.traces import parse_traces, vals_to_coords
 
 
@@ -95,4 +95,4 @@ def compute_trace_default_table(
 
     table = pd.DataFrame(table, columns=header)
     table = remove_background_label_row(table)
-    table.to_csv(table_path, index=False, sep="\t", na_rep="nan")
+    write_table(table, table_path)
@@ -1,8 +1,18 @@
 """@private
 """
 import os
+from glob import glob
+from typing import Optional, Sequence
+
 import pandas as pd
 
+TABLE_FORMATS = ("tsv", "csv", "parquet")
+"""The supported table formats, determined by the file extension of a table.
+
+Tables in parquet format are stored column-wise, so that single columns can be read without parsing the full table.
+Reading and writing them requires pyarrow.
+"""
+
 
 def remove_background_label_row(table):
     if table["label_id"].values[0] == 0:
@@ -10,15 +20,65 @@ def remove_background_label_row(table):
     return table
 
 
+def _table_format(table_path):
+    table_format = os.path.splitext(table_path)[1].lstrip(".")
+    if table_format not in TABLE_FORMATS:
+        raise ValueError(f"Invalid table format {table_format} for {table_path}, expected one of {TABLE_FORMATS}.")
+    return table_format
+
+
 # tables can either be passed as filepath or as pandas DataFrame (in this case they are just returned)
 # this can later be extended to support tables in other data formats (ome.zarr)
-def read_table(table):
+def read_table(table, columns: Optional[Sequence[str]] = None):
+    """Read a table in tsv, csv or parquet format, optionally only the given `columns`."""
     if isinstance(table, pd.DataFrame):
-        return table
-    # support reading tables in csv and tsv format
+        return table if columns is None else table[list(columns)]
+    # support reading tables in csv, tsv and parquet format
     elif isinstance(table, str):
         if not os.path.exists(table):
             raise ValueError(f"Table {table} does not exist.")
-        return pd.read_csv(table, sep="\t" if os.path.splitext(table)[1] == ".tsv" else ",")
+        columns = None if columns is None else list(columns)
+        if os.path.splitext(table)[1] == ".parquet":
+            return pd.read_parquet(table, columns=columns)
+        table = pd.read_csv(table, sep="\t" if os.path.splitext(table)[1] == ".tsv" else ",", usecols=columns)
+        # read_csv returns the columns in the order of the file
+        return table if columns is None else table[columns]
     else:
         raise ValueError(f"Invalid table format, expected either filepath or pandas DataFrame, got {type(table)}.")
+
+
+def write_table(table, table_path, float_format=None):
+    """Write a table in tsv, csv or parquet format, depending on the extension of the `table_path`."""
+    table_format = _table_format(table_path)
+    if table_format == "parquet":
+        table.to_parquet(table_path, index=False)
+    else:
+        table.to_csv(table_path, sep="\t" if table_format == "tsv" else ",", index=False, na_rep="nan",
+                     float_format=float_format)
+
+
+def get_default_table_path(table_folder):
+    """The path to the default table in the table folder, in tsv or parquet format."""
+    parquet_path = os.path.join(table_folder, "default.parquet")
+    tsv_path = os.path.join(table_folder, "default.tsv")
+    return parquet_path if (os.path.exists(parquet_path) and not os.path.exists(tsv_path)) else tsv_path
+
+
+def convert_tables_to_parquet(table_folder: str, remove_input_tables: bool = False) -> None:
+    """Convert the tables in tsv or csv format in a table folder to parquet format.
+
+    Each table is stored next to the original with the extension .parquet. Note that the MoBIE viewer reads
+    the tables in tsv format, so the original tables should be kept for projects that are viewed with it.
+
+    Args:
+        table_folder: The table folder.
+        remove_input_tables: Whether to remove the tables in tsv or csv format after the conversion.
+    """
+    input_tables = sorted(glob(os.path.join(table_folder, "*.tsv")) + glob(os.path.join(table_folder, "*.csv")))
+    for input_table in input_tables:
+        # the pyarrow engine parses the table multi-threaded, which is much faster for large tables.
+        sep = "\t" if input_table.endswith(".tsv") else ","
+        table = pd.read_csv(input_table, sep=sep, engine="pyarrow")
+        write_table(table, f"{os.path.splitext(input_table)[0]}.parquet")
+        if remove_input_tables:
+            os.remove(input_table)
@@ -32,6 +32,7 @@ def add_traces(
     seg_infos: Dict = {},
     unit: str = "micrometer",
     description: Optional[str] = None,
+    skip_empty_chunks: bool = False,
 ) -> None:
     """Add traces to an existing MoBIE dataset.
 
@@ -55,6 +56,7 @@ def add_traces(
         seg_infos: The segmentation information that will be added to the table.
         unit: The physical unit of the coordinate system.
         description: The description for this source.
+        skip_empty_chunks: Whether to leave the chunks that do not contain any trace unwritten.
     """
     view = utils.require_dataset_and_view(root, dataset_name, file_format,
                                           source_type="segmentation",
@@ -84,7 +86,8 @@ def add_traces(
                   chunks=chunks,
                   max_jobs=max_jobs,
                   unit=unit,
-                  source_name=traces_name)
+                  source_name=traces_name,
+                  skip_empty_chunks=skip_empty_chunks)
 
     # compute the default segmentation table
     if add_default_table:
@@ -7,13 +7,13 @@ import os
 from copy import deepcopy
 from typing import Callable, Dict, List, Optional, Tuple, Union
 
-import h5py
 import numpy as np
 import elf.transformation as trafo_helper
 import mobie.metadata as metadata
 
 from bioimage_py.runner.config import RunnerConfig, SlurmConfig
 from elf.io import open_file
+from mobie.metadata.utils import metadata_lock
 from mobie.validation import validate_view_metadata
 from mobie.xml_utils import update_xml_transformation_parameter
 from pybdv.util import get_key
@@ -27,6 +27,11 @@ FILE_FORMATS = [
     "openOrganelle.s3"
 ]
 """List of supported file formats.
+
+Data that is added in the ome.zarr format can be written either in zarr v2 with NGFF v0.4 metadata ("ome.zarr"),
+or in sharded zarr v3 with NGFF v0.5 metadata ("ome.zarr.v3"), which reduces the number of files by grouping
+the chunks into shards. Both are registered as ome.zarr in the dataset metadata; the zarr version is detected
+from the data.
 """
 
 
@@ -36,7 +41,7 @@ def get_data_key(file_format: str, scale: int, path: Optional[str] = None) -> st
     Args:
         file_format: The file format of the data.
         scale: The scale level to retrieve.
-        path: The path to the data. Only required for data stored in ome.zarr format.
+        path: The path to the data. Only required for data stored in ome.zarr or ome.zarr.v3 format.
 
     Returns:
         The key / internal path to the data.
@@ -44,10 +49,12 @@ def get_data_key(file_format: str, scale: int, path: Optional[str] = None) -> st
     if file_format.startswith("bdv"):
         is_h5 = file_format == "bdv.hdf5"
         key = get_key(is_h5, timepoint=0, setup_id=0, scale=scale)
-    elif file_format == "ome.zarr":
+    elif file_format in ("ome.zarr", "ome.zarr.v3"):
         assert path is not None
         with open_file(path, "r") as f:
-            mscales = f.attrs["multiscales"][0]
+            # the NGFF v0.5 metadata of sharded ome.zarr is stored under the "ome" key.
+            attrs = f.attrs["ome"] if "ome" in f.attrs else f.attrs
+            mscales = attrs["multiscales"][0]
             key = mscales["datasets"][0]["path"]
     else:
         raise NotImplementedError(file_format)
@@ -66,7 +73,7 @@ def get_internal_paths(dataset_folder: str, file_format: str, name: str) -> Tupl
         The path to the data of the source.
         The path of the bdv xml file of the source. Only applicable if the file format is a bdv format.
     """
-    if file_format not in FILE_FORMATS:
+    if file_format not in FILE_FORMATS and file_format != "ome.zarr.v3":
         raise ValueError(f"Unknown file format {file_format}.")
 
     file_format_ = file_format.replace(".", "-")
@@ -80,7 +87,7 @@ def get_internal_paths(dataset_folder: str, file_format: str, name: str) -> Tupl
         xml_path = os.path.join(dataset_folder, "images", file_format_, f"{name}.xml")
         return data_path, xml_path
 
-    elif file_format == "ome.zarr":
+    elif file_format in ("ome.zarr", "ome.zarr.v3"):
         data_path = os.path.join(dataset_folder, "images", file_format_, f"{name}.ome.zarr")
         return data_path, data_path
 
@@ -137,8 +144,6 @@ def require_dataset_and_view(
     Returns:
         The view data.
     """
-    ds_exists = require_dataset(root, dataset_name)
-
     dataset_folder = os.path.join(root, dataset_name)
     if view is None:
         kwargs = {"contrastLimits": contrast_limits} if source_type == "image" else {}
@@ -158,24 +163,31 @@ def require_dataset_and_view(
     if view != {}:
         validate_view_metadata(view, sources=[source_name])
 
-    if not ds_exists:
-        assert file_format is not None
-        metadata.create_dataset_structure(root, dataset_name, [file_format])
-        default_view = deepcopy(view)
-        default_view.update({"uiSelectionGroup": "bookmark"})
-        metadata.create_dataset_metadata(dataset_folder, views={"default": default_view})
-        metadata.add_dataset(root, dataset_name, is_default_dataset)
+    # lock the project metadata, so that parallel calls don't create the project or dataset more than once
+    with metadata_lock(os.path.join(root, "project.json")):
+        ds_exists = require_dataset(root, dataset_name)
+        if not ds_exists:
+            assert file_format is not None
+            metadata.create_dataset_structure(root, dataset_name, [file_format])
+            default_view = deepcopy(view)
+            default_view.update({"uiSelectionGroup": "bookmark"})
+            metadata.create_dataset_metadata(dataset_folder, views={"default": default_view})
+            metadata.add_dataset(root, dataset_name, is_default_dataset)
 
     return view
 
 
-# TODO default arguments for scale-factors and chunks
-def get_base_parser(description: str, transformation_file: bool = False):
+def get_base_parser(
+    description: str, transformation_file: bool = False, compression: bool = False, plan_pyramid: bool = False
+):
     """Get the argument parser for CLI functionality for adding sources.
 
     Args:
         description: The description string for the CLI.
         transformation_file: Whether to add an argument for passing a transformation file.
+        compression: Whether to add arguments for choosing the compression of the converted data.
+        plan_pyramid: Whether the scale factors and chunks are optional and planned automatically if not given.
+            Also adds an argument for only printing the multiscale pyramid.
 
     Returns:
         The argpument parser.
@@ -199,12 +211,18 @@ def get_base_parser(description: str, transformation_file: bool = False):
     parser.add_argument("--resolution", type=str,
                         help="resolution of the data in micrometer, json-encoded",
                         required=True)
+    planned = ", planned automatically if not given" if plan_pyramid else ""
     parser.add_argument("--scale_factors", type=str,
-                        help="factors used for downscaling the data, json-encoded",
-                        required=True)
+                        help=f"factors used for downscaling the data, json-encoded{planned}",
+                        required=not plan_pyramid, default=None)
     parser.add_argument("--chunks", type=str,
-                        help="chunks of the data that is added, json-encoded",
-                        required=True)
+                        help=f"chunks of the data that is added, json-encoded{planned}",
+                        required=not plan_pyramid, default=None)
+    if plan_pyramid:
+        parser.add_argument("--max_top_level_size", type=int, default=512,
+                            help="maximal size of the lowest resolution level, if the scale factors are planned")
+        parser.add_argument("--dry_run", type=int, default=0,
+                            help="whether to only print the multiscale pyramid, without adding the data")
 
     parser.add_argument("--menu_name", type=str, default=None,
                         help="the menu name which will be used when grouping this source in the UI")
@@ -229,6 +247,15 @@ def get_base_parser(description: str, transformation_file: bool = False):
     hlp = "whether to set new dataset as default dataset. Only applies if the dataset is being created."
     parser.add_argument("--is_default_dataset", type=int, default=0, help=hlp)
 
+    if compression:
+        # imported here, because the data import depends on this module.
+        from mobie.import_data.utils import COMPRESSION_CODECS
+        parser.add_argument("--compression", type=str, default=None,
+                            choices=COMPRESSION_CODECS,
+                            help="compression codec for the data, by default the format's default compression is used")
+        parser.add_argument("--compression_level", type=int, default=None,
+                            help="compression level, by default the codec's default level is used")
+
     return parser
 
 
@@ -355,22 +382,6 @@ def transformation_to_xyz(transform: Union[List, np.ndarray], invert: bool = Fal
     return trafo
 
 
-def save_temp_input(data, tmp_folder, name):
-    """@private
-    """
-    os.makedirs(tmp_folder, exist_ok=True)
-
-    save_path = os.path.join(tmp_folder, f"{name}.h5")
-    save_key = "data"
-
-    with h5py.File(save_path, "a") as f:
-        if save_key in f:
-            return save_path, save_key
-        f.create_dataset(save_key, data=data, compression="gzip")
-
-    return save_path, save_key
-
-
 # TODO implement this once ome.zarr v0.5 is released
 def update_ome_zarr_transformation_parameter(metadata_path, parameter):
     """@private
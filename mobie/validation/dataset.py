@@ -3,12 +3,148 @@
 import argparse
 import os
 import json
+import time
+from concurrent import futures
 from glob import glob
-from typing import Callable
+from typing import Callable, Dict, Optional
 
 from tqdm import tqdm
+from .manifest import MANIFEST_NAME, _ValidationManifest, source_dependencies, view_dependencies
 from .utils import _assert_equal, _assert_true, _assert_in, validate_with_schema
 from .metadata import validate_source_metadata, validate_view_metadata
+from ..__version__ import __version__
+
+
+def _validate_item(key, validate, get_digest, manifest):
+    """Validate an item unless it is unchanged since its last successful validation (according to the manifest).
+    Returns the report entry for the item and the exception raised by the validation (or None)."""
+    t0 = time.time()
+    digest = None if (manifest is None or get_digest is None) else get_digest()
+    if digest is not None and manifest.is_valid(key, digest):
+        return {"item": key, "status": "cached", "time": time.time() - t0}, None
+    try:
+        validate()
+    except Exception as e:
+        return {"item": key, "status": "invalid", "time": time.time() - t0, "error": str(e)}, e
+    if digest is not None:
+        manifest.record(key, digest)
+    return {"item": key, "status": "valid", "time": time.time() - t0}, None
+
+
+def _validate_items(items, manifest, max_jobs, desc):
+    """Validate the items, given as (key, validate, get_digest), in parallel with a thread pool.
+    Returns the report entries and exceptions in the order of the items."""
+    if max_jobs <= 1:
+        results = [_validate_item(*item, manifest) for item in tqdm(items, desc=desc)]
+        return [res[0] for res in results], [res[1] for res in results]
+    with futures.ThreadPoolExecutor(max_jobs) as tp:
+        tasks = [tp.submit(_validate_item, *item, manifest) for item in items]
+        for _ in tqdm(futures.as_completed(tasks), total=len(tasks), desc=desc):
+            pass
+        results = [task.result() for task in tasks]
+    return [res[0] for res in results], [res[1] for res in results]
+
+
+def _validate_dataset(
+    dataset_folder, require_local_data, require_remote_data, assert_true, assert_in, assert_equal,
+    suppress_warnings, max_jobs, manifest,
+):
+    """Validate a dataset and return the report entries and the exceptions of all items that were checked."""
+    ds_name = os.path.split(os.path.abspath(dataset_folder))[1]
+    ds_metadata_path = os.path.join(dataset_folder, "dataset.json")
+
+    # check the dataset metadata; the sources and views can only be checked if it is valid
+    def validate_metadata():
+        assert_true(os.path.exists(ds_metadata_path), f"Cannot find file {ds_metadata_path}")
+        with open(ds_metadata_path) as f:
+            dataset_metadata = json.load(f)
+        # static validation
+        validate_with_schema(dataset_metadata, "dataset")
+
+    metadata_item = (f"{ds_name}/dataset.json", validate_metadata, lambda: manifest.digest(None, [ds_metadata_path]))
+    report, errors = _validate_items([metadata_item], manifest, 1, f"Check metadata for dataset {ds_name}")
+    if errors[0] is not None:
+        return report, errors
+    with open(ds_metadata_path) as f:
+        dataset_metadata = json.load(f)
+
+    sources = dataset_metadata["sources"]
+    is_2d = dataset_metadata.get("is2D", False)
+    settings = {"is_2d": is_2d, "suppress_warnings": suppress_warnings}
+
+    # the sources with remote data can't be cached if the remote data is checked;
+    # bdv.n5.s3 data is always checked remotely (see `validate_source_metadata`).
+    def source_digest(name, metadata):
+        image_data = next(iter(metadata.values())).get("imageData", {})
+        if "bdv.n5.s3" in image_data or (
+            require_remote_data and any(format_.endswith(".s3") for format_ in image_data)
+        ):
+            return None
+        return lambda: manifest.digest([metadata, settings], *source_dependencies(dataset_folder, metadata))
+
+    source_items = [(
+        f"{ds_name}/sources/{name}",
+        lambda name=name, metadata=metadata: validate_source_metadata(
+            name, metadata,
+            dataset_folder=dataset_folder, is_2d=is_2d,
+            require_local_data=require_local_data,
+            require_remote_data=require_remote_data,
+            assert_true=assert_true,
+            assert_equal=assert_equal,
+            assert_in=assert_in,
+            suppress_warnings=suppress_warnings,
+        ),
+        source_digest(name, metadata),
+    ) for name, metadata in sources.items()]
+
+    # collect the views and the (potential) additional view files
+    views = [(f"{ds_name}/views/{name}", view) for name, view in dataset_metadata["views"].items()]
+    views_folder = os.path.join(dataset_folder, "misc", "views")
+    for view_file in sorted(glob(os.path.join(views_folder, "*.json"))):
+        with open(view_file, "r") as f:
+            file_views = json.load(f)["views"]
+        file_name = os.path.split(view_file)[1]
+        views.extend((f"{ds_name}/view_files/{file_name}/{name}", view) for name, view in file_views.items())
+
+    def view_digest(view):
+        referenced_sources, files = view_dependencies(view, sources, dataset_folder)
+        return manifest.digest([view, referenced_sources], files)
+
+    all_sources = list(sources.keys())
+    view_items = [(
+        key,
+        lambda view=view: validate_view_metadata(
+            view, sources=all_sources, dataset_folder=dataset_folder, assert_true=assert_true,
+            dataset_metadata=dataset_metadata
+        ),
+        lambda view=view: view_digest(view),
+    ) for key, view in views]
+
+    source_report, source_errors = _validate_items(
+        source_items, manifest, max_jobs, f"Check sources for dataset {ds_name}"
+    )
+    view_report, view_errors = _validate_items(view_items, manifest, max_jobs, f"Check views for dataset {ds_name}")
+    return report + source_report + view_report, errors + source_errors + view_errors
+
+
+def _finish_validation(report, errors, manifest, t0):
+    """Save the manifest and raise the first validation error, if any."""
+    manifest.save()
+    for error in errors:
+        if error is not None:
+            raise error
+    return {"time": time.time() - t0, "items": report}
+
+
+def _manifest(manifest_path, require_local_data, require_remote_data, full):
+    """@private
+    """
+    settings = {
+        "mobie_version": __version__,
+        "require_local_data": require_local_data,
+        "require_remote_data": require_remote_data,
+    }
+    return _ValidationManifest(manifest_path, settings, full)
 
 
 def validate_dataset(
@@ -19,12 +155,20 @@ def validate_dataset(
     assert_in: Callable = _assert_in,
     assert_equal: Callable = _assert_equal,
     suppress_warnings: bool = False,
-) -> None:
+    max_jobs: int = 1,
+    manifest_path: Optional[str] = None,
+    full: bool = False,
+) -> Dict:
     """Validate that a MoBIE dataset adheres to the specification.
 
     Raises a ValueError if the dataset does not adhere to the spec.
     The type of error that is thrown can be modified by over-writing
     the assert_true, assert_in, and assert_equal arguments.
+    All sources and views are checked before the (first) error is raised.
+
+    If a `manifest_path` is given, the items that passed the validation are recorded in the manifest,
+    together with the content hashes of their metadata and tables. When validating again, only the items
+    that changed since then are checked, unless `full` is set.
 
     Args:
         dataset_folder: The folder to the dataset.
@@ -36,59 +180,42 @@ def validate_dataset(
         assert_in: Function to over-write the default assert_in check.
         assert_equal: Function to over-write the default assert_equal check.
         suppress_warnings: Whether to suppress valdiation warnings.
+        max_jobs: The number of threads for validating the sources and views in parallel.
+        manifest_path: The path to the manifest for incremental validation.
+        full: Whether to validate all items, even if they are unchanged according to the manifest.
+
+    Returns:
+        The validation report, containing the total time and the status ("valid", "cached" or "invalid")
+            and time of each validated item.
     """
+    t0 = time.time()
+    manifest = _manifest(manifest_path, require_local_data, require_remote_data, full)
+    report, errors = _validate_dataset(
+        dataset_folder, require_local_data, require_remote_data, assert_true, assert_in, assert_equal,
+        suppress_warnings, max_jobs, manifest,
+    )
+    return _finish_validation(report, errors, manifest, t0)
 
-    # check the source metadata
-    ds_metadata_path = os.path.join(dataset_folder, "dataset.json")
-    assert_true(os.path.exists(ds_metadata_path), f"Cannot find file {ds_metadata_path}")
-    with open(ds_metadata_path) as f:
-        dataset_metadata = json.load(f)
 
-    # static validation
-    validate_with_schema(dataset_metadata, "dataset")
+def _add_incremental_args(parser):
+    """@private
+    """
+    parser.add_argument("--max_jobs", "-j", type=int, default=os.cpu_count(),
+                        help="the number of threads for validating in parallel")
+    parser.add_argument("--manifest", type=str, default=None,
+                        help=f"the manifest for incremental validation, by default {MANIFEST_NAME} in the input folder")
+    parser.add_argument("--full", action="store_true", help="validate all items, ignoring the manifest")
+    parser.add_argument("--report", type=str, default=None,
+                        help="write the validation report with the per-item status and timing to this json file")
 
-    # check the sources
-    ds_name = os.path.split(dataset_folder)[1]
-    is_2d = dataset_metadata.get("is2D", False)
-    for name, metadata in tqdm(
-        dataset_metadata["sources"].items(),
-        total=len(dataset_metadata["sources"]),
-        desc=f"Check sources for dataset {ds_name}"
-    ):
-        validate_source_metadata(
-            name, metadata,
-            dataset_folder=dataset_folder, is_2d=is_2d,
-            require_local_data=require_local_data,
-            require_remote_data=require_remote_data,
-            assert_true=assert_true,
-            assert_equal=assert_equal,
-            assert_in=assert_in,
-            suppress_warnings=suppress_warnings,
-        )
-
-    # check the views
-    all_sources = list(dataset_metadata["sources"].keys())
-    for name, view in tqdm(
-        dataset_metadata["views"].items(),
-        total=len(dataset_metadata["views"]),
-        desc=f"Check views for dataset {ds_name}"
-    ):
-        validate_view_metadata(
-            view, sources=all_sources, dataset_folder=dataset_folder, assert_true=assert_true,
-            dataset_metadata=dataset_metadata
-        )
 
-    # check the (potential) additional view files
-    views_folder = os.path.join(dataset_folder, "misc", "views")
-    view_files = glob(os.path.join(views_folder, "*.json"))
-    for view_file in tqdm(view_files, desc=f"Check view files for dataset {ds_name}"):
-        with open(view_file, "r") as f:
-            views = json.load(f)["views"]
-        for name, view in views.items():
-            validate_view_metadata(
-                view, sources=all_sources, dataset_folder=dataset_folder, assert_true=assert_true,
-                dataset_metadata=dataset_metadata
-            )
+def _write_report(report, report_path):
+    """@private
+    """
+    if report_path is None:
+        return
+    with open(report_path, "w") as f:
+        json.dump(report, f, indent=2)
 
 
 def main():
@@ -98,7 +225,12 @@ def main():
     parser.add_argument("--input", "-i", type=str, required=True, help="the dataset location")
     parser.add_argument("--require_local_data", "-r", type=int, default=1, help="check that local data exists")
     parser.add_argument("--require_remote_data", "-d", type=int, default=0, help="check that remote data exists")
+    _add_incremental_args(parser)
     args = parser.parse_args()
-    validate_dataset(
-        args.input, require_local_data=bool(args.require_local_data), require_remote_data=bool(args.require_remote_data)
+    manifest_path = os.path.join(args.input, MANIFEST_NAME) if args.manifest is None else args.manifest
+    report = validate_dataset(
+        args.input, require_local_data=bool(args.require_local_data),
+        require_remote_data=bool(args.require_remote_data),
+        max_jobs=args.max_jobs, manifest_path=manifest_path, full=args.full,
     )
+    _write_report(report, args.report)
@@ -0,0 +1,160 @@
+"""Manifest of validated items for the incremental validation of MoBIE projects.
+"""
+import hashlib
+import json
+import os
+import threading
+from glob import glob
+
+from pybdv.metadata import get_data_path
+
+MANIFEST_NAME = ".mobie-validation.json"
+"""@private
+"""
+
+_MANIFEST_VERSION = 2
+
+
+def _json_digest(obj):
+    return hashlib.sha256(json.dumps(obj, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class _ValidationManifest:
+    """Manifest of the items (sources, views, view files) that passed the validation, stored as json.
+
+    Each item is recorded with a digest of its metadata and the content hashes of the files it depends on
+    (table files, bdv xml and ome.zarr metadata); the image data itself is not hashed, only whether the data
+    of the bdv formats exists is recorded. An item is only
+    validated again if its digest changed. The file hashes are cached along with the size and modification
+    time of the file, so that unchanged files are not read again. The manifest is only valid for the
+    validation settings it was created for.
+    """
+
+    def __init__(self, path, settings, full=False):
+        self.path = path
+        self.settings = {"version": _MANIFEST_VERSION, **settings}
+        self.items, self.files = {}, {}
+        self._lock = threading.Lock()
+        if path is None or full or not os.path.exists(path):
+            return
+        with open(path) as f:
+            manifest = json.load(f)
+        if manifest.get("settings") == json.loads(json.dumps(self.settings)):
+            self.items, self.files = manifest["items"], manifest["files"]
+
+    def file_digest(self, path):
+        """The content hash of a file, or None if it does not exist."""
+        path = os.path.abspath(path)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        with self._lock:
+            cached = self.files.get(path)
+        if cached is not None and cached[:2] == [stat.st_size, stat.st_mtime_ns]:
+            return cached[2]
+        file_hash = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(2 ** 20), b""):
+                file_hash.update(chunk)
+        digest = file_hash.hexdigest()
+        with self._lock:
+            self.files[path] = [stat.st_size, stat.st_mtime_ns, digest]
+        return digest
+
+    def digest(self, metadata, files, data_paths=()):
+        """The digest of an item, from its metadata, the files it depends on and whether its data exists."""
+        return _json_digest({
+            "metadata": metadata,
+            "files": {path: self.file_digest(path) for path in files},
+            "data": {path: os.path.exists(path) for path in data_paths},
+        })
+
+    def is_valid(self, key, digest):
+        with self._lock:
+            return self.items.get(key) == digest
+
+    def record(self, key, digest):
+        with self._lock:
+            self.items[key] = digest
+
+    def save(self):
+        if self.path is None:
+            return
+        folder = os.path.split(os.path.abspath(self.path))[0]
+        os.makedirs(folder, exist_ok=True)
+        # write to a temporary file first, so that an interrupted write doesn't corrupt the manifest.
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"settings": self.settings, "items": self.items, "files": self.files}, f)
+        os.replace(tmp_path, self.path)
+
+
+def _table_files(dataset_folder, source_metadata):
+    if "tableData" not in source_metadata:
+        return []
+    table_folder = os.path.join(dataset_folder, source_metadata["tableData"]["tsv"]["relativePath"])
+    return sorted(glob(os.path.join(table_folder, "*")))
+
+
+def _ome_zarr_files(path, attrs_name, array_name):
+    """The metadata files of an ome.zarr: the attributes and the array metadata of its multiscale levels."""
+    attrs_path = os.path.join(path, attrs_name)
+    try:
+        with open(attrs_path) as f:
+            attrs = json.load(f)
+        # the ngff metadata is stored under attributes/ome in zarr v3.
+        if attrs_name == "zarr.json":
+            attrs = attrs["attributes"]["ome"]
+        levels = [ds["path"] for multiscale in attrs["multiscales"] for ds in multiscale["datasets"]]
+    except (OSError, ValueError, KeyError, TypeError):
+        levels = []
+    return [attrs_path] + [os.path.join(path, level, array_name) for level in levels]
+
+
+def source_dependencies(dataset_folder, metadata):
+    """@private
+    The files that the validation of a source depends on and the paths of its bdv data,
+    for which only the existence is checked.
+    """
+    source_metadata = next(iter(metadata.values()))
+    files, data_paths = [], []
+    for format_, storage in source_metadata.get("imageData", {}).items():
+        if "relativePath" not in storage:
+            continue
+        path = os.path.join(dataset_folder, storage["relativePath"])
+        if format_.startswith("bdv"):
+            files.append(path)
+            if format_ in ("bdv.n5", "bdv.hdf5") and os.path.exists(path):
+                try:
+                    data_paths.append(get_data_path(path, return_absolute_path=True))
+                except Exception:
+                    # the validation reports the invalid xml.
+                    pass
+        elif format_ == "ome.zarr" and os.path.exists(os.path.join(path, "zarr.json")):
+            files.extend(_ome_zarr_files(path, "zarr.json", "zarr.json"))
+        elif format_ == "ome.zarr":
+            files.extend(_ome_zarr_files(path, ".zattrs", ".zarray"))
+    return files + _table_files(dataset_folder, source_metadata), data_paths
+
+
+def _strings(obj):
+    if isinstance(obj, str):
+        yield obj
+    elif isinstance(obj, dict):
+        for key, value in obj.items():
+            yield key
+            yield from _strings(value)
+    elif isinstance(obj, list):
+        for value in obj:
+            yield from _strings(value)
+
+
+def view_dependencies(view, sources, dataset_folder):
+    """@private
+    The metadata of the sources referenced in a view and the files of their tables,
+    which the validation of the view depends on.
+    """
+    referenced = sorted(set(name for name in _strings(view) if name in sources))
+    files = [path for name in referenced for path in _table_files(dataset_folder, next(iter(sources[name].values())))]
+    return {name: sources[name] for name in referenced}, files
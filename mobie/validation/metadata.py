@@ -27,7 +27,9 @@ def _check_ome_zarr_s3(address, name, assert_true, assert_equal, channel):
     try:
         zattrs = load_json_from_s3(os.path.join(address, ".zattrs"))
     except Exception:
-        assert_true(False, f"Can't find ome.zarr..s3file at {address}")
+        # sharded ome.zarr (zarr v3, NGFF v0.5) stores the attributes in zarr.json instead.
+        _check_ome_zarr_v3_s3(address, assert_true)
+        return
 
     validate_with_schema(zattrs, "NGFF")
 
@@ -38,6 +40,22 @@ def _check_ome_zarr_s3(address, name, assert_true, assert_equal, channel):
     #      assert_equal(name, ome_name, f"Source name and name in ngff metadata don't match: {name} != {ome_name}")
 
 
+def _check_ome_zarr_v3_attrs(attrs, address, assert_true):
+    # the NGFF schema is only available for v0.4, so we only check the v0.5 metadata structure here.
+    ome_attrs = attrs.get("attributes", {}).get("ome", {})
+    assert_true(ome_attrs.get("version") == "0.5", f"Expect NGFF v0.5 metadata at {address}")
+    assert_true("multiscales" in ome_attrs, f"Could not find the NGFF multiscales metadata at {address}")
+
+
+def _check_ome_zarr_v3_s3(address, assert_true):
+    attrs_address = os.path.join(address, "zarr.json")
+    try:
+        attrs = load_json_from_s3(attrs_address)
+    except Exception:
+        assert_true(False, f"Can't find ome.zarr.s3 file at {address}")
+    _check_ome_zarr_v3_attrs(attrs, attrs_address, assert_true)
+
+
 def _check_data(storage, format_, name, dataset_folder,
                 require_local_data, require_remote_data,
                 assert_true, assert_equal):
@@ -69,6 +87,14 @@ def _check_data(storage, format_, name, dataset_folder,
         path = os.path.join(dataset_folder, storage["relativePath"])
         assert_true(os.path.exists(path), f"Could not find data for {name} at {path}")
 
+        # sharded ome.zarr (zarr v3, NGFF v0.5) stores the attributes in zarr.json instead.
+        if os.path.exists(os.path.join(path, "zarr.json")):
+            attr_path = os.path.join(path, "zarr.json")
+            with open(attr_path) as f:
+                attrs = json.load(f)
+            _check_ome_zarr_v3_attrs(attrs, attr_path, assert_true)
+            return
+
         attr_path = os.path.join(path, ".zattrs")
         assert_true(os.path.exists(attr_path), f"Could not find metadata for {name} at {path}")
 
@@ -103,6 +129,7 @@ def validate_source_metadata(
     assert_equal: Callable = _assert_equal,
     assert_in: Callable = _assert_in,
     suppress_warnings: bool = False,
+    trusted: bool = False,
 ) -> None:
     """Validate that source metadata adheres to the specification.
 
@@ -123,13 +150,16 @@ def validate_source_metadata(
         assert_in: Function to over-write the default assert_in check.
         assert_equal: Function to over-write the default assert_equal check.
         suppress_warnings: Whether to suppress valdiation warnings.
+        trusted: Whether the metadata was created by `mobie.metadata.get_image_metadata` or the related functions,
+            in which case it is not validated against the json schema.
     """
     # static validation with json schema
-    try:
-        validate_with_schema(metadata, "source")
-    except ValidationError as e:
-        msg = f"{e}"
-        assert_true(False, msg)
+    if not trusted:
+        try:
+            validate_with_schema(metadata, "source")
+        except ValidationError as e:
+            msg = f"{e}"
+            assert_true(False, msg)
 
     source_type, source_metadata = next(iter(metadata.items()))
     # dynamic validation of paths / remote addresses
@@ -304,6 +334,7 @@ def validate_view_metadata(
     dataset_folder: Optional[str] = None,
     assert_true: Callable = _assert_true,
     dataset_metadata: Optional[Dict] = None,
+    trusted: bool = False,
 ) -> None:
     """Validate that view metadata adheres to the specification.
 
@@ -319,13 +350,16 @@ def validate_view_metadata(
         assert_true: Function to over-write the default assert_true check.
         dataset_metadata: The dataset metadata. This argument is optional,
             it is required to check if tables specified in the view are valid.
+        trusted: Whether the view was created by `mobie.metadata.get_view` or the related functions,
+            in which case it is not validated against the json schema.
     """
     # static validation with json schema
-    try:
-        validate_with_schema(view, "view")
-    except ValidationError as e:
-        msg = f"{e}"
-        assert_true(False, msg)
+    if not trusted:
+        try:
+            validate_with_schema(view, "view")
+        except ValidationError as e:
+            msg = f"{e}"
+            assert_true(False, msg)
 
     displays = view.get("sourceDisplays")
 
@@ -3,9 +3,11 @@
 import argparse
 import json
 import os
-from typing import Callable
+import time
+from typing import Callable, Dict, Optional
 
-from .dataset import validate_dataset
+from .dataset import _add_incremental_args, _finish_validation, _manifest, _validate_dataset, _write_report
+from .manifest import MANIFEST_NAME
 from .utils import _assert_true, _assert_in, _assert_equal, validate_with_schema
 from ..__version__ import SPEC_VERSION
 
@@ -38,12 +40,20 @@ def validate_project(
     assert_true: Callable = _assert_true,
     assert_in: Callable = _assert_in,
     assert_equal: Callable = _assert_equal,
-) -> None:
+    max_jobs: int = 1,
+    manifest_path: Optional[str] = None,
+    full: bool = False,
+) -> Dict:
     """Validate that a MoBIE project adheres to the specification.
 
     Raises a ValueError if the project does not adhere to the spec.
     The type of error that is thrown can be modified by over-writing
     the assert_true, assert_in, and assert_equal arguments.
+    All datasets are checked before the (first) error is raised.
+
+    If a `manifest_path` is given, the sources and views that passed the validation are recorded in the manifest,
+    together with the content hashes of their metadata and tables. When validating again, only the items
+    that changed since then are checked, unless `full` is set.
 
     Args:
         root: The root directory of the MoBIE project.
@@ -54,7 +64,15 @@ def validate_project(
         assert_true: Function to over-write the default assert_true check.
         assert_in: Function to over-write the default assert_in check.
         assert_equal: Function to over-write the default assert_equal check.
+        max_jobs: The number of threads for validating the sources and views in parallel.
+        manifest_path: The path to the manifest for incremental validation.
+        full: Whether to validate all items, even if they are unchanged according to the manifest.
+
+    Returns:
+        The validation report, containing the total time and the status ("valid", "cached" or "invalid")
+            and time of each validated item.
     """
+    t0 = time.time()
     metadata_path = os.path.join(root, "project.json")
     msg = f"Cannot find {metadata_path}"
     assert_true(os.path.exists(metadata_path), msg)
@@ -78,19 +96,28 @@ def validate_project(
     msg = f"Cannot find default dataset {default_dataset} in {datasets}"
     assert_in(default_dataset, datasets, msg)
 
+    manifest = _manifest(manifest_path, require_local_data, require_remote_data, full)
+    report, errors = [], []
     for dataset in datasets:
         dataset_folder = os.path.join(root, dataset)
         msg = f"Cannot find a dataset {dataset} at {dataset_folder}"
         assert_true(os.path.isdir(dataset_folder), msg)
-        validate_dataset(
+        dataset_report, dataset_errors = _validate_dataset(
             dataset_folder,
             require_local_data=require_local_data,
             require_remote_data=require_remote_data,
             assert_true=assert_true,
             assert_in=assert_in,
             assert_equal=assert_equal,
+            suppress_warnings=False,
+            max_jobs=max_jobs,
+            manifest=manifest,
         )
+        report.extend(dataset_report)
+        errors.extend(dataset_errors)
+    report = _finish_validation(report, errors, manifest, t0)
     print("The project at", root, "is a valid MoBIE project.")
+    return report
 
 
 def main():
@@ -100,7 +127,12 @@ def main():
     parser.add_argument("--input", "-i", type=str, required=True, help="the project location")
     parser.add_argument("--require_local_data", "-r", type=int, default=1, help="check that local data exists")
     parser.add_argument("--require_remote_data", "-d", type=int, default=0, help="check that remote data exists")
+    _add_incremental_args(parser)
     args = parser.parse_args()
-    validate_project(
-        args.input, require_local_data=bool(args.require_local_data), require_remote_data=bool(args.require_remote_data)
+    manifest_path = os.path.join(args.input, MANIFEST_NAME) if args.manifest is None else args.manifest
+    report = validate_project(
+        args.input, require_local_data=bool(args.require_local_data),
+        require_remote_data=bool(args.require_remote_data),
+        max_jobs=args.max_jobs, manifest_path=manifest_path, full=args.full,
     )
+    _write_report(report, args.report)
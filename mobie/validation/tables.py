@@ -8,67 +8,115 @@ from typing import Callable, Dict, Optional, Sequence
 import pandas as pd
 from .utils import _assert_true
 
+try:
+    import pyarrow.parquet as pq
+except ImportError:
+    pq = None
 
-# need to duplicate this function from ..tables.utils to avoid circular imports
-def _read_table(table):
+
+# need to duplicate these functions from ..tables.utils to avoid circular imports
+def _read_table(table, columns=None):
     if isinstance(table, pd.DataFrame):
-        return table
-    # support reading tables in csv and tsv format
+        return table if columns is None else table[list(columns)]
+    # support reading tables in csv, tsv and parquet format
     elif isinstance(table, str):
         if not os.path.exists(table):
             raise ValueError(f"Table {table} does not exist.")
-        return pd.read_csv(table, sep="\t" if os.path.splitext(table)[1] == ".tsv" else ",")
+        columns = None if columns is None else list(columns)
+        if os.path.splitext(table)[1] == ".parquet":
+            return pd.read_parquet(table, columns=columns)
+        table = pd.read_csv(table, sep="\t" if os.path.splitext(table)[1] == ".tsv" else ",", usecols=columns)
+        # read_csv returns the columns in the order of the file
+        return table if columns is None else table[columns]
     else:
         raise ValueError(f"Invalid table format, expected either filepath or pandas DataFrame, got {type(table)}.")
 
 
+def _read_table_columns(table):
+    """Read only the column names of a table, from the header of tsv / csv tables or the schema of parquet tables."""
+    if isinstance(table, pd.DataFrame):
+        return list(table.columns)
+    if not os.path.exists(table):
+        raise ValueError(f"Table {table} does not exist.")
+    if os.path.splitext(table)[1] == ".parquet":
+        if pq is None:
+            raise ImportError("Reading tables in parquet format requires pyarrow.")
+        # pandas stores the index in the parquet schema as "__index_level_<i>__", if it was saved.
+        return [name for name in pq.read_schema(table).names if not name.startswith("__index_level_")]
+    return list(pd.read_csv(table, sep="\t" if os.path.splitext(table)[1] == ".tsv" else ",", nrows=0).columns)
+
+
+def _read_merge_ids(table, columns):
+    """Read the unique ids of the merge `columns` of a table, without loading the other columns."""
+    if not columns:
+        return {}
+    if isinstance(table, str) and os.path.splitext(table)[1] in (".tsv", ".csv") and pq is not None:
+        # the pyarrow engine only converts the selected columns and parses multi-threaded,
+        # which is much faster than the default engine for tables with many columns.
+        table = pd.read_csv(table, sep="\t" if table.endswith(".tsv") else ",", usecols=columns, engine="pyarrow")
+    else:
+        table = _read_table(table, columns=columns)
+    # pd.unique (hash-based) is much faster than np.unique for large id columns.
+    # The ids are not sorted, because object columns (e.g. string ids with missing values) may mix types.
+    return {col: pd.unique(table[col].values) for col in columns}
+
+
+def _get_default_table_path(table_folder):
+    parquet_path = os.path.join(table_folder, "default.parquet")
+    tsv_path = os.path.join(table_folder, "default.tsv")
+    return parquet_path if (os.path.exists(parquet_path) and not os.path.exists(tsv_path)) else tsv_path
+
+
 def _check_tables(table_folder, required_columns, merge_columns, assert_true,
                   recommended_columns=[], suppress_warnings=False):
     # check that table folder and default table exist
     assert_true(os.path.isdir(table_folder), f"Table root folder {table_folder} does not exist.")
-    default_table_path = os.path.join(table_folder, "default.tsv")
+    default_table_path = _get_default_table_path(table_folder)
     assert_true(os.path.exists(default_table_path), f"Default table {default_table_path} does not exist.")
 
-    # check that the default table contains all the expected columns
-    default_table = _read_table(default_table_path)
-    assert_true(default_table.shape[1] > 1, f"Default table {default_table_path} contains only a single column")
+    # check that the default table contains all the expected columns, reading only its header
+    default_columns = _read_table_columns(default_table_path)
+    assert_true(len(default_columns) > 1, f"Default table {default_table_path} contains only a single column")
     for col in required_columns:
         assert_true(
-            col in default_table.columns,
+            col in default_columns,
             f"Required column {col} is not present in the default table @ {default_table_path}."
         )
     for col in recommended_columns:
-        if col not in default_table.columns and not suppress_warnings:
+        if col not in default_columns and not suppress_warnings:
             warnings.warn(f"Recommended column {col} is not present in the default table @ {default_table_path}.")
 
-    # get all expected merge columns and their values
-    expected_merge_columns = {}
-    for col in merge_columns:
-        if col in default_table.columns:
-            expected_merge_columns[col] = set(default_table[col].values)
+    # get all expected merge columns and their unique values
+    expected_merge_columns = _read_merge_ids(
+        default_table_path, [col for col in merge_columns if col in default_columns]
+    )
     # we always have at least one of the merge columns, so this is a normal assert
     # because it can only be triggered by an internal error
     assert expected_merge_columns, merge_columns
 
-    # check the additional tables
+    # check the additional tables (the same table may be present in tsv and in parquet format)
     additional_tables = list(
         set(
-            glob(os.path.join(table_folder, "*.tsv")) + glob(os.path.join(table_folder, "*.csv"))
-        ) - {default_table_path}
+            glob(os.path.join(table_folder, "*.tsv")) + glob(os.path.join(table_folder, "*.csv")) +
+            glob(os.path.join(table_folder, "*.parquet"))
+        ) - {default_table_path, os.path.join(table_folder, "default.tsv"),
+             os.path.join(table_folder, "default.parquet")}
     )
     for table_path in additional_tables:
-        table = _read_table(table_path)
-        assert_true(table.shape[1] > 1, f"Table {table_path} contains only a single column")
+        columns = _read_table_columns(table_path)
+        assert_true(len(columns) > 1, f"Table {table_path} contains only a single column")
 
         # check that the merge columns are present
         # and that we don't have any ids in them that are not in the default table
-        for col, ref_values in expected_merge_columns.items():
+        for col in expected_merge_columns:
             assert_true(
-                col in table, f"Expected column {col} is not present in additional table @ {table_path}"
+                col in columns, f"Expected column {col} is not present in additional table @ {table_path}"
             )
-            this_values = set(table[col].values)
+        merge_ids = _read_merge_ids(table_path, list(expected_merge_columns))
+        for col, ref_values in expected_merge_columns.items():
             assert_true(
-                len(this_values - ref_values) == 0, f"Unexpected ids in column {col} in additional table @ {table_path}"
+                pd.Series(merge_ids[col]).isin(ref_values).all(),
+                f"Unexpected ids in column {col} in additional table @ {table_path}"
             )
 
 
@@ -113,9 +161,9 @@ def get_columns_for_table_format(tab, is_2d):
 
 
 def _parse_segmentation_table(table_folder, is_2d, assert_true):
-    default_table_path = os.path.join(table_folder, "default.tsv")
+    default_table_path = _get_default_table_path(table_folder)
     assert_true(os.path.exists(default_table_path), f"Default table {default_table_path} does not exist.")
-    tab = _read_table(default_table_path)
+    tab = pd.DataFrame(columns=_read_table_columns(default_table_path))
     required_columns, recommended_columns, merge_columns = get_columns_for_table_format(tab, is_2d)
     return list(required_columns), list(recommended_columns), list(merge_columns)
 
@@ -175,14 +223,14 @@ def check_tables_in_view(
                 f"Could not find additional table {table} in {dataset_folder}"
             )
 
-    # read all the tables in the view
-    tables = [_read_table(os.path.join(table_folder, "default.tsv"))]
+    # read the column names of all the tables in the view
+    tables = [_read_table_columns(_get_default_table_path(table_folder))]
     if additional_tables is not None:
         for table in additional_tables:
-            tables.append(_read_table(os.path.join(table_folder, table)))
+            tables.append(_read_table_columns(os.path.join(table_folder, table)))
 
     # check that all of the column names except the merge column are unique
-    column_names = list(set(tables[0].columns) - set(merge_columns))
+    column_names = list(set(tables[0]) - set(merge_columns))
     for table in tables[1:]:
         this_columns = list(set(table) - set(merge_columns))
         duplicate_columns = set(column_names).intersection(set(this_columns))
@@ -197,7 +245,7 @@ def check_tables_in_view(
         for col in expected_columns:
             have_expected_col = False
             for table in tables:
-                have_expected_col = col in table.columns
+                have_expected_col = col in table
                 if have_expected_col:
                     break
             assert_true(have_expected_col, f"Could not find the expected column {col} in any of the tables in the view")
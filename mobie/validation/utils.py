@@ -6,6 +6,8 @@ import warnings
 from typing import Dict
 
 import jsonschema
+import referencing
+import referencing.jsonschema
 import requests
 import s3fs
 
@@ -22,8 +24,15 @@ SCHEMA_URLS = {
 """
 
 
-def _download_schema():
-    folder = os.path.expanduser("~/.mobie")
+# the schemas shipped with the package, which are used instead of downloading them.
+_BUNDLED_SCHEMA_FOLDER = os.path.join(os.path.split(__file__)[0], "schemas")
+_SCHEMA_CACHE_FOLDER = os.path.expanduser("~/.mobie")
+# the loaded schemas and compiled validators, which are cached for the lifetime of the process.
+_SCHEMAS = {}
+_VALIDATORS = {}
+
+
+def _download_schema(folder=_SCHEMA_CACHE_FOLDER):
     os.makedirs(folder, exist_ok=True)
 
     def _download(address, out_file):
@@ -31,6 +40,7 @@ def _download_schema():
             return True
         try:
             r = requests.get(address, timeout=30)
+            r.raise_for_status()
             with open(out_file, "w") as f:
                 f.write(r.content.decode("utf-8"))
             return True
@@ -44,10 +54,58 @@ def _download_schema():
     return True
 
 
+def _load_schemas():
+    """@private
+    Load all schemas, either from the package or from the download folder. Returns None if they are not available.
+    Only successfully loaded schemas are cached, so that the download is tried again after a failure.
+    """
+    if _SCHEMAS:
+        return _SCHEMAS
+    folder = _BUNDLED_SCHEMA_FOLDER
+    if not all(os.path.exists(os.path.join(folder, f"{name}.schema.json")) for name in SCHEMA_URLS):
+        folder = _SCHEMA_CACHE_FOLDER
+        if not _download_schema(folder):
+            return None
+    schemas = {}
+    for name in SCHEMA_URLS:
+        with open(os.path.join(folder, f"{name}.schema.json"), "r") as f:
+            schemas[name] = json.load(f)
+    _SCHEMAS.update(schemas)
+    return _SCHEMAS
+
+
+def _get_validator(schema):
+    """@private
+    The compiled validator for a schema, which is cached for the lifetime of the process.
+    References between the schemas are resolved locally via their url or id.
+    """
+    if schema in _VALIDATORS:
+        return _VALIDATORS[schema]
+    schemas = _load_schemas()
+    if schemas is None:
+        return None
+    resources = []
+    for name, schema_ in schemas.items():
+        resource = referencing.jsonschema.specification_with(
+            schema_.get("$schema", ""), default=referencing.jsonschema.DRAFT202012
+        ).create_resource(schema_)
+        resources.append((SCHEMA_URLS[name], resource))
+        if "$id" in schema_:
+            resources.append((schema_["$id"], resource))
+    registry = referencing.Registry().with_resources(resources)
+    validator_class = jsonschema.validators.validator_for(schemas[schema])
+    validator_class.check_schema(schemas[schema])
+    validator = validator_class(schemas[schema], registry=registry)
+    _VALIDATORS[schema] = validator
+    return validator
+
+
 def validate_with_schema(metadata: Dict, schema: str) -> None:
     """Validate that a dictionary with MoBIE metadata adheres to the given json schema.
 
     Raises a JsonSchemaValidation error if the metadata is not spec complient.
+    The schemas are taken from the package if they are bundled with it, otherwise they are downloaded once.
+    The compiled validators are cached.
 
     Args:
         metadata: The dictionary with MoBIE metadata.
@@ -55,15 +113,18 @@ def validate_with_schema(metadata: Dict, schema: str) -> None:
 
     """
     assert isinstance(schema, (str, dict))
-    if isinstance(schema, str):
-        assert schema in SCHEMA_URLS
-        if not _download_schema():
-            warnings.warn(f"Could not download the schema from {SCHEMA_URLS[schema]}. Check your internet connection.")
-            return
-        schema = os.path.expanduser(f"~/.mobie/{schema}.schema.json")
-        with open(schema, "r") as f:
-            schema = json.load(f)
-    jsonschema.validate(instance=metadata, schema=schema)
+    if isinstance(schema, dict):
+        jsonschema.validate(instance=metadata, schema=schema)
+        return
+    assert schema in SCHEMA_URLS
+    validator = _get_validator(schema)
+    if validator is None:
+        warnings.warn(f"Could not download the schema from {SCHEMA_URLS[schema]}. Check your internet connection.")
+        return
+    # raise the most relevant error, like jsonschema.validate
+    error = jsonschema.exceptions.best_match(validator.iter_errors(metadata))
+    if error is not None:
+        raise error
 
 
 def load_json_from_s3(address):
@@ -2,7 +2,6 @@
 """
 import argparse
 import json
-import os
 import warnings
 from typing import Dict, List, Optional, Sequence
 
@@ -71,22 +70,16 @@ def _write_view(dataset_folder, view_file, view_name, view, overwrite, return_vi
         return
 
     # write the view to an external view file
-    if os.path.exists(view_file):
-        with open(view_file, "r") as f:
-            views = json.load(f)["views"]
-    else:
-        views = {}
-
-    if view_name in views:
-        msg = f"The view {view_name} is alread present in {view_file}."
-        if overwrite:
-            warnings.warn(msg + " It will be over-written.")
-        else:
-            raise ValueError(msg)
-
-    views[view_name] = view
-    with open(view_file, "w") as f:
-        json.dump({"views": views}, f)
+    with mobie_metadata.utils.update_metadata(view_file) as metadata:
+        views = metadata.get("views", {})
+        if view_name in views:
+            msg = f"The view {view_name} is alread present in {view_file}."
+            if overwrite:
+                warnings.warn(msg + " It will be over-written.")
+            else:
+                raise ValueError(msg)
+        views[view_name] = view
+        metadata["views"] = views
 
 
 def create_view(
@@ -187,14 +180,16 @@ def create_grid_view(
         The view data. Only if return_view is set to True.
     """
     assert all(source_list for source_list in sources)
-    view = mobie_metadata.get_grid_view(
-        dataset_folder, view_name, sources, menu_name=menu_name,
-        table_source=table_source, table_folder=table_folder, display_groups=display_groups,
-        display_group_settings=display_group_settings, positions=positions,
-        use_transformed_grid=use_transformed_grid,
-    )
-    validate_with_schema(view, "view")
-    return _write_view(dataset_folder, view_file, view_name, view, overwrite=overwrite, return_view=return_view)
+    # the grid view may add its region table source to the dataset.
+    with mobie_metadata.DatasetMetadataTransaction(dataset_folder):
+        view = mobie_metadata.get_grid_view(
+            dataset_folder, view_name, sources, menu_name=menu_name,
+            table_source=table_source, table_folder=table_folder, display_groups=display_groups,
+            display_group_settings=display_group_settings, positions=positions,
+            use_transformed_grid=use_transformed_grid,
+        )
+        validate_with_schema(view, "view")
+        return _write_view(dataset_folder, view_file, view_name, view, overwrite=overwrite, return_view=return_view)
 
 
 #
@@ -212,23 +207,24 @@ def merge_view_file(dataset_folder: str, view_file: str, overwrite: bool = False
     """
     validate_views(view_file)
 
-    metadata = mobie_metadata.read_dataset_metadata(dataset_folder)
-    ds_views = metadata["views"]
+    with mobie_metadata.DatasetMetadataTransaction(dataset_folder):
+        metadata = mobie_metadata.read_dataset_metadata(dataset_folder)
+        ds_views = metadata["views"]
 
-    with open(view_file) as f:
-        views = json.load(f)["views"]
+        with open(view_file) as f:
+            views = json.load(f)["views"]
 
-    duplicate_views = [name for name in views if name in ds_views]
-    if duplicate_views:
-        msg = f"Duplicate views {duplicate_views} in view file {view_file} and dataset {dataset_folder}"
-        if overwrite:
-            raise RuntimeError(msg)
-        else:
-            warnings.warn(msg)
-    ds_views.update(views)
+        duplicate_views = [name for name in views if name in ds_views]
+        if duplicate_views:
+            msg = f"Duplicate views {duplicate_views} in view file {view_file} and dataset {dataset_folder}"
+            if overwrite:
+                raise RuntimeError(msg)
+            else:
+                warnings.warn(msg)
+        ds_views.update(views)
 
-    metadata["views"] = ds_views
-    mobie_metadata.write_dataset_metadata(dataset_folder, metadata)
+        metadata["views"] = ds_views
+        mobie_metadata.write_dataset_metadata(dataset_folder, metadata)
 
 
 def combine_views(
@@ -252,39 +248,40 @@ def combine_views(
         "The result for more complex views may be incorrect without raising any errors."
     )
     assert isinstance(view_names, (list, tuple))
-    metadata = mobie_metadata.read_dataset_metadata(dataset_folder)
-    views = metadata["views"]
-    if not all(name in views for name in view_names):
-        raise ValueError(f"Can't find all view names: {view_names} in the dataset at {dataset_folder}")
-
-    is_exclusive = None
-    source_displays = []
-    source_transforms = []
-    for name in view_names:
-        this_view = views[name]
-        # handle viewer transforms?
-        if "viewerTransform" in this_view:
-            raise RuntimeError("Views with a viewerTransform cannot be combined")
-        this_exclusive = this_view["isExclusive"]
-        if is_exclusive is None:
-            is_exclusive = this_exclusive
-        elif is_exclusive != this_exclusive:
-            raise RuntimeError("Views with different values for 'isExclusive' cannot be combined")
-        source_displays.extend(this_view.get("sourceDisplays", []))
-        source_transforms.extend(this_view.get("sourceTransforms", []))
-
-    new_view = {
-        "sourceDisplays": source_displays, "sourceTransforms": source_transforms,
-        "uiSelectionGroup": menu_name, "isExclusive": is_exclusive
-    }
-    validate_view_metadata(new_view)
-    views[new_view_name] = new_view
-
-    if not keep_original_views:
-        views = {k: v for k, v in views.items() if k not in view_names}
-
-    metadata["views"] = views
-    mobie_metadata.write_dataset_metadata(dataset_folder, metadata)
+    with mobie_metadata.DatasetMetadataTransaction(dataset_folder):
+        metadata = mobie_metadata.read_dataset_metadata(dataset_folder)
+        views = metadata["views"]
+        if not all(name in views for name in view_names):
+            raise ValueError(f"Can't find all view names: {view_names} in the dataset at {dataset_folder}")
+
+        is_exclusive = None
+        source_displays = []
+        source_transforms = []
+        for name in view_names:
+            this_view = views[name]
+            # handle viewer transforms?
+            if "viewerTransform" in this_view:
+                raise RuntimeError("Views with a viewerTransform cannot be combined")
+            this_exclusive = this_view["isExclusive"]
+            if is_exclusive is None:
+                is_exclusive = this_exclusive
+            elif is_exclusive != this_exclusive:
+                raise RuntimeError("Views with different values for 'isExclusive' cannot be combined")
+            source_displays.extend(this_view.get("sourceDisplays", []))
+            source_transforms.extend(this_view.get("sourceTransforms", []))
+
+        new_view = {
+            "sourceDisplays": source_displays, "sourceTransforms": source_transforms,
+            "uiSelectionGroup": menu_name, "isExclusive": is_exclusive
+        }
+        validate_view_metadata(new_view)
+        views[new_view_name] = new_view
+
+        if not keep_original_views:
+            views = {k: v for k, v in views.items() if k not in view_names}
+
+        metadata["views"] = views
+        mobie_metadata.write_dataset_metadata(dataset_folder, metadata)
 
 
 def main():
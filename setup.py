@@ -10,7 +10,7 @@ requires = [
     "z5py",
     "h5py",
     "imageio",
-    "jsonschema",
+    "jsonschema>=4.18",
     "pandas",
     "requests",
     "s3fs",
@@ -24,6 +24,7 @@ requires = [
 setup(
     name="mobie_utils",
     packages=find_packages(exclude=["test"]),
+    package_data={"mobie.validation": ["schemas/*.json"]},
     version=version,
     author="Constantin Pape",
     install_requires=requires,
@@ -0,0 +1,125 @@
+import json
+import os
+import unittest
+from shutil import rmtree
+
+import numpy as np
+from elf.io import open_file
+
+
+class TestCompression(unittest.TestCase):
+    test_folder = "./test-folder"
+    tmp_folder = "./test-folder/tmp"
+
+    def setUp(self):
+        os.makedirs(self.test_folder, exist_ok=True)
+
+    def tearDown(self):
+        rmtree(self.test_folder)
+
+    def create_input_data(self, shape=(32, 64, 64)):
+        data = np.random.randint(0, 20, size=shape).astype("uint32")
+        test_path = os.path.join(self.test_folder, "data.h5")
+        key = "data"
+        with open_file(test_path, mode="a") as f:
+            f.create_dataset(key, data=data)
+        return test_path, key, data
+
+    def test_import_with_compression(self):
+        from mobie.import_data import import_segmentation
+
+        test_path, key, data = self.create_input_data()
+        scales = [[2, 2, 2], [2, 2, 2]]
+        out_path = os.path.join(self.test_folder, "imported_data.ome.zarr")
+        import_segmentation(test_path, key, out_path,
+                            resolution=(1, 1, 1), chunks=(16, 32, 32), scale_factors=scales,
+                            tmp_folder=self.tmp_folder, target="local", max_jobs=1,
+                            compression="blosc-zstd")
+        for scale in range(len(scales) + 1):
+            with open(os.path.join(out_path, f"s{scale}", ".zarray")) as f:
+                compressor = json.load(f)["compressor"]
+            self.assertEqual(compressor["id"], "blosc")
+            self.assertEqual(compressor["cname"], "zstd")
+        with open_file(out_path, "r") as f:
+            self.assertTrue(np.array_equal(f["s0"][:], data))
+
+        import_segmentation(test_path, key, out_path,
+                            resolution=(1, 1, 1), chunks=(16, 32, 32), scale_factors=scales,
+                            tmp_folder=self.tmp_folder, target="local", max_jobs=1,
+                            compression="gzip", compression_level=7)
+        for scale in range(len(scales) + 1):
+            with open(os.path.join(out_path, f"s{scale}", ".zarray")) as f:
+                compressor = json.load(f)["compressor"]
+            # z5py writes the deflate compression in zarr with the zlib codec.
+            self.assertIn(compressor["id"], ("gzip", "zlib"))
+            self.assertEqual(compressor["level"], 7)
+        with open_file(out_path, "r") as f:
+            self.assertTrue(np.array_equal(f["s0"][:], data))
+
+    def test_import_with_compression_bdv(self):
+        from mobie.import_data import import_image_data
+
+        test_path, key, data = self.create_input_data()
+        for file_format, ext in (("bdv.n5", ".n5"), ("bdv.hdf5", ".h5")):
+            out_path = os.path.join(self.test_folder, f"imported_data{ext}")
+            import_image_data(test_path, key, out_path,
+                              resolution=(1, 1, 1), chunks=(16, 32, 32), scale_factors=[[2, 2, 2]],
+                              tmp_folder=self.tmp_folder, target="local", max_jobs=1,
+                              file_format=file_format, compression="raw")
+            with open_file(out_path, "r") as f:
+                out_key = "setup0/timepoint0/s0" if file_format == "bdv.n5" else "t00000/s00/0/cells"
+                self.assertTrue(np.array_equal(f[out_key][:], data))
+
+    def test_invalid_compression(self):
+        from mobie.import_data import import_image_data
+
+        test_path, key, _ = self.create_input_data()
+        out_path = os.path.join(self.test_folder, "imported_data.ome.zarr")
+        with self.assertRaises(ValueError):
+            import_image_data(test_path, key, out_path,
+                              resolution=(1, 1, 1), chunks=(16, 32, 32), scale_factors=[[2, 2, 2]],
+                              tmp_folder=self.tmp_folder, target="local", max_jobs=1,
+                              compression="lzma")
+        with self.assertRaises(ValueError):
+            import_image_data(test_path, key, out_path,
+                              resolution=(1, 1, 1), chunks=(16, 32, 32), scale_factors=[[2, 2, 2]],
+                              tmp_folder=self.tmp_folder, target="local", max_jobs=1,
+                              compression_level=5)
+
+    def test_benchmark_compression(self):
+        from mobie.import_data import benchmark_compression
+
+        test_path, key, _ = self.create_input_data()
+        results = benchmark_compression(test_path, key, chunks=(16, 16, 16), sample_size=(32, 32, 32),
+                                        compression_levels=[None, 9], tmp_folder=self.tmp_folder)
+        # two levels for each codec, except for raw.
+        self.assertEqual(len(results), 7)
+        self.assertEqual(
+            set(results.columns),
+            {"compression", "compression_level", "size", "ratio", "write_mb_per_s", "read_mb_per_s"}
+        )
+        raw_size = results[results.compression == "raw"]["size"].values[0]
+        self.assertTrue((results[results.compression != "raw"]["size"] < raw_size).all())
+        # only the samples are removed, not the tmp folder that was passed.
+        self.assertEqual(os.listdir(self.tmp_folder), [])
+
+    def test_benchmark_label_downsampling(self):
+        from mobie.import_data import benchmark_label_downsampling
+
+        # isolated single voxel objects, which are dropped by nearest-neighbor sampling but kept by the mode.
+        data = np.zeros((32, 32, 32), dtype="uint16")
+        data[1::2, 1::2, 1::2] = np.random.randint(1, 1000, size=(16, 16, 16))
+        path = os.path.join(self.test_folder, "seg.h5")
+        with open_file(path, "a") as f:
+            f.create_dataset("seg", data=data)
+        results = benchmark_label_downsampling(path, "seg", [2, 2, 2], n_repeats=1)
+        self.assertEqual(list(results["downsampling_mode"]), ["nearest", "mode", "mode-nonzero"])
+        self.assertEqual(set(results.columns), {"downsampling_mode", "mb_per_s", "n_labels", "label_fraction"})
+        fractions = results.set_index("downsampling_mode")["label_fraction"]
+        self.assertEqual(fractions["mode-nonzero"], 1.0)
+        self.assertLess(fractions["mode"], 1.0)
+        self.assertTrue((results["mb_per_s"] > 0).all())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -11,6 +11,11 @@ from elf.io import open_file
 from pybdv.util import get_key, relative_to_absolute_scale_factors
 from pybdv.downsample import sample_shape
 
+try:
+    import dask.array as da
+except ImportError:
+    da = None
+
 try:
     import mrcfile
 except ImportError:
@@ -251,6 +256,395 @@ class TestImportImage(unittest.TestCase):
                           file_format="ome.zarr")
         self.check_data_ome_zarr(data, scales, out_path, resolution, scales)
 
+    def test_import_ome_zarr_v3(self):
+        from unittest import mock
+        from mobie.import_data import import_segmentation
+
+        shape = (64, 64, 64)
+        data = np.random.randint(0, 50, size=shape).astype("uint32")
+        test_path = os.path.join(self.test_folder, "data.h5")
+        with open_file(test_path, mode="a") as f:
+            f.create_dataset("labels", data=data)
+
+        scales = [[2, 2, 2], [2, 2, 2]]
+        resolution = (0.5, 0.5, 0.5)
+        scale_data = {}
+        # restrict the shard size, so that the levels consist of several shards.
+        with mock.patch("mobie.import_data.utils._SHARD_BYTES", 8 * 4 * 16 ** 3):
+            for file_format in ("ome.zarr", "ome.zarr.v3"):
+                out_path = os.path.join(self.test_folder, f"imported_data_{file_format}.ome.zarr")
+                import_segmentation(test_path, "labels", out_path,
+                                    resolution=resolution, chunks=(16, 16, 16),
+                                    scale_factors=scales, tmp_folder=self.tmp_folder,
+                                    target="local", max_jobs=self.n_jobs,
+                                    file_format=file_format)
+                with open_file(out_path, "r") as f:
+                    scale_data[file_format] = [f[f"s{scale}"][:] for scale in range(len(scales) + 1)]
+
+        out_path = os.path.join(self.test_folder, "imported_data_ome.zarr.v3.ome.zarr")
+        with open(os.path.join(out_path, "zarr.json")) as f:
+            attrs = json.load(f)["attributes"]["ome"]
+        self.assertEqual(attrs["version"], "0.5")
+        datasets = attrs["multiscales"][0]["datasets"]
+        self.assertEqual([ds["path"] for ds in datasets], ["s0", "s1", "s2"])
+        self.assertEqual(datasets[1]["coordinateTransformations"][0]["scale"], [1.0, 1.0, 1.0])
+
+        with open(os.path.join(out_path, "s0", "zarr.json")) as f:
+            codec = json.load(f)["codecs"][0]
+        self.assertEqual(codec["name"], "sharding_indexed")
+        self.assertEqual(codec["configuration"]["chunk_shape"], [16, 16, 16])
+        # 64 chunks are stored in 8 shards.
+        n_files = sum(len(files) for _, _, files in os.walk(os.path.join(out_path, "s0", "c")))
+        self.assertEqual(n_files, 8)
+
+        self.assertTrue(np.array_equal(scale_data["ome.zarr.v3"][0], data))
+        for v3_data, v2_data in zip(scale_data["ome.zarr.v3"], scale_data["ome.zarr"]):
+            self.assertTrue(np.array_equal(v3_data, v2_data))
+
+    def test_import_in_memory(self):
+        import zarr
+        from mobie.import_data import import_image_data
+
+        data = np.random.rand(32, 64, 64)
+        zarr_data = zarr.open_array(os.path.join(self.test_folder, "data.zarr"), mode="w",
+                                    shape=data.shape, chunks=(16, 32, 32), dtype=data.dtype)
+        zarr_data[:] = data
+        scales = [[2, 2, 2]]
+        resolution = (0.5, 0.5, 0.5)
+
+        # the arrays are converted directly; only in-memory arrays are handed off to the subprocess workers.
+        for name, array in (("numpy", data), ("zarr", zarr_data)):
+            for target in ("local", "subprocess"):
+                tmp_folder = os.path.join(self.tmp_folder, f"{name}-{target}")
+                os.makedirs(tmp_folder)
+                out_path = os.path.join(self.test_folder, f"imported_data_{name}_{target}.ome.zarr")
+                import_image_data(array, None, out_path,
+                                  resolution=resolution, chunks=(16, 16, 16),
+                                  scale_factors=scales, tmp_folder=tmp_folder,
+                                  target=target, max_jobs=self.n_jobs)
+                self.check_data_ome_zarr(data, scales, out_path, resolution, scales)
+                self.assertFalse(any(fname.startswith("input_") for fname in os.listdir(tmp_folder)))
+
+    def _import_without_handoff(self, array, data, name):
+        from unittest import mock
+        from mobie.import_data import import_image_data
+        from mobie.import_data import utils
+
+        scales = [[2, 2, 2]]
+        resolution = (0.5, 0.5, 0.5)
+        tmp_folder = os.path.join(self.tmp_folder, name)
+        os.makedirs(tmp_folder)
+        out_path = os.path.join(self.test_folder, f"imported_data_{name}.ome.zarr")
+        with mock.patch.object(utils, "copy", wraps=utils.copy) as handoff_copy:
+            import_image_data(array, None, out_path,
+                              resolution=resolution, chunks=(16, 16, 16),
+                              scale_factors=scales, tmp_folder=tmp_folder,
+                              target="subprocess", max_jobs=self.n_jobs)
+        self.check_data_ome_zarr(data, scales, out_path, resolution, scales)
+        return handoff_copy
+
+    def test_import_memmap(self):
+        from mobie.import_data.utils import open_input
+
+        data = np.random.rand(32, 64, 64).astype("float32")
+        path = os.path.join(self.test_folder, "data.raw")
+        memmap = np.memmap(path, mode="w+", dtype=data.dtype, shape=data.shape)
+        memmap[:] = data
+        memmap.flush()
+        # the memmap is read in place by the workers instead of being copied into a handoff file.
+        self.assertEqual(open_input(memmap).to_spec().path, os.path.abspath(path))
+        handoff_copy = self._import_without_handoff(np.memmap(path, mode="r", dtype=data.dtype, shape=data.shape),
+                                                    data, "memmap")
+        handoff_copy.assert_not_called()
+
+    @unittest.skipIf(da is None, "Needs dask")
+    def test_import_dask(self):
+        data = np.random.rand(32, 64, 64)
+        # dask arrays can't be reopened by the workers and are handed off via the tmp folder.
+        handoff_copy = self._import_without_handoff(da.from_array(data, chunks=(16, 32, 32)), data, "dask")
+        handoff_copy.assert_called_once()
+        self.assertFalse(any(fname.startswith("input_") for fname in os.listdir(os.path.join(self.tmp_folder,
+                                                                                             "dask"))))
+
+    def test_handoff(self):
+        from bioimage_py.sources import as_source
+        from mobie.import_data.utils import _distributable
+
+        data = np.random.rand(16, 32, 32)
+        run_kwargs = dict(job_type="subprocess", job_config=None, num_workers=2)
+        # conversions that share the tmp folder get handoffs of their own, which are removed on exit.
+        with _distributable(as_source(data), run_kwargs, self.tmp_folder) as src1:
+            with _distributable(as_source(data + 1), run_kwargs, self.tmp_folder) as src2:
+                self.assertNotEqual(src1.to_spec().path, src2.to_spec().path)
+                self.assertTrue(np.array_equal(src2[:], data + 1))
+            self.assertFalse(os.path.exists(src2.to_spec().path))
+            self.assertTrue(np.array_equal(src1[:], data))
+        self.assertEqual(os.listdir(self.tmp_folder), [])
+
+    def test_import_tif_slabs(self):
+        import tifffile
+        from mobie.import_data import import_image_data
+
+        shape = (37, 70, 60)
+        data = (np.random.rand(*shape) * 255).astype("uint8")
+        # a compressed multi-page tif, an uncompressed multi-page tif and a folder of slice files.
+        inputs = {}
+        for name, compression in (("compressed", "zlib"), ("raw", None)):
+            path = os.path.join(self.test_folder, f"{name}.tif")
+            tifffile.imwrite(path, data, compression=compression)
+            inputs[name] = path
+        slice_folder = os.path.join(self.test_folder, "slices")
+        os.makedirs(slice_folder)
+        for z in range(shape[0]):
+            tifffile.imwrite(os.path.join(slice_folder, f"z{z:03}.tif"), data[z], compression="zlib")
+        inputs["slices"] = slice_folder
+
+        scales = [[2, 2, 2], [2, 2, 2]]
+        resolution = (0.5, 0.5, 0.5)
+        for name, path in inputs.items():
+            for read_slabs in (True, False):
+                out_path = os.path.join(self.test_folder, f"imported_data_{name}_{read_slabs}.ome.zarr")
+                import_image_data(path, None, out_path,
+                                  resolution=resolution, chunks=(16, 16, 16),
+                                  scale_factors=scales, tmp_folder=self.tmp_folder,
+                                  target="local", max_jobs=self.n_jobs, read_slabs=read_slabs)
+                self.check_data_ome_zarr(data, scales, out_path, resolution, scales)
+
+        # slabs that exceed the byte budget are split along y, or along y and x if a single block row is too large.
+        from unittest import mock
+        from mobie.import_data import utils
+        self.assertEqual(utils._slab_shape(shape, (16, 16, 16), 1), (16, 70, 60))
+        asarray = tifffile.TiffFile.asarray
+        for budget, exp_shape in ((16 * 40 * 60, (16, 32, 60)), (16 * 16 * 30, (16, 16, 16))):
+            with mock.patch.object(utils, "_SLAB_BYTES", budget), \
+                    mock.patch.object(tifffile.TiffFile, "asarray", autospec=True, side_effect=asarray) as decode:
+                self.assertEqual(utils._slab_shape(shape, (16, 16, 16), 1), exp_shape)
+                out_path = os.path.join(self.test_folder, f"imported_data_budget_{budget}.ome.zarr")
+                import_image_data(inputs["compressed"], None, out_path,
+                                  resolution=resolution, chunks=(16, 16, 16),
+                                  scale_factors=scales, tmp_folder=self.tmp_folder,
+                                  target="local", max_jobs=self.n_jobs, read_slabs=True)
+            # the split slabs are read from the decoded pages, so that each page is only decoded once.
+            self.assertEqual(decode.call_count, shape[0])
+            self.assertEqual(os.listdir(self.tmp_folder), [])
+            self.check_data_ome_zarr(data, scales, out_path, resolution, scales)
+
+    #
+    # test the fused pyramid computation
+    #
+
+    def _check_fused_pyramid(self, test_path, key, scales, library, atol):
+        from mobie.import_data.utils import downscale
+
+        scale_data = {}
+        for fused in (True, False):
+            out_path = os.path.join(self.test_folder, f"imported_data_{fused}.ome.zarr")
+            downscale(test_path, key, out_path,
+                      resolution=(1, 1, 1), scale_factors=scales, chunks=(16, 16, 16),
+                      tmp_folder=self.tmp_folder, target="local", max_jobs=self.n_jobs, block_shape=None,
+                      library=library, fused_pyramid=fused)
+            with open_file(out_path, "r") as f:
+                scale_data[fused] = [f[f"s{scale}"][:] for scale in range(len(scales) + 1)]
+
+        for fused_data, level_data in zip(scale_data[True], scale_data[False]):
+            self.assertEqual(fused_data.shape, level_data.shape)
+            self.assertTrue(np.allclose(fused_data, level_data, atol=atol))
+
+    def test_fused_pyramid(self):
+        from unittest import mock
+        shape = (67, 90, 75)
+        data = (np.random.rand(*shape) * 255).astype("uint8")
+        test_path = os.path.join(self.test_folder, "data.h5")
+        with open_file(test_path, mode="a") as f:
+            f.create_dataset("image", data=data)
+            f.create_dataset("labels", data=np.random.randint(0, 50, size=shape).astype("uint32"))
+
+        # the sub-pixel offsets of the blocks differ between the two modes, so interpolated values
+        # may differ by rounding. Nearest-neighbor downsampling of the labels must be identical.
+        scales = [[1, 2, 2], [2, 2, 2], [2, 2, 2], [2, 2, 2]]
+        self._check_fused_pyramid(test_path, "image", scales, "skimage", atol=1)
+        self._check_fused_pyramid(test_path, "labels", scales, "vigra", atol=0)
+
+        # restrict the block size so that the pyramid is computed in several sweeps.
+        with mock.patch("mobie.import_data.utils._FUSED_BLOCK_BYTES", 8 * 16 ** 3):
+            self._check_fused_pyramid(test_path, "image", scales, "skimage", atol=1)
+            self._check_fused_pyramid(test_path, "labels", scales, "vigra", atol=0)
+
+    #
+    # test resuming an interrupted conversion
+    #
+
+    def _check_resume(self, fused_pyramid, block_function, n_blocks):
+        from unittest import mock
+        import mobie.import_data.utils as import_utils
+
+        test_path, key, data = self.create_h5_input_data()
+        scales = [[2, 2, 2], [2, 2, 2]]
+        resolution = (1, 1, 1)
+        out_path = os.path.join(self.test_folder, "imported_data.ome.zarr")
+        journal_folder = os.path.abspath(out_path) + ".journal"
+
+        def _downscale():
+            import_utils.downscale(test_path, key, out_path,
+                                   resolution=resolution, scale_factors=scales, chunks=(8, 8, 8),
+                                   tmp_folder=self.tmp_folder, target="local", max_jobs=1, block_shape=None,
+                                   library="skimage", fused_pyramid=fused_pyramid, resumable=True)
+
+        block_function_ = getattr(import_utils, block_function)
+        n_interrupt = 5
+
+        def interrupted(block_id, **kwargs):
+            if interrupted.n_calls == n_interrupt:
+                raise RuntimeError("Interrupted")
+            interrupted.n_calls += 1
+            return block_function_(block_id, **kwargs)
+        interrupted.n_calls = 0
+
+        with mock.patch.object(import_utils, block_function, side_effect=interrupted):
+            with self.assertRaises(Exception):
+                _downscale()
+        # the conversion was interrupted: the progress is journaled and no metadata was written yet.
+        self.assertTrue(os.path.exists(journal_folder))
+        with open_file(out_path, "r") as f:
+            self.assertNotIn("multiscales", f.attrs)
+
+        # resuming the conversion only writes the missing blocks.
+        with mock.patch.object(import_utils, block_function, side_effect=block_function_) as resumed:
+            _downscale()
+        self.assertEqual(resumed.call_count, n_blocks - n_interrupt)
+        self.assertFalse(os.path.exists(journal_folder))
+        self.check_data_ome_zarr(data, scales, out_path, resolution, scales)
+
+    def test_resume_fused_pyramid(self):
+        # all levels are computed in a single sweep over the 8 blocks of the last level.
+        self._check_resume(True, "_fused_pyramid_block", n_blocks=8)
+
+    def test_resume_level_pyramid(self):
+        # the blocks of the three levels are written one level after the other.
+        self._check_resume(False, "_copy_block", n_blocks=512 + 64 + 8)
+
+    def test_resume_changed_input(self):
+        from unittest import mock
+        import mobie.import_data.utils as import_utils
+
+        test_path, key, _ = self.create_h5_input_data()
+        scales = [[2, 2, 2], [2, 2, 2]]
+        resolution = (1, 1, 1)
+        out_path = os.path.join(self.test_folder, "imported_data.ome.zarr")
+
+        def _downscale(in_path):
+            import_utils.downscale(in_path, key, out_path,
+                                   resolution=resolution, scale_factors=scales, chunks=(8, 8, 8),
+                                   tmp_folder=self.tmp_folder, target="local", max_jobs=1, block_shape=None,
+                                   library="skimage", resumable=True)
+
+        block_function = import_utils._fused_pyramid_block
+
+        def interrupted(block_id, **kwargs):
+            if block_id == 5:
+                raise RuntimeError("Interrupted")
+            return block_function(block_id, **kwargs)
+
+        with mock.patch.object(import_utils, "_fused_pyramid_block", side_effect=interrupted):
+            with self.assertRaises(Exception):
+                _downscale(test_path)
+
+        # the input is replaced by data with the same shape and dtype, so the conversion must start from scratch.
+        data = np.random.rand(*3*(64,))
+        replaced_path = os.path.join(self.test_folder, "replaced.h5")
+        with open_file(replaced_path, mode="a") as f:
+            f.create_dataset(key, data=data)
+        os.replace(replaced_path, test_path)
+        _downscale(test_path)
+        self.check_data_ome_zarr(data, scales, out_path, resolution, scales)
+
+        # it can't be told whether an in-memory array was changed, so its conversion can't be resumed.
+        with self.assertRaisesRegex(ValueError, "can be resumed"):
+            _downscale(data)
+
+    #
+    # test the multi-channel import
+    #
+
+    def test_import_multichannel(self):
+        from mobie.import_data import import_multichannel_image_data
+
+        n_channels, shape = 3, (40, 70, 60)
+        data = (np.random.rand(n_channels, *shape) * 255).astype("uint8")
+        test_path = os.path.join(self.test_folder, "data.h5")
+        with open_file(test_path, mode="a") as f:
+            f.create_dataset("image", data=data)
+        scales = [[2, 2, 2], [2, 2, 2]]
+        resolution = (0.5, 0.5, 0.5)
+
+        # one output per channel
+        out_paths = [os.path.join(self.test_folder, f"channel{c}.ome.zarr") for c in range(n_channels)]
+        import_multichannel_image_data(test_path, "image", out_paths,
+                                       resolution=resolution, chunks=(16, 16, 16),
+                                       scale_factors=scales, tmp_folder=self.tmp_folder,
+                                       target="local", max_jobs=self.n_jobs)
+        for c, out_path in enumerate(out_paths):
+            self.check_data_ome_zarr(data[c], scales, out_path, resolution, scales)
+
+        # a single output with a channel axis
+        out_path = os.path.join(self.test_folder, "multichannel.ome.zarr")
+        import_multichannel_image_data(test_path, "image", out_path,
+                                       resolution=resolution, chunks=(16, 16, 16),
+                                       scale_factors=scales, tmp_folder=self.tmp_folder,
+                                       target="local", max_jobs=self.n_jobs)
+        with open_file(out_path, "r") as f:
+            axes = f.attrs["multiscales"][0]["axes"]
+            self.assertEqual([ax["name"] for ax in axes], ["c", "z", "y", "x"])
+            for scale in range(len(scales) + 1):
+                multi_data = f[f"s{scale}"][:]
+                self.assertEqual(multi_data.shape[0], n_channels)
+                for c, channel_path in enumerate(out_paths):
+                    with open_file(channel_path, "r") as f_channel:
+                        self.assertTrue(np.array_equal(multi_data[c], f_channel[f"s{scale}"][:]))
+
+    #
+    # test the time-series import
+    #
+
+    def test_import_timeseries(self):
+        from mobie.import_data import import_image_data, import_timeseries_image_data
+
+        n_timepoints, shape = 3, (40, 70, 60)
+        data = (np.random.rand(n_timepoints, *shape) * 255).astype("uint8")
+        test_path = os.path.join(self.test_folder, "data.h5")
+        with open_file(test_path, mode="a") as f:
+            f.create_dataset("timeseries", data=data)
+            for timepoint in range(n_timepoints):
+                f.create_dataset(f"t{timepoint}", data=data[timepoint])
+        scales = [[2, 2, 2], [2, 2, 2]]
+        resolution = (0.5, 0.5, 0.5)
+
+        # each timepoint is converted like a single volume.
+        exp_paths = [os.path.join(self.test_folder, f"t{timepoint}.ome.zarr") for timepoint in range(n_timepoints)]
+        for timepoint, exp_path in enumerate(exp_paths):
+            import_image_data(test_path, f"t{timepoint}", exp_path,
+                              resolution=resolution, chunks=(16, 16, 16),
+                              scale_factors=scales, tmp_folder=self.tmp_folder,
+                              target="local", max_jobs=self.n_jobs)
+
+        # the input is given either with a time axis or as one dataset per timepoint.
+        keys = ["timeseries", [f"t{timepoint}" for timepoint in range(n_timepoints)]]
+        for key in keys:
+            out_path = os.path.join(self.test_folder, "timeseries.ome.zarr")
+            import_timeseries_image_data(test_path, key, out_path,
+                                         resolution=resolution, chunks=(16, 16, 16),
+                                         scale_factors=scales, tmp_folder=self.tmp_folder,
+                                         target="local", max_jobs=self.n_jobs)
+            with open_file(out_path, "r") as f:
+                axes = f.attrs["multiscales"][0]["axes"]
+                self.assertEqual([ax["name"] for ax in axes], ["t", "z", "y", "x"])
+                for scale in range(len(scales) + 1):
+                    ts_data = f[f"s{scale}"][:]
+                    self.assertEqual(ts_data.shape[0], n_timepoints)
+                    for timepoint, exp_path in enumerate(exp_paths):
+                        with open_file(exp_path, "r") as f_exp:
+                            self.assertTrue(np.array_equal(ts_data[timepoint], f_exp[f"s{scale}"][:]))
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,53 @@
+import os
+import unittest
+from shutil import rmtree
+
+import numpy as np
+
+
+class TestPyramid(unittest.TestCase):
+    test_folder = "./test-folder"
+
+    def tearDown(self):
+        if os.path.exists(self.test_folder):
+            rmtree(self.test_folder)
+
+    def test_plan_pyramid(self):
+        from mobie.import_data import plan_pyramid
+
+        # isotropic 3d data
+        scale_factors, chunks = plan_pyramid((1024, 1024, 1024), (1, 1, 1), "uint8")
+        self.assertEqual(scale_factors, [[2, 2, 2]])
+        self.assertEqual(chunks, [64, 64, 64])
+
+        # anisotropic 3d data: only the finer axes are downsampled until the data is isotropic.
+        scale_factors, chunks = plan_pyramid((256, 4096, 4096), (1.0, 0.25, 0.25), "uint8", max_top_level_size=256)
+        self.assertEqual(scale_factors, [[1, 2, 2], [1, 2, 2], [2, 2, 2], [2, 2, 2]])
+        self.assertEqual(chunks, [16, 128, 128])
+
+        # 2d data
+        scale_factors, chunks = plan_pyramid((3000, 2000), (1, 1), "uint16")
+        self.assertEqual(scale_factors, [[2, 2], [2, 2], [2, 2]])
+        self.assertEqual(chunks, [512, 512])
+
+        # large data types and small data
+        _, chunks = plan_pyramid((64, 512, 512), (1, 1, 1), "float64")
+        self.assertEqual(int(np.prod(chunks)) * 8, 1024 ** 2)
+        scale_factors, chunks = plan_pyramid((10, 100, 100), (1, 1, 1), "uint8")
+        self.assertEqual(scale_factors, [])
+        self.assertTrue(all(ch <= 128 for ch in chunks))
+        self.assertEqual(chunks[0], 16)
+
+    def test_describe_pyramid(self):
+        from mobie.import_data import describe_pyramid
+
+        description = describe_pyramid((128, 200, 200), [[2, 2, 2], [2, 2, 2]], (64, 64, 64), "uint16")
+        self.assertEqual(list(description["level"]), [0, 1, 2])
+        self.assertEqual(list(description["shape"]), [(128, 200, 200), (64, 100, 100), (32, 50, 50)])
+        self.assertEqual(list(description["scale_factor"]), [(1, 1, 1), (2, 2, 2), (4, 4, 4)])
+        self.assertEqual(list(description["n_chunks"]), [32, 4, 1])
+        self.assertEqual(list(description["size"]), [2 * 128 * 200 * 200, 2 * 64 * 100 * 100, 2 * 32 * 50 * 50])
+
+
+if __name__ == "__main__":
+    unittest.main()
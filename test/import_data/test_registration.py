@@ -1,7 +1,10 @@
+import io
 import os
 import unittest
+from contextlib import redirect_stdout
 from multiprocessing import cpu_count
 from shutil import rmtree
+from unittest import mock
 
 import numpy as np
 import z5py
@@ -10,6 +13,7 @@ from scipy.ndimage import affine_transform as scipy_affine
 import mobie
 import mobie.utils as mobie_utils
 from elf.transformation import elastix_to_native
+from mobie.import_data.registration import registration_impl
 from mobie.import_data.utils import _open_data, get_scale_key
 
 
@@ -65,7 +69,7 @@ class TestRegistration(unittest.TestCase):
                            output_shape=self.shape, mode="constant", cval=0)
         return ref.astype("uint16")
 
-    def _run_affine(self, file_format, source_name, bounding_box=None):
+    def _run_affine(self, file_format, source_name, bounding_box=None, skip_empty_chunks=False):
         mobie.add_registered_source(
             input_path=self.in_path, input_key=self.in_key, transformation=self.trafo_file,
             root=self.root, dataset_name=self.ds_name, source_name=source_name,
@@ -73,7 +77,7 @@ class TestRegistration(unittest.TestCase):
             method="affine", file_format=file_format, shape=self.shape,
             source_type="segmentation", add_default_table=False,
             tmp_folder=self.tmp_folder, target="local", max_jobs=self.n_jobs,
-            bounding_box=bounding_box,
+            bounding_box=bounding_box, skip_empty_chunks=skip_empty_chunks,
         )
         data_path, _ = mobie_utils.get_internal_paths(
             os.path.join(self.root, self.ds_name), file_format, source_name
@@ -121,6 +125,48 @@ class TestRegistration(unittest.TestCase):
         self.assertTrue(np.all(s0[:, 16:] == 0))
         self.assertTrue(np.all(s0[:, :, 16:] == 0))
 
+    def test_affine_skip_empty_chunks(self):
+        # only the block in the bounding box is computed, the other chunks are empty and not written.
+        ref = self._scipy_reference(order=0)
+        bb = [[0, 0, 0], [16, 16, 16]]
+        s0, _ = self._run_affine("ome.zarr", "reg-sparse", bounding_box=bb, skip_empty_chunks=True)
+        self.assertTrue(np.array_equal(s0[:16, :16, :16], ref[:16, :16, :16]))
+        self.assertEqual(np.count_nonzero(s0[16:]) + np.count_nonzero(s0[:16, 16:]), 0)
+        data_path, _ = mobie_utils.get_internal_paths(os.path.join(self.root, self.ds_name), "ome.zarr", "reg-sparse")
+        chunk_files = [name for _, _, names in os.walk(os.path.join(data_path, "s0"))
+                       for name in names if not name.startswith(".")]
+        self.assertEqual(len(chunk_files), 1)
+
+    def test_affine_skipped_chunks(self):
+        # the number of skipped chunks is returned, and only reported when the empty chunks are skipped.
+        # the output is padded along z, so that the last layer of 3 x 3 chunks lies outside of the input.
+        shape = (self.shape[0] + 16,) + self.shape[1:]
+        for skip_empty_chunks, exp_skipped in ((True, 3 * 3), (False, 0)):
+            out_path = os.path.join(self.test_folder, f"affine_{skip_empty_chunks}.ome.zarr")
+            with redirect_stdout(io.StringIO()) as stdout:
+                n_skipped = registration_impl.registration_affine(
+                    self.in_path, self.in_key, out_path, "s0", self.trafo_file, "nearest",
+                    shape=shape, resolution=self.resolution, chunks=self.chunks,
+                    tmp_folder=self.tmp_folder, target="local", max_jobs=self.n_jobs,
+                    skip_empty_chunks=skip_empty_chunks,
+                )
+            self.assertEqual(n_skipped, exp_skipped)
+            self.assertEqual("Skipped" in stdout.getvalue(), skip_empty_chunks)
+
+    def test_affine_skip_empty_chunks_sharded(self):
+        # the blocks are written in parallel, so they must not share shards of the sharded format.
+        # small chunks, so that the shards contain many chunks which would be written by different workers.
+        self.chunks = (4, 4, 4)
+        ref = self._scipy_reference(order=0)
+        with mock.patch.object(registration_impl, "_run_blocks", wraps=registration_impl._run_blocks) as run_blocks:
+            s0, _ = self._run_affine("ome.zarr.v3", "reg-sharded", skip_empty_chunks=True)
+        self.assertTrue(np.array_equal(s0, ref))
+        ds_folder = os.path.join(self.root, self.ds_name)
+        data_path, _ = mobie_utils.get_internal_paths(ds_folder, "ome.zarr.v3", "reg-sharded")
+        with _open_data(data_path, "r") as f:
+            shards = f[get_scale_key("ome.zarr.v3", 0)].shards
+        self.assertEqual(run_blocks.call_args[0][0].keywords["block_shape"], tuple(shards))
+
     def test_write_transformix_output(self):
         # the transformix output copy (formerly cluster_tools CopyVolume) is now a bp.copy.
         import imageio
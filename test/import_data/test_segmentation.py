@@ -1,6 +1,8 @@
+import io
 import multiprocessing
 import os
 import unittest
+from contextlib import redirect_stdout
 from shutil import rmtree
 
 import numpy as np
@@ -59,6 +61,186 @@ class TestImportSegmentation(unittest.TestCase):
 
         self.check_seg(data, scales)
 
+    def test_max_id_without_second_pass(self):
+        from unittest import mock
+        from mobie.import_data.utils import downscale
+        shape = (64, 128, 128)
+        data = np.random.randint(0, 100, size=shape, dtype='uint64')
+        test_path = os.path.join(self.test_folder, 'data.h5')
+        with open_file(test_path, mode="a") as f:
+            f.create_dataset('data', data=data)
+
+        # the max id is computed while writing scale-0, for the fused and the level-wise pyramid,
+        # and is also correct when resuming a conversion from the journal.
+        scales = [[1, 2, 2], [2, 2, 2]]
+        with mock.patch('mobie.import_data.utils.compute_max_id') as compute_max_id:
+            for fused_pyramid in (True, False):
+                for resumable in (False, True):
+                    downscale(test_path, 'data', self.out_path,
+                              resolution=(0.5, 1, 1), scale_factors=scales, chunks=(32, 64, 64),
+                              tmp_folder=self.tmp_folder, target='local', max_jobs=self.n_jobs, block_shape=None,
+                              library='vigra', library_kwargs={'order': 0}, fused_pyramid=fused_pyramid,
+                              resumable=resumable, with_max_id=True)
+                    self.check_seg(data, scales)
+        compute_max_id.assert_not_called()
+
+    def test_narrow_dtype(self):
+        from mobie.import_data import import_segmentation, import_segmentation_from_node_labels
+        shape = (64, 128, 128)
+        data = np.random.randint(0, 1000, size=shape, dtype='uint64')
+        test_path = os.path.join(self.test_folder, 'data.h5')
+        with open_file(test_path, mode="a") as f:
+            f.create_dataset('data', data=data)
+            ds = f.create_dataset('data_with_max_id', data=data)
+            ds.attrs['maxId'] = 70000
+            ds = f.create_dataset('data_with_wrong_max_id', data=data)
+            ds.attrs['maxId'] = 200
+
+        # the dtype is chosen from the max id of the data or from the maxId attribute.
+        scales = [[1, 2, 2], [2, 2, 2]]
+        for key, exp_dtype in (('data', 'uint16'), ('data_with_max_id', 'uint32')):
+            import_segmentation(test_path, key, self.out_path,
+                                resolution=(0.5, 1, 1), chunks=(32, 64, 64),
+                                scale_factors=scales, tmp_folder=self.tmp_folder,
+                                target='local', max_jobs=self.n_jobs, narrow_dtype=True)
+            with open_file(self.out_path, 'r') as f:
+                for scale in range(len(scales) + 1):
+                    self.assertEqual(f[f's{scale}'].dtype, np.dtype(exp_dtype))
+            self.check_seg(data, scales)
+
+        # ids that don't fit into the dtype narrowed to a wrong maxId attribute raise instead of wrapping around.
+        # (the runner of bioimage-py re-raises the error of the block as a RuntimeError.)
+        with self.assertRaisesRegex(RuntimeError, "fit into the output dtype"):
+            import_segmentation(test_path, 'data_with_wrong_max_id', self.out_path,
+                                resolution=(0.5, 1, 1), chunks=(32, 64, 64),
+                                scale_factors=scales, tmp_folder=self.tmp_folder,
+                                target='local', max_jobs=self.n_jobs, narrow_dtype=True)
+
+        # for the node-label import the dtype is chosen from the segment ids of the node labels.
+        labeling = np.random.randint(0, 200, size=1000, dtype='uint64')
+        labeling[0] = 0
+        node_label_path = os.path.join(self.test_folder, 'node_labels.h5')
+        with open_file(node_label_path, mode="a") as f:
+            f.create_dataset('labels', data=labeling)
+        import_segmentation_from_node_labels(
+            test_path, 'data', self.out_path, node_label_path, 'labels',
+            resolution=(0.5, 1, 1), scale_factors=scales, chunks=(32, 64, 64),
+            tmp_folder=self.tmp_folder, target='local', max_jobs=self.n_jobs, narrow_dtype=True,
+        )
+        with open_file(self.out_path, 'r') as f:
+            self.assertEqual(f['s0'].dtype, np.dtype('uint8'))
+        self.check_seg(labeling[data], scales)
+
+    def test_narrow_dtype_in_memory(self):
+        from unittest import mock
+        from mobie.import_data import import_segmentation
+        from mobie.import_data import utils
+        shape = (32, 64, 64)
+        data = np.random.randint(0, 1000, size=shape, dtype='uint64')
+        os.makedirs(self.tmp_folder)
+
+        # the in-memory input is only handed off once to the workers, for writing the data.
+        scales = [[2, 2, 2]]
+        with mock.patch.object(utils, 'copy', wraps=utils.copy) as handoff_copy:
+            import_segmentation(data, None, self.out_path,
+                                resolution=(1, 1, 1), chunks=(16, 32, 32),
+                                scale_factors=scales, tmp_folder=self.tmp_folder,
+                                target='subprocess', max_jobs=2, narrow_dtype=True)
+        handoff_copy.assert_called_once()
+        with open_file(self.out_path, 'r') as f:
+            self.assertEqual(f['s0'].dtype, np.dtype('uint16'))
+        self.check_seg(data, scales)
+
+    def test_skip_empty_chunks(self):
+        import h5py
+        from mobie.import_data.utils import downscale
+        shape = (64, 128, 128)
+        # a sparse segmentation: only a single object in one corner of the volume.
+        data = np.zeros(shape, dtype='uint32')
+        data[:20, :30, :30] = np.random.randint(1, 10, size=(20, 30, 30))
+        test_path = os.path.join(self.test_folder, 'data.h5')
+        with open_file(test_path, mode="a") as f:
+            f.create_dataset('data', data=data)
+
+        scales = [[1, 2, 2], [2, 2, 2]]
+        for fused_pyramid in (True, False):
+            out_path = os.path.join(self.test_folder, f'sparse_{fused_pyramid}.h5')
+            n_skipped = downscale(test_path, 'data', out_path,
+                                  resolution=(0.5, 1, 1), scale_factors=scales, chunks=(16, 32, 32),
+                                  tmp_folder=self.tmp_folder, target='local', max_jobs=self.n_jobs, block_shape=None,
+                                  library='vigra', library_kwargs={'order': 0}, metadata_format='bdv.hdf5',
+                                  fused_pyramid=fused_pyramid, skip_empty_chunks=True)
+            # all chunks except for the 2 + 2 + 1 chunks of the object in the three levels are skipped.
+            self.assertEqual(n_skipped, (64 - 2) + (16 - 2) + (2 - 1))
+            with h5py.File(out_path, 'r') as f:
+                ds = f[get_scale_key('bdv.hdf5')]
+                self.assertTrue(np.array_equal(ds[:], data))
+                # only the chunks of the object are written, all others are read as the fill value.
+                self.assertEqual(ds.id.get_num_chunks(), 2 * 1 * 1)
+                self.assertEqual(ds.fillvalue, 0)
+                # the first level is not downsampled in z, so the object still spans two chunks.
+                self.assertEqual(f[get_scale_key('bdv.hdf5', 1)].id.get_num_chunks(), 2)
+                self.assertEqual(f[get_scale_key('bdv.hdf5', 2)].id.get_num_chunks(), 1)
+
+        # without skipping the empty chunks nothing is skipped or reported.
+        out_path = os.path.join(self.test_folder, 'dense.h5')
+        with redirect_stdout(io.StringIO()) as stdout:
+            n_skipped = downscale(test_path, 'data', out_path,
+                                  resolution=(0.5, 1, 1), scale_factors=scales, chunks=(16, 32, 32),
+                                  tmp_folder=self.tmp_folder, target='local', max_jobs=self.n_jobs, block_shape=None,
+                                  library='vigra', library_kwargs={'order': 0}, metadata_format='bdv.hdf5')
+        self.assertEqual(n_skipped, 0)
+        self.assertNotIn("Skipped", stdout.getvalue())
+
+    def _mode_reference(self, data, factor, nonzero_wins):
+        out = np.zeros(sample_shape(data.shape, factor), dtype=data.dtype)
+        for index in np.ndindex(*out.shape):
+            values = data[tuple(slice(i * f, (i + 1) * f) for i, f in zip(index, factor))].ravel()
+            if nonzero_wins and values.any():
+                values = values[values != 0]
+            ids, counts = np.unique(values, return_counts=True)
+            out[index] = ids[counts.argmax()]
+        return out
+
+    def test_downsampling_mode(self):
+        from mobie.import_data import import_segmentation
+        from mobie.import_data.utils import downscale
+        shape = (16, 32, 32)
+        # small objects of 2 voxels in the background, which nearest-neighbor sampling mostly drops.
+        data = np.zeros(shape, dtype='uint32')
+        data[::2, ::4, ::4] = np.random.randint(1, 5, size=data[::2, ::4, ::4].shape)
+        data[::2, ::4, 1::4] = data[::2, ::4, ::4]
+        test_path = os.path.join(self.test_folder, 'data.h5')
+        with open_file(test_path, mode="a") as f:
+            f.create_dataset('data', data=data)
+
+        scales = [[1, 2, 2], [2, 2, 2]]
+        for mode in ("mode", "mode-nonzero"):
+            expected = [data]
+            for factor in scales:
+                expected.append(self._mode_reference(expected[-1], factor, mode == "mode-nonzero"))
+            import_segmentation(test_path, 'data', self.out_path,
+                                resolution=(1, 1, 1), scale_factors=scales, chunks=(8, 16, 16),
+                                tmp_folder=self.tmp_folder, target='local', max_jobs=self.n_jobs,
+                                downsampling_mode=mode)
+            out_path = os.path.join(self.test_folder, 'level-wise.ome.zarr')
+            downscale(test_path, 'data', out_path,
+                      resolution=(1, 1, 1), scale_factors=scales, chunks=(8, 16, 16),
+                      tmp_folder=self.tmp_folder, target='local', max_jobs=self.n_jobs, block_shape=None,
+                      fused_pyramid=False, downsampling_mode=mode)
+            for path in (self.out_path, out_path):
+                with open_file(path, 'r') as f:
+                    for scale, exp in enumerate(expected):
+                        self.assertTrue(np.array_equal(f[get_scale_key('ome.zarr', scale)][:], exp))
+        # all objects are kept by the non-zero mode at the first level.
+        self.assertTrue(np.array_equal(np.unique(expected[1]), np.unique(data)))
+
+        with self.assertRaises(ValueError):
+            import_segmentation(test_path, 'data', self.out_path,
+                                resolution=(1, 1, 1), scale_factors=scales, chunks=(8, 16, 16),
+                                tmp_folder=self.tmp_folder, target='local', max_jobs=self.n_jobs,
+                                downsampling_mode="median")
+
     def _write_fragments(self, shape=(64, 128, 128), n_ids=100):
         data = np.random.randint(0, n_ids, size=shape, dtype='uint64')
         test_path = os.path.join(self.test_folder, 'data.h5')
@@ -66,6 +248,26 @@ class TestImportSegmentation(unittest.TestCase):
             f.create_dataset('data', data=data)
         return test_path, 'data', data
 
+    def test_relabel_consecutive_2d_bdv(self):
+        from mobie.import_data import import_segmentation
+        data = np.zeros((128, 128), dtype='uint64')
+        data[:64, :64], data[64:, 64:], data[:64, 64:] = 7, 1000, 42
+        test_path = os.path.join(self.test_folder, 'data.h5')
+        with open_file(test_path, mode="a") as f:
+            f.create_dataset('data', data=data)
+
+        # 2d data is promoted to 3d for the bdv formats, also when relabeling the ids.
+        out_path = os.path.join(self.test_folder, 'imported-data.n5')
+        scales = [[1, 2, 2]]
+        for relabel_consecutive in (False, True):
+            import_segmentation(test_path, 'data', out_path,
+                                resolution=(1, 1, 1), chunks=(1, 64, 64),
+                                scale_factors=scales, tmp_folder=self.tmp_folder,
+                                target='local', max_jobs=self.n_jobs, file_format='bdv.n5',
+                                relabel_consecutive=relabel_consecutive)
+            exp_data = np.searchsorted([0, 7, 42, 1000], data) if relabel_consecutive else data
+            self.check_seg(exp_data[None], scales, out_path=out_path, file_format='bdv.n5')
+
     def test_import_from_node_labels_dense(self):
         from mobie.import_data import import_segmentation_from_node_labels
         n_ids = 100
@@ -114,6 +316,73 @@ class TestImportSegmentation(unittest.TestCase):
         exp_data = lut[data]
         self.check_seg(exp_data, scales)
 
+    def test_import_from_node_labels_sparse(self):
+        from mobie.import_data import import_segmentation_from_node_labels
+        from mobie.import_data.from_node_labels import _load_node_labels
+        n_ids = 100
+        test_path, key, data = self._write_fragments(n_ids=n_ids)
+
+        # sparse fragment ids, which are looked up in the sorted ids instead of a dense table
+        sparse_ids = np.unique(np.random.randint(1, 2 ** 40, size=2 * n_ids, dtype='uint64'))[:n_ids]
+        sparse_ids[0] = 0
+        data = sparse_ids[data]
+        with open_file(test_path, mode="a") as f:
+            f[key][:] = data
+        new_ids = np.random.randint(0, 50, size=n_ids, dtype='uint64')
+        new_ids[0] = 0
+        table = np.stack([sparse_ids, new_ids])
+        node_label_path = os.path.join(self.test_folder, 'node_labels.h5')
+        with open_file(node_label_path, mode="a") as f:
+            f.create_dataset('assignment', data=table)
+            f.create_dataset('incomplete', data=table[:, :-1])
+        self.assertIsNotNone(_load_node_labels(node_label_path, 'assignment').keys)
+
+        # the distributed workers memory-map the node labels
+        tmp_folder = os.path.join(self.tmp_folder, 'sparse')
+        os.makedirs(tmp_folder)
+        scales = [[1, 2, 2], [2, 2, 2]]
+        import_segmentation_from_node_labels(
+            test_path, key, self.out_path, node_label_path, 'assignment',
+            resolution=(0.5, 1, 1), scale_factors=scales, chunks=(32, 64, 64),
+            tmp_folder=tmp_folder, target='subprocess', max_jobs=2,
+        )
+        self.assertFalse(os.path.exists(os.path.join(tmp_folder, 'node_labels')))
+        exp_data = new_ids[np.searchsorted(sparse_ids, data)]
+        self.check_seg(exp_data, scales)
+
+        # fragments that are not assigned by the node labels are an error
+        with self.assertRaisesRegex(Exception, "do not assign the fragment ids"):
+            import_segmentation_from_node_labels(
+                test_path, key, self.out_path, node_label_path, 'incomplete',
+                resolution=(0.5, 1, 1), scale_factors=scales, chunks=(32, 64, 64),
+                tmp_folder=tmp_folder, target='local', max_jobs=self.n_jobs,
+            )
+
+    def test_import_from_node_labels_consecutive(self):
+        from mobie.import_data import import_segmentation_from_node_labels
+        n_ids = 100
+        test_path, key, data = self._write_fragments(n_ids=n_ids)
+
+        # the node labels assign sparse segment ids, which are relabeled consecutively.
+        segment_ids = np.unique(np.random.randint(1, 2 ** 40, size=n_ids, dtype='uint64'))
+        labeling = segment_ids[np.random.randint(0, len(segment_ids), size=n_ids)]
+        labeling[0] = 0
+        node_label_path = os.path.join(self.test_folder, 'node_labels.h5')
+        with open_file(node_label_path, mode="a") as f:
+            f.create_dataset('labeling', data=labeling)
+
+        scales = [[1, 2, 2], [2, 2, 2]]
+        lut = import_segmentation_from_node_labels(
+            test_path, key, self.out_path, node_label_path, 'labeling',
+            resolution=(0.5, 1, 1), scale_factors=scales, chunks=(32, 64, 64),
+            tmp_folder=self.tmp_folder, target='local', max_jobs=self.n_jobs, relabel_consecutive=True,
+        )
+        old_ids = np.unique(labeling[data])
+        self.assertTrue(np.array_equal(lut[:, 0], old_ids))
+        self.assertTrue(np.array_equal(lut[:, 1], np.arange(len(old_ids))))
+        exp_data = np.searchsorted(old_ids, labeling[data])
+        self.check_seg(exp_data, scales)
+
     def test_import_from_node_labels_bdv_n5(self):
         # exercises the file_format argument: node-label import must honor bdv.n5
         from mobie.import_data import import_segmentation_from_node_labels
@@ -1,11 +1,22 @@
+import multiprocessing as mp
+import os
 import unittest
+from concurrent import futures
+from shutil import rmtree
+
 from jsonschema import ValidationError
 
 import numpy as np
 import mobie.metadata as metadata
+from pybdv import make_bdv
 from mobie.validation.utils import validate_with_schema
 
 
+def _add_views(dataset_folder, prefix, n_views=10):
+    for i in range(n_views):
+        metadata.add_view_to_dataset(dataset_folder, f"{prefix}-{i}", metadata.get_default_view("image", "image1"))
+
+
 class TestDatasetMetadata(unittest.TestCase):
     def get_dataset_metadata(self):
         dataset_metadata = {
@@ -72,6 +83,81 @@ class TestDatasetMetadata(unittest.TestCase):
         with self.assertRaises(ValidationError):
             validate_with_schema(ds_metadata, "dataset")
 
+    def test_transaction(self):
+        tmp_folder = "./tmp"
+        dataset_folder = os.path.join(tmp_folder, "ds")
+        os.makedirs(dataset_folder, exist_ok=True)
+        try:
+            metadata.create_dataset_metadata(dataset_folder)
+            view_names = [f"view{i}" for i in range(5)]
+
+            with metadata.DatasetMetadataTransaction(dataset_folder):
+                for name in view_names:
+                    metadata.add_view_to_dataset(dataset_folder, name, metadata.get_default_view("image", "image1"))
+                    # nested transactions join the outer one
+                    with metadata.DatasetMetadataTransaction(dataset_folder):
+                        pass
+                # the changes are visible within the transaction, but not yet written
+                self.assertEqual(set(metadata.read_dataset_metadata(dataset_folder)["views"]), set(view_names))
+                on_disk = metadata.utils.read_metadata(os.path.join(dataset_folder, "dataset.json"))
+                self.assertEqual(on_disk["views"], {})
+            self.assertEqual(set(metadata.read_dataset_metadata(dataset_folder)["views"]), set(view_names))
+
+            # failed or unwritten changes don't end up in the transaction
+            make_bdv(np.zeros((8, 8, 8), dtype="uint8"), os.path.join(dataset_folder, "image1.n5"),
+                     setup_name="image1")
+            xml_paths = [os.path.join(dataset_folder, f"{name}.xml") for name in ("image1", "image2")]
+            with metadata.DatasetMetadataTransaction(dataset_folder):
+                # image2 does not exist, so neither source is added
+                with self.assertRaises(ValueError):
+                    metadata.add_sources_to_dataset(dataset_folder, "image", ["image1", "image2"], xml_paths)
+                metadata.read_dataset_metadata(dataset_folder)["views"].clear()
+                ds_metadata = metadata.read_dataset_metadata(dataset_folder)
+                self.assertEqual(set(ds_metadata["views"]), set(view_names))
+                self.assertEqual(ds_metadata["sources"], {})
+
+            # nothing is written if the transaction fails
+            with self.assertRaises(RuntimeError):
+                with metadata.DatasetMetadataTransaction(dataset_folder):
+                    metadata.add_view_to_dataset(dataset_folder, "view5", metadata.get_default_view("image", "image1"))
+                    raise RuntimeError
+            self.assertEqual(set(metadata.read_dataset_metadata(dataset_folder)["views"]), set(view_names))
+
+            # the lock is released if the metadata can't be read
+            metadata_path = os.path.join(dataset_folder, "dataset.json")
+            with open(metadata_path) as f:
+                valid_metadata = f.read()
+            with open(metadata_path, "w") as f:
+                f.write("{")
+            transaction = metadata.DatasetMetadataTransaction(dataset_folder)
+            with self.assertRaises(ValueError):
+                with transaction:
+                    pass
+            with open(metadata_path, "w") as f:
+                f.write(valid_metadata)
+            # (a spawned process doesn't inherit the lock state of this process, unlike a forked one.)
+            with mp.get_context("spawn").Pool(1) as pool:
+                pool.apply_async(metadata.set_is2d, (dataset_folder, True)).get(timeout=30)
+            self.assertTrue(metadata.read_dataset_metadata(dataset_folder)["is2D"])
+        finally:
+            rmtree(tmp_folder)
+
+    def test_concurrent_updates(self):
+        tmp_folder = "./tmp"
+        dataset_folder = os.path.join(tmp_folder, "ds")
+        os.makedirs(dataset_folder, exist_ok=True)
+        try:
+            metadata.create_dataset_metadata(dataset_folder)
+            # add views from several processes, which each add views from several threads
+            with mp.Pool(4) as pool:
+                pool.starmap(_add_views, [(dataset_folder, f"process{i}") for i in range(4)])
+            with futures.ThreadPoolExecutor(4) as tp:
+                list(tp.map(_add_views, [dataset_folder] * 4, [f"thread{i}" for i in range(4)]))
+            views = metadata.read_dataset_metadata(dataset_folder)["views"]
+            self.assertEqual(len(views), 80)
+        finally:
+            rmtree(tmp_folder)
+
 
 if __name__ == '__main__':
     unittest.main()
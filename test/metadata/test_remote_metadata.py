@@ -77,7 +77,8 @@ class TestRemoteMetadata(unittest.TestCase):
             dataset_metadata = mobie.metadata.read_dataset_metadata(dataset_folder)
             validate_with_schema(dataset_metadata, "dataset")
 
-            new_file_format = file_format + ".s3"
+            # sharded ome.zarr data is registered as ome.zarr
+            new_file_format = ("ome.zarr" if file_format == "ome.zarr.v3" else file_format) + ".s3"
 
             sources = dataset_metadata["sources"]
             for name, source in sources.items():
@@ -117,6 +118,9 @@ class TestRemoteMetadata(unittest.TestCase):
     def test_remote_metadata_ome_zarr(self):
         self._test_remote_metadata("ome.zarr")
 
+    def test_remote_metadata_ome_zarr_v3(self):
+        self._test_remote_metadata("ome.zarr.v3")
+
     @unittest.skipIf(platform == "win32", "CLI does not work on windows")
     def test_cli(self):
         file_format = "bdv.n5"
@@ -50,6 +50,26 @@ class TestBdvImporter(unittest.TestCase):
             data = f["setup0/timepoint0/s0"][:]
         self.assertTrue(np.allclose(data, self.data))
 
+    def test_bdv_importer_timeseries(self):
+        im_path = os.path.join(self.test_folder, "timeseries.n5")
+        xml_path = os.path.join(self.test_folder, "timeseries.xml")
+        data = np.random.rand(3, 32, 64, 64)
+        for timepoint, data_t in enumerate(data):
+            pybdv.make_bdv(data_t, im_path, downscale_factors=[[2, 2, 2]],
+                           resolution=[0.5, 0.5, 0.5], unit="micrometer",
+                           setup_id=0, setup_name=self.image_name, timepoint=timepoint)
+
+        add_bdv_image(xml_path, self.root, self.dataset_name, file_format="ome.zarr", tmp_folder=self.tmp_folder)
+        validate_project(self.root)
+        meta = read_dataset_metadata(f"{self.root}/{self.dataset_name}")
+        self.assertIn(self.image_name, meta["sources"])
+        im_path = meta["sources"][self.image_name]["image"]["imageData"]["ome.zarr"]["relativePath"]
+        with open_file(os.path.join(self.root, self.dataset_name, im_path), "r") as f:
+            axes = [ax["name"] for ax in f.attrs["multiscales"][0]["axes"]]
+            self.assertEqual(axes, ["t", "z", "y", "x"])
+            self.assertTrue(np.allclose(f["s0"][:], data))
+            self.assertEqual(f["s1"].shape, (3, 16, 32, 32))
+
 
 if __name__ == "__main__":
     unittest.main()
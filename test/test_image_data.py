@@ -1,8 +1,10 @@
+import io
 import json
 import multiprocessing
 import os
 import subprocess
 import unittest
+from contextlib import redirect_stdout
 from shutil import rmtree
 from sys import platform
 
@@ -12,6 +14,7 @@ import numpy as np
 import h5py
 
 from elf.io import open_file
+from mobie.validation.utils import validate_with_schema
 from pybdv.metadata import get_data_path
 from pybdv.util import get_key
 
@@ -171,6 +174,21 @@ class TestImageData(unittest.TestCase):
         shape = (64, 64, 64)
         self.init_h5_dataset(dataset_name, raw_name, shape, file_format="bdv.n5")
 
+    def test_ome_zarr_v3(self):
+        dataset_name = "test"
+        raw_name = "test-raw"
+        shape = (64, 64, 64)
+        self.init_h5_dataset(dataset_name, raw_name, shape, file_format="ome.zarr.v3")
+        dataset_folder = os.path.join(self.root, dataset_name)
+        self.check_dataset(dataset_folder, shape, raw_name, file_format="ome.zarr.v3")
+
+        # the sharded data is registered as ome.zarr and passes the source schema
+        source = mobie.metadata.read_dataset_metadata(dataset_folder)["sources"][raw_name]
+        self.assertEqual(list(source["image"]["imageData"].keys()), ["ome.zarr"])
+        validate_with_schema(source, "source")
+        shape_from_metadata = mobie.metadata.source_metadata.get_shape(source["image"]["imageData"], dataset_folder)
+        self.assertEqual(list(shape_from_metadata), list(shape))
+
     #
     # tests with existing dataset
     #
@@ -229,6 +247,27 @@ class TestImageData(unittest.TestCase):
         dataset_folder = os.path.join(self.root, self.dataset_name)
         self.check_data(dataset_folder, im_name)
 
+    @unittest.skipIf(platform == "win32", "CLI does not work on windows")
+    def test_cli_planned_pyramid(self):
+        im_name = "extra-im"
+        tmp_folder = os.path.join(self.test_folder, "tmp-im")
+        cmd = ["mobie.add_image",
+               "--input_path", self.im_path,
+               "--input_key", self.im_key,
+               "--root", self.root,
+               "--dataset_name", self.dataset_name,
+               "--name", im_name,
+               "--resolution", json.dumps([1., 1., 1.]),
+               "--max_top_level_size", "64",
+               "--tmp_folder", tmp_folder]
+        subprocess.run(cmd)
+
+        dataset_folder = os.path.join(self.root, self.dataset_name)
+        self.check_data(dataset_folder, im_name)
+        with open_file(os.path.join(dataset_folder, "images", "ome-zarr", f"{im_name}.ome.zarr"), "r") as f:
+            self.assertEqual(f["s1"].shape, (64, 64, 64))
+            self.assertNotIn("s2", f)
+
     # 2D
     @unittest.skipIf(platform == "win32", "CLI does not work on windows")
     def test_cli_2D(self):
@@ -280,6 +319,85 @@ class TestImageData(unittest.TestCase):
                         description="Lorem ipsum.")
         self.check_data(os.path.join(self.root, self.dataset_name), im_name)
 
+    def test_planned_pyramid(self):
+        im_name = "test-data"
+        mobie.add_image(self.data, None, self.root, self.dataset_name, im_name,
+                        resolution=(1, 1, 1), tmp_folder=self.tmp_folder,
+                        target="local", max_jobs=self.max_jobs, max_top_level_size=32)
+        self.check_data(os.path.join(self.root, self.dataset_name), im_name)
+        im_path = os.path.join(self.root, self.dataset_name, "images", "ome-zarr", f"{im_name}.ome.zarr")
+        with open_file(im_path, "r") as f:
+            # the chunks of float64 data are limited to 1 MB.
+            self.assertEqual(f["s0"].chunks, (32, 64, 64))
+            self.assertEqual(f["s2"].shape, (32, 32, 32))
+            self.assertNotIn("s3", f)
+
+    def test_dry_run(self):
+        im_name = "test-data"
+        out = io.StringIO()
+        with redirect_stdout(out):
+            mobie.add_image(self.data, None, self.root, self.dataset_name, im_name,
+                            resolution=(1, 1, 1), tmp_folder=self.tmp_folder,
+                            target="local", max_jobs=self.max_jobs, max_top_level_size=32, dry_run=True)
+        # the planned pyramid is printed, but neither the data nor the dataset are created
+        lines = out.getvalue().strip().split("\n")
+        self.assertIn("n_chunks", lines[1])
+        self.assertEqual(len(lines), 5)
+        self.assertFalse(os.path.exists(os.path.join(self.root, self.dataset_name)))
+
+    def test_add_multichannel_image(self):
+        n_channels = 3
+        data = np.random.rand(n_channels, 32, 64, 64)
+        im_path = os.path.join(self.test_folder, "multichannel.h5")
+        with open_file(im_path, "a") as f:
+            f.create_dataset(self.im_key, data=data)
+        dataset_folder = os.path.join(self.root, self.dataset_name)
+
+        # one source per channel, stored separately
+        names = [f"channel{c}" for c in range(n_channels)]
+        mobie.add_multichannel_image(im_path, self.im_key, self.root, self.dataset_name, names,
+                                     resolution=(1, 1, 1), scale_factors=[[2, 2, 2]],
+                                     chunks=(16, 32, 32), tmp_folder=self.tmp_folder,
+                                     target="local", max_jobs=self.max_jobs)
+        for c, name in enumerate(names):
+            self.check_data(dataset_folder, name, exp_data=data[c])
+
+        # one source per channel, stored in a single multi-channel ome.zarr
+        names = [f"multi-channel{c}" for c in range(n_channels)]
+        mobie.add_multichannel_image(im_path, self.im_key, self.root, self.dataset_name, names,
+                                     resolution=(1, 1, 1), scale_factors=[[2, 2, 2]],
+                                     chunks=(16, 32, 32), tmp_folder=self.tmp_folder,
+                                     target="local", max_jobs=self.max_jobs,
+                                     multichannel_name="multi")
+        sources = mobie.metadata.read_dataset_metadata(dataset_folder)["sources"]
+        for c, name in enumerate(names):
+            source = sources[name]["image"]
+            self.assertEqual(source["imageData"]["ome.zarr"]["channel"], c)
+            mobie.validation.validate_source_metadata(name, sources[name], dataset_folder)
+        with open_file(os.path.join(dataset_folder, "images", "ome-zarr", "multi.ome.zarr"), "r") as f:
+            self.assertTrue(np.array_equal(f["s0"][:], data))
+
+    def test_add_timeseries_image(self):
+        im_name = "timeseries"
+        data = np.random.rand(3, 32, 64, 64)
+        im_path = os.path.join(self.test_folder, "timeseries.h5")
+        with open_file(im_path, "a") as f:
+            f.create_dataset(self.im_key, data=data)
+        mobie.add_timeseries_image(im_path, self.im_key, self.root, self.dataset_name, im_name,
+                                   resolution=(1, 1, 1), scale_factors=[[2, 2, 2]],
+                                   chunks=(16, 32, 32), tmp_folder=self.tmp_folder,
+                                   target="local", max_jobs=self.max_jobs,
+                                   time_unit="second", time_resolution=30.0)
+        self.check_data(os.path.join(self.root, self.dataset_name), im_name, exp_data=data)
+
+        im_path = os.path.join(self.root, self.dataset_name, "images", "ome-zarr", f"{im_name}.ome.zarr")
+        with open_file(im_path, "r") as f:
+            multiscales = f.attrs["multiscales"][0]
+            self.assertEqual(multiscales["axes"][0], {"name": "t", "type": "time", "unit": "second"})
+            scale = multiscales["datasets"][1]["coordinateTransformations"][0]["scale"]
+            self.assertEqual(scale, [30.0, 2.0, 2.0, 2.0])
+            self.assertEqual(f["s1"].shape, (3, 16, 32, 32))
+
     def test_with_view(self):
         im_name = "test-data"
         scales = [[2, 2, 2]]
@@ -379,7 +497,7 @@ class TestImageData(unittest.TestCase):
             is_h5 = file_format == "bdv.hdf5"
             key = get_key(is_h5, 0, 0, 0)
         else:
-            self.assertEqual(file_format, "ome.zarr")
+            self.assertIn(file_format, ("ome.zarr", "ome.zarr.v3"))
             raw_path = os.path.join(dataset_folder, "images", folder_name, f"{raw_name}.ome.zarr")
             key = "s0"
 
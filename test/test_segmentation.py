@@ -13,6 +13,11 @@ from elf.io import open_file
 from pybdv.metadata import get_data_path
 from pybdv.util import get_key
 
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
 
 class TestSegmentation(unittest.TestCase):
     test_folder = "./test-folder"
@@ -115,6 +120,179 @@ class TestSegmentation(unittest.TestCase):
                          add_default_table=table_path)
         self.check_segmentation(dataset_folder, seg_name)
 
+    def test_relabel_consecutive(self):
+        from mobie import add_segmentation
+        from mobie.tables import compute_default_table
+
+        dataset_folder = os.path.join(self.root, self.dataset_name)
+        seg_name = "seg"
+        tmp_folder = os.path.join(self.test_folder, "tmp-seg")
+
+        # sparse ids, e.g. from a watershed, in a large id range.
+        ids = np.unique(np.random.randint(1, 2 ** 40, size=200, dtype="uint64"))[:100]
+        ids[0] = 0
+        data = ids[self.data]
+        seg_path = os.path.join(self.test_folder, "sparse.h5")
+        with open_file(seg_path, "a") as f:
+            f.create_dataset(self.seg_key, data=data, chunks=(32, 32, 32))
+
+        table_path = os.path.join(tmp_folder, "table.tsv")
+        compute_default_table(seg_path, self.seg_key, table_path,
+                              resolution=(1, 1, 1), tmp_folder=os.path.join(self.test_folder, "tmp-table"),
+                              target="local", max_jobs=1)
+
+        scales = [[2, 2, 2]]
+        add_segmentation(seg_path, self.seg_key,
+                         self.root, self.dataset_name, seg_name,
+                         resolution=(1, 1, 1), scale_factors=scales,
+                         chunks=(64, 64, 64), tmp_folder=tmp_folder,
+                         add_default_table=table_path, relabel_consecutive=True, narrow_dtype=True)
+        # the relabeled ids are the input ids before the mapping to the sparse ids.
+        self.check_segmentation(dataset_folder, seg_name, exp_data=self.data)
+
+        lut = pd.read_csv(os.path.join(dataset_folder, "misc", "relabeling", f"{seg_name}.tsv"), sep="\t")
+        self.assertTrue(np.array_equal(lut["old_id"].values, ids))
+        self.assertTrue(np.array_equal(lut["new_id"].values, np.arange(len(ids))))
+
+        with open_file(os.path.join(dataset_folder, "images", "ome-zarr", f"{seg_name}.ome.zarr"), "r") as f:
+            self.assertEqual(f["s0"].dtype, np.dtype("uint8"))
+            self.assertEqual(f["s0"].attrs["maxId"], len(ids) - 1)
+
+    def test_pipelined_table(self):
+        from mobie import add_segmentation
+        from mobie.tables import compute_default_table
+
+        dataset_folder = os.path.join(self.root, self.dataset_name)
+        tmp_folder = os.path.join(self.test_folder, "tmp-seg")
+        scales = [[2, 2, 2]]
+        # the statistics are saved by the blocks of the fused pyramid, the slabs and the relabeling.
+        for seg_name, kwargs in (("seg", {}), ("seg-slabs", {"read_slabs": True}),
+                                 ("seg-relabeled", {"relabel_consecutive": True})):
+            add_segmentation(self.seg_path, self.seg_key,
+                             self.root, self.dataset_name, seg_name,
+                             resolution=(0.5, 1, 1), scale_factors=scales,
+                             chunks=(32, 64, 64), tmp_folder=tmp_folder, pipelined_table=True, **kwargs)
+            self.check_segmentation(dataset_folder, seg_name)
+            self.assertFalse(os.path.exists(os.path.join(tmp_folder, "morphology")))
+
+            table = pd.read_csv(os.path.join(dataset_folder, "tables", seg_name, "default.tsv"), sep="\t")
+            exp_table_path = os.path.join(self.test_folder, "exp_table.tsv")
+            compute_default_table(self.seg_path, self.seg_key, exp_table_path, resolution=(0.5, 1, 1),
+                                  tmp_folder=os.path.join(self.test_folder, "tmp-table"), target="local",
+                                  max_jobs=1)
+            exp_table = pd.read_csv(exp_table_path, sep="\t")
+            self.assertEqual(list(table.columns), list(exp_table.columns))
+            self.assertTrue(np.allclose(table.values, exp_table.values))
+
+    def test_default_table_anchors(self):
+        import bioimage_py as bp
+        from mobie.tables import compute_default_table
+
+        # rings, whose center of mass lies outside of the object, next to compact objects.
+        seg = np.zeros((16, 64, 64), dtype="uint32")
+        yy, xx = np.meshgrid(np.arange(32), np.arange(32), indexing="ij")
+        radius = np.sqrt((yy - 15.5) ** 2 + (xx - 15.5) ** 2)
+        ring = (radius > 8) & (radius < 12)
+        seg[2:6, :32, :32][:, ring] = 1
+        seg[2:6, 32:, 32:][:, ring] = 2
+        seg[8:14, 4:20, 36:60] = 3
+        seg[8:12, 40:56, 4:12] = 4
+        seg_path = os.path.join(self.test_folder, "rings.h5")
+        with open_file(seg_path, "a") as f:
+            f.create_dataset("seg", data=seg, chunks=(8, 16, 16))
+
+        resolution = (0.5, 1, 1)
+        table_path = os.path.join(self.test_folder, "table.tsv")
+        compute_default_table(seg_path, "seg", table_path, resolution=resolution,
+                              tmp_folder=os.path.join(self.test_folder, "tmp-table"), target="local", max_jobs=2)
+        table = pd.read_csv(table_path, sep="\t")
+
+        # the anchors are the same as for correcting all objects with regionprops.
+        src = bp.open_source(seg_path, "seg")
+        morph = bp.morphology.morphology(src)
+        props = bp.morphology.regionprops(src, morph, resolution=resolution)
+        self.assertEqual(table.label_id.tolist(), props.label.tolist())
+        for ax in "zyx":
+            self.assertTrue(np.allclose(table[f"anchor_{ax}"].values, props[f"centroid_{ax}"].values))
+        anchors = np.round(table[["anchor_z", "anchor_y", "anchor_x"]].values / np.array(resolution)).astype("int")
+        self.assertTrue((seg[tuple(anchors.T)] == table.label_id.values).all())
+
+    def test_add_intensity_table(self):
+        from mobie import add_image, add_intensity_table, add_segmentation
+        from mobie.validation.tables import check_segmentation_tables
+        from scipy import ndimage
+
+        dataset_folder = os.path.join(self.root, self.dataset_name)
+        tmp_folder = os.path.join(self.test_folder, "tmp-seg")
+        add_segmentation(self.seg_path, self.seg_key, self.root, self.dataset_name, "seg",
+                         resolution=(1, 1, 1), scale_factors=[[2, 2, 2]], chunks=(32, 64, 64), tmp_folder=tmp_folder)
+
+        # an integer image with the resolution of the segmentation and a floating point image with half of it.
+        raw = np.random.randint(0, 1000, size=self.shape).astype("uint16")
+        raw_small = np.random.rand(*[sh // 2 for sh in self.shape]).astype("float32")
+        for name, data, resolution in (("raw", raw, (1, 1, 1)), ("raw-small", raw_small, (2, 2, 2))):
+            add_image(data, None, self.root, self.dataset_name, name, resolution=resolution,
+                      scale_factors=[[2, 2, 2]], chunks=(32, 32, 32), tmp_folder=os.path.join(self.test_folder, name))
+
+        add_intensity_table(self.root, self.dataset_name, "seg", ["raw", "raw-small"],
+                            statistics=("mean", "median", "std", "max"),
+                            tmp_folder=os.path.join(self.test_folder, "tmp-table"), max_jobs=2)
+        table = pd.read_csv(os.path.join(dataset_folder, "tables", "seg", "intensities.tsv"), sep="\t")
+        default_table = pd.read_csv(os.path.join(dataset_folder, "tables", "seg", "default.tsv"), sep="\t")
+        self.assertEqual(table.label_id.tolist(), default_table.label_id.tolist())
+        check_segmentation_tables(os.path.join(dataset_folder, "tables", "seg"), is_2d=False)
+
+        labels = table.label_id.values
+        upsampled = raw_small.repeat(2, axis=0).repeat(2, axis=1).repeat(2, axis=2)
+        for name, data, median_tolerance in (("raw", raw, 0), ("raw-small", upsampled, 1.0 / 4096)):
+            data = data.astype("float64")
+            self.assertTrue(np.allclose(table[f"{name}_mean"], ndimage.mean(data, self.data, labels)))
+            self.assertTrue(np.allclose(table[f"{name}_std"], ndimage.standard_deviation(data, self.data, labels)))
+            self.assertTrue(np.allclose(table[f"{name}_max"], ndimage.maximum(data, self.data, labels)))
+            median = ndimage.median(data, self.data, labels)
+            self.assertLessEqual(np.abs(table[f"{name}_median"].values - median).max(), median_tolerance)
+
+    @unittest.skipIf(pyarrow is None, "Need pyarrow")
+    def test_parquet_table(self):
+        from mobie.tables import compute_default_table, read_table
+
+        tables = {}
+        for ext in ("tsv", "parquet"):
+            table_path = os.path.join(self.test_folder, f"default.{ext}")
+            compute_default_table(self.seg_path, self.seg_key, table_path, resolution=(1, 1, 1),
+                                  tmp_folder=os.path.join(self.test_folder, "tmp-table"), target="local", max_jobs=2)
+            tables[ext] = read_table(table_path)
+        self.assertEqual(list(tables["tsv"].columns), list(tables["parquet"].columns))
+        self.assertTrue(np.allclose(tables["tsv"].values, tables["parquet"].values))
+
+        columns = ["anchor_x", "label_id"]
+        table = read_table(os.path.join(self.test_folder, "default.parquet"), columns=columns)
+        self.assertEqual(list(table.columns), columns)
+        self.assertTrue(np.allclose(table.values, tables["tsv"][columns].values))
+
+    def test_default_table_2d_tiles(self):
+        from unittest import mock
+        from mobie.tables import compute_default_table
+
+        seg = self.data[0]
+        seg_path = os.path.join(self.test_folder, "seg2d.h5")
+        with open_file(seg_path, "a") as f:
+            f.create_dataset("seg", data=seg, chunks=(32, 32))
+
+        tables = []
+        for max_pixels, max_jobs in ((seg.size, 1), (0, 2)):
+            # with a maximal size of 0 the table is computed tile-wise (with tiles of 64 x 64 pixels).
+            table_path = os.path.join(self.test_folder, f"table-{max_pixels}.tsv")
+            with mock.patch("mobie.tables.default_table._MAX_IN_MEMORY_PIXELS", max_pixels), \
+                    mock.patch("mobie.tables.default_table._MIN_TILE_SIZE", 64):
+                compute_default_table(seg_path, "seg", table_path, resolution=(1, 1),
+                                      tmp_folder=os.path.join(self.test_folder, "tmp-table"), target="local",
+                                      max_jobs=max_jobs)
+            tables.append(pd.read_csv(table_path, sep="\t"))
+        self.assertEqual(list(tables[0].columns), list(tables[1].columns))
+        self.assertGreater(len(tables[0]), 1)
+        self.assertTrue(np.allclose(tables[0].values, tables[1].values))
+
     def test_numpy_3d(self):
         from mobie import add_segmentation
         dataset_folder = os.path.join(self.root, self.dataset_name)
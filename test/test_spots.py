@@ -10,6 +10,11 @@ import pandas as pd
 
 from elf.io import open_file
 
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
 
 class TestSpots(unittest.TestCase):
     test_folder = "./test-folder"
@@ -127,6 +132,32 @@ class TestSpots(unittest.TestCase):
                           sources=[[name]], display_settings=[{"additionalTables": tab_names, "spotRadius": 42.0}])
         self.check_spots(dataset_folder, name, expected_unit="micrometer", extra_tables=extra_tables)
 
+    @unittest.skipIf(pyarrow is None, "Need pyarrow")
+    def test_parquet_tables(self):
+        from mobie import add_spots
+        from mobie.tables import convert_tables_to_parquet, process_spot_table, read_table
+
+        # convert the tables of the spot source and validate the dataset with the tables in parquet format.
+        dataset_folder = os.path.join(self.root, self.dataset_name)
+        name = "my-spots"
+        add_spots(self.table_path, self.root, self.dataset_name, name)
+        table_folder = os.path.join(dataset_folder, "tables", name)
+        expected_table = read_table(os.path.join(table_folder, "default.tsv"))
+        convert_tables_to_parquet(table_folder, remove_input_tables=True)
+        self.assertEqual(os.listdir(table_folder), ["default.parquet"])
+        table = read_table(os.path.join(table_folder, "default.parquet"))
+        pd.testing.assert_frame_equal(table, expected_table)
+        self.check_spots(dataset_folder, name, expected_unit="micrometer")
+
+        # write the spot tables in parquet format and read a subset of the columns.
+        table_folder = os.path.join(self.test_folder, "parquet-tables")
+        process_spot_table(table_folder, self.table_path, is_2d=False, table_format="parquet")
+        table = read_table(os.path.join(table_folder, "default.parquet"), columns=["z", "spot_id"])
+        self.assertEqual(list(table.columns), ["z", "spot_id"])
+        self.assertEqual(len(table), self.n_spots)
+        with self.assertRaises(ValueError):
+            process_spot_table(table_folder, self.table_path, is_2d=False, table_format="xlsx")
+
     @unittest.skipIf(platform == "win32", "CLI does not work on windows")
     def test_cli(self):
         name = "my-spots"
@@ -0,0 +1,112 @@
+import os
+import unittest
+from shutil import rmtree
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+
+class TestTables(unittest.TestCase):
+    tmp_folder = "./tmp"
+    table_folder = "./tmp/tables/seg"
+    n_labels = 100
+
+    def setUp(self):
+        os.makedirs(self.table_folder, exist_ok=True)
+        label_ids = np.arange(1, self.n_labels + 1)
+        default_table = pd.DataFrame({
+            "label_id": label_ids,
+            "anchor_x": np.random.rand(self.n_labels),
+            "anchor_y": np.random.rand(self.n_labels),
+            "anchor_z": np.random.rand(self.n_labels),
+        })
+        default_table.to_csv(os.path.join(self.table_folder, "default.tsv"), sep="\t", index=False)
+        self.write_table({"label_id": label_ids[::2], "score": np.random.rand(self.n_labels // 2)}, "scores.tsv")
+
+    def tearDown(self):
+        try:
+            rmtree(self.tmp_folder)
+        except OSError:
+            pass
+
+    def write_table(self, table, name):
+        table = pd.DataFrame(table)
+        path = os.path.join(self.table_folder, name)
+        if name.endswith(".parquet"):
+            table.to_parquet(path, index=False)
+        else:
+            table.to_csv(path, sep="\t" if name.endswith(".tsv") else ",", index=False)
+
+    def test_check_segmentation_tables(self):
+        from mobie.validation.tables import check_segmentation_tables
+
+        check_segmentation_tables(self.table_folder, is_2d=False)
+
+        # a table with ids that are not in the default table
+        self.write_table({"label_id": [1, 2, self.n_labels + 1], "score2": [0.1, 0.2, 0.3]}, "extra.csv")
+        with self.assertRaisesRegex(ValueError, "Unexpected ids"):
+            check_segmentation_tables(self.table_folder, is_2d=False)
+        os.remove(os.path.join(self.table_folder, "extra.csv"))
+
+        # a table without the merge column
+        self.write_table({"id": [1, 2], "score2": [0.1, 0.2]}, "extra.tsv")
+        with self.assertRaisesRegex(ValueError, "Expected column label_id"):
+            check_segmentation_tables(self.table_folder, is_2d=False)
+        os.remove(os.path.join(self.table_folder, "extra.tsv"))
+
+        # a table with a single column
+        self.write_table({"label_id": [1, 2]}, "extra.tsv")
+        with self.assertRaisesRegex(ValueError, "single column"):
+            check_segmentation_tables(self.table_folder, is_2d=False)
+
+    @unittest.skipIf(pyarrow is None, "Need pyarrow")
+    def test_check_segmentation_tables_parquet(self):
+        from mobie.validation.tables import check_segmentation_tables
+
+        self.write_table({"label_id": [3, 4, 5], "score2": [0.1, 0.2, 0.3]}, "extra.parquet")
+        check_segmentation_tables(self.table_folder, is_2d=False)
+        self.write_table({"label_id": [0, 4, 5], "score2": [0.1, 0.2, 0.3]}, "extra.parquet")
+        with self.assertRaisesRegex(ValueError, "Unexpected ids"):
+            check_segmentation_tables(self.table_folder, is_2d=False)
+
+    def test_check_region_tables_mixed_ids(self):
+        from mobie.validation.tables import check_region_tables
+
+        # region ids are strings, with missing values in some rows; the column holds strings and floats (nan).
+        table_folder = os.path.join(self.tmp_folder, "tables", "regions")
+        os.makedirs(table_folder)
+        pd.DataFrame({"region_id": ["A01", "A02", None], "score": [0.1, 0.2, 0.3]}).to_csv(
+            os.path.join(table_folder, "default.tsv"), sep="\t", index=False
+        )
+        extra_path = os.path.join(table_folder, "extra.tsv")
+        pd.DataFrame({"region_id": ["A02", None], "score2": [0.1, 0.2]}).to_csv(extra_path, sep="\t", index=False)
+        check_region_tables(table_folder)
+
+        pd.DataFrame({"region_id": ["B01", None], "score2": [0.1, 0.2]}).to_csv(extra_path, sep="\t", index=False)
+        with self.assertRaisesRegex(ValueError, "Unexpected ids"):
+            check_region_tables(table_folder)
+
+    def test_check_tables_in_view(self):
+        from mobie.validation.tables import check_tables_in_view
+
+        sources = {"seg": {"segmentation": {"tableData": {"tsv": {"relativePath": "tables/seg"}}}}}
+        merge_columns = ["label_id", "timepoint"]
+        check_tables_in_view(sources, "seg", self.tmp_folder, merge_columns,
+                             additional_tables=["scores.tsv"], expected_columns=["score", "anchor_x"])
+        with self.assertRaisesRegex(ValueError, "expected column"):
+            check_tables_in_view(sources, "seg", self.tmp_folder, merge_columns,
+                                 additional_tables=["scores.tsv"], expected_columns=["missing"])
+
+        self.write_table({"label_id": [1, 2], "anchor_x": [0.1, 0.2]}, "duplicate.tsv")
+        with self.assertRaisesRegex(ValueError, "duplicate table columns"):
+            check_tables_in_view(sources, "seg", self.tmp_folder, merge_columns,
+                                 additional_tables=["scores.tsv", "duplicate.tsv"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,84 @@
+import json
+import os
+import unittest
+from shutil import rmtree
+from unittest import mock
+
+from jsonschema import ValidationError
+
+
+class TestValidationUtils(unittest.TestCase):
+    tmp_folder = "./tmp"
+
+    def setUp(self):
+        from mobie.validation.utils import SCHEMA_URLS
+
+        os.makedirs(self.tmp_folder, exist_ok=True)
+        # minimal schemas, where the view schema references the source schema via its url
+        schemas = {name: {"$schema": "http://json-schema.org/draft-07/schema#"} for name in SCHEMA_URLS}
+        schemas["source"].update({"type": "object", "required": ["imageData"]})
+        schemas["view"].update({
+            "type": "object", "properties": {"source": {"$ref": SCHEMA_URLS["source"]}}, "required": ["source"]
+        })
+        for name, schema in schemas.items():
+            with open(os.path.join(self.tmp_folder, f"{name}.schema.json"), "w") as f:
+                json.dump(schema, f)
+
+    def tearDown(self):
+        from mobie.validation import utils
+
+        utils._SCHEMAS.clear()
+        utils._VALIDATORS.clear()
+        try:
+            rmtree(self.tmp_folder)
+        except OSError:
+            pass
+
+    def test_validate_with_schema(self):
+        from mobie.validation import utils
+
+        utils._SCHEMAS.clear()
+        utils._VALIDATORS.clear()
+        with mock.patch.object(utils, "_BUNDLED_SCHEMA_FOLDER", self.tmp_folder):
+            utils.validate_with_schema({"imageData": {}}, "source")
+            utils.validate_with_schema({"source": {"imageData": {}}}, "view")
+            with self.assertRaises(ValidationError):
+                utils.validate_with_schema({"source": {}}, "view")
+            with self.assertRaises(ValidationError):
+                utils.validate_with_schema({}, "source")
+
+        # the validators are compiled once and then cached
+        validator = utils._VALIDATORS["view"]
+        utils.validate_with_schema({"source": {"imageData": {}}}, "view")
+        self.assertIs(utils._VALIDATORS["view"], validator)
+
+    def test_failed_schema_download(self):
+        from mobie.validation import utils
+
+        utils._SCHEMAS.clear()
+        utils._VALIDATORS.clear()
+        # without bundled schemas, a failed download skips the validation, but is not cached
+        missing_folder = os.path.join(self.tmp_folder, "missing")
+        with mock.patch.object(utils, "_BUNDLED_SCHEMA_FOLDER", missing_folder):
+            with mock.patch.object(utils, "_download_schema", return_value=False):
+                with self.assertWarns(UserWarning):
+                    utils.validate_with_schema({}, "source")
+            with mock.patch.object(utils, "_SCHEMA_CACHE_FOLDER", self.tmp_folder):
+                with self.assertRaises(ValidationError):
+                    utils.validate_with_schema({}, "source")
+
+    def test_bundled_schemas(self):
+        from mobie.validation import utils
+
+        utils._SCHEMAS.clear()
+        utils._VALIDATORS.clear()
+        # the bundled schemas are used without downloading them
+        with mock.patch.object(utils, "_download_schema") as download:
+            utils.validate_with_schema({"image": {"imageData": {"ome.zarr": {"relativePath": "a.ome.zarr"}}}}, "source")
+            with self.assertRaises(ValidationError):
+                utils.validate_with_schema({"image": {"imageData": {"tiff": {"relativePath": "a.tif"}}}}, "source")
+        download.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
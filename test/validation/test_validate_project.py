@@ -1,3 +1,4 @@
+import json
 import multiprocessing as mp
 import os
 import unittest
@@ -40,6 +41,60 @@ class TestValidateProject(unittest.TestCase):
         from mobie.validation import validate_project
         validate_project(self.data_folder)
 
+    def test_validate_project_incremental(self):
+        from mobie.validation import validate_project
+
+        manifest_path = os.path.join(self.tmp_folder, "manifest.json")
+
+        def statuses():
+            report = validate_project(self.data_folder, max_jobs=2, manifest_path=manifest_path)
+            return {item["item"]: item["status"] for item in report["items"]}
+
+        # the first validation checks all items, the second one only uses the manifest
+        self.assertEqual(set(statuses().values()), {"valid"})
+        self.assertEqual(set(statuses().values()), {"cached"})
+
+        # changing the source metadata triggers the validation of the source and of the views that reference it
+        ds_folder = os.path.join(self.data_folder, "test-ds")
+        metadata = mobie.metadata.read_dataset_metadata(ds_folder)
+        metadata["sources"]["raw"]["image"]["description"] = "raw data"
+        mobie.metadata.write_dataset_metadata(ds_folder, metadata)
+        status = statuses()
+        self.assertEqual(status["test-ds/sources/raw"], "valid")
+        self.assertEqual(status["test-ds/views/raw"], "valid")
+
+        # changing the array metadata of the image data triggers the validation of the source
+        array_metadata_path = os.path.join(ds_folder, "images", "ome-zarr", "raw.ome.zarr", "s0", ".zarray")
+        with open(array_metadata_path) as f:
+            array_metadata = json.load(f)
+        with open(array_metadata_path, "w") as f:
+            json.dump(array_metadata, f, indent=4)
+        status = statuses()
+        self.assertEqual(status.pop("test-ds/sources/raw"), "valid")
+        self.assertEqual(set(status.values()), {"cached"})
+
+        # only new views are validated
+        view_folder = os.path.join(ds_folder, "misc", "views")
+        os.makedirs(view_folder, exist_ok=True)
+        view_file = os.path.join(view_folder, "extra.json")
+        view = mobie.metadata.get_default_view("image", "raw", menu_name="bookmark")
+        mobie.metadata.utils.write_metadata(view_file, {"views": {"extra": view}})
+        status = statuses()
+        self.assertEqual(status.pop("test-ds/view_files/extra.json/extra"), "valid")
+        self.assertEqual(set(status.values()), {"cached"})
+
+        # an invalid view is detected, the valid items are still recorded in the manifest
+        view = mobie.metadata.get_default_view("image", "missing", menu_name="bookmark")
+        mobie.metadata.utils.write_metadata(view_file, {"views": {"extra": view}})
+        with self.assertRaises(ValueError):
+            statuses()
+        os.remove(view_file)
+        self.assertEqual(set(statuses().values()), {"cached"})
+
+        # a full validation checks all items again
+        report = validate_project(self.data_folder, manifest_path=manifest_path, full=True)
+        self.assertEqual({item["status"] for item in report["items"]}, {"valid"})
+
 
 if __name__ == "__main__":
     unittest.main()